@@ -12,26 +12,52 @@ This script replaces an older script that generated a file that could be importe
 Administration du site -> Utilisateur -> Cohortes -> Déposer les cohortes.
 That technique prevented us from synchronizing cohorts more than once, because that
 admin page choked as soon as a cohort in the file already existed in Moodle.
+
+Created cohorts are recorded in a journal (see lib/journal.py). If the run dies
+midway, rerun with --resume to create the remaining cohorts straight away.
+The cohorts of the batch in flight may have been created anyway, so those that
+already exist are skipped.
+
+With --plan, only prints the creation calls that would be made, and an estimate
+of how long they would take (see lib/plan.py).
+
+With --snapshot, the existing cohorts are read from a snapshot taken by snapshot.py,
+the Moodle API is then only used to create the missing cohorts.
 """
 
 import argparse
 import sys
+from collections.abc import Sequence
+from pathlib import Path
 
 import polars as pl
 import structlog
 
+from lib.columns import COURSE_COHORT
 from lib.config import get_moodle_client
+from lib.diff import diff_keys, report_diff
+from lib.instances import PRODUCTION, add_instance_arguments
+from lib.journal import Journal, journal_path
+from lib.logs import add_log_arguments, configure_logging
 from lib.moodle_api import MoodleClient
-from preprocess_teachers_and_courses import COURSE_COHORT
+from lib.parallel import chunked
+from lib.plan import Call, add_plan_arguments, print_plan
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.progress import Progress
+from lib.schemas import CohortSearch
+from lib.snapshot import Snapshot
 
 log = structlog.get_logger()
 
+# Cohorts are created in batches, each one recorded in the journal
+CREATE_BATCH_SIZE = 50
 
-def add_cohorts(moodle: MoodleClient, course_category_id: str, src: pl.DataFrame):
-    wanted = set(src[COURSE_COHORT].drop_nulls())
-    log.info("wanted cohorts", count=len(wanted))
 
-    result = moodle(
+def fetch_existing_cohort_names(
+    moodle: MoodleClient, course_category_id: str
+) -> set[str]:
+    result = moodle.call_as(
+        CohortSearch,
         "core_cohort_search_cohorts",
         query="",
         context={"contextlevel": "coursecat", "instanceid": course_category_id},
@@ -45,39 +71,158 @@ def add_cohorts(moodle: MoodleClient, course_category_id: str, src: pl.DataFrame
         course_category_id=course_category_id,
         found=len(existing),
     )
+    return existing
 
-    # We just display these, in case the user wants to remove them
-    extra = sorted(existing - wanted)
-    log.info("extra cohorts", extra=extra)
 
-    missing = sorted(wanted - existing)
-    log.info("missing cohorts", missing=missing)
+def find_missing_cohorts(existing: set[str], src: pl.DataFrame) -> list[str]:
+    log.info("wanted cohorts", count=src[COURSE_COHORT].drop_nulls().n_unique())
 
-    if not missing:
-        log.info("no missing cohorts, nothing to do.")
-        sys.exit(0)
+    diff = diff_keys(existing, src[COURSE_COHORT])
+    report_diff(diff, "cohorts")
+    return diff.missing.to_list()
 
+
+def add_cohorts(
+    moodle: MoodleClient,
+    course_category_id: str,
+    missing: list[str],
+    batch_size: int = CREATE_BATCH_SIZE,
+    instance: str = PRODUCTION,
+):
     user_input = input(f"Do you want to create {len(missing)} cohorts (yes/no): ")
     if user_input.lower() != "yes":
         print("aborting")
         sys.exit(0)
 
+    journal = Journal.start(
+        journal_path("add_cohorts", course_category_id, instance),
+        [{"id": name} for name in missing],
+    )
+    create_journaled_cohorts(moodle, course_category_id, journal, batch_size)
+
+
+def creation_call(course_category_id: str, names: Sequence[str]) -> Call:
     data = [
-        dict(categorytype=dict(type="id", value=course_category_id), name=c, idnumber=c)
-        for c in missing
+        dict(
+            categorytype=dict(type="id", value=course_category_id),
+            name=c,
+            idnumber=c,
+        )
+        for c in names
     ]
+    return Call("core_cohort_create_cohorts", {"cohorts": data})
 
-    moodle("core_cohort_create_cohorts", cohorts=data)
-    log.info("done")
 
+def creation_calls(
+    course_category_id: str, names: list[str], batch_size: int
+) -> list[Call]:
+    return [
+        creation_call(course_category_id, batch) for batch in chunked(names, batch_size)
+    ]
 
-if __name__ == "__main__":
+
+def create_journaled_cohorts(
+    moodle: MoodleClient,
+    course_category_id: str,
+    journal: Journal,
+    batch_size: int = CREATE_BATCH_SIZE,
+):
+    with step("create cohorts"):
+        pending = journal.pending()
+        progress = Progress("create cohorts", len(pending), bar=True)
+        for batch in chunked(pending, batch_size):
+            names = [cohort["id"] for cohort in batch]
+            with progress.timed(len(names)):
+                creation_call(course_category_id, names).make(moodle)
+            for name in names:
+                journal.record_done(name)
+    log.info("done", **journal.throughput())
+
+
+def record_existing(journal: Journal, existing: set[str]):
+    """Record as done the pending cohorts that were created anyway."""
+    created = [c["id"] for c in journal.pending() if c["id"] in existing]
+    for name in created:
+        journal.record_done(name)
+    if created:
+        log.info("already created", count=len(created), cohorts=created)
+
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("course_category_id")
-    parser.add_argument("preprocessed")
-    args = parser.parse_args()
+    parser.add_argument("preprocessed", nargs="?")
+    parser.add_argument("--snapshot", type=Path, help="Use this snapshot directory")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Create the cohorts left over by an interrupted run",
+    )
+    add_plan_arguments(parser, CREATE_BATCH_SIZE)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        if args.resume:
+            path = journal_path("add_cohorts", args.course_category_id, args.instance)
+            if not path.exists():
+                sys.exit(f"No journal to resume from at {path}")
+            journal = Journal.resume(path)
+            if args.plan:
+                names = [cohort["id"] for cohort in journal.pending()]
+                print_plan(
+                    creation_calls(args.course_category_id, names, args.batch_size)
+                )
+            else:
+                client = get_moodle_client(args.instance)
+                record_existing(
+                    journal,
+                    fetch_existing_cohort_names(client, args.course_category_id),
+                )
+                create_journaled_cohorts(
+                    client,
+                    args.course_category_id,
+                    journal,
+                    args.batch_size,
+                )
+            return
+
+        if not args.preprocessed:
+            parser.error("the preprocessed file is required unless resuming")
+        preprocessed = pl.read_csv(args.preprocessed)
+
+        moodle = None
+        if args.snapshot:
+            existing = Snapshot(args.snapshot).cohort_names_in_category(
+                int(args.course_category_id)
+            )
+        else:
+            moodle = get_moodle_client(args.instance)
+            existing = fetch_existing_cohort_names(moodle, args.course_category_id)
+
+        missing = find_missing_cohorts(existing, preprocessed)
+        if not missing:
+            log.info("no missing cohorts, nothing to do.")
+            return
+
+        if args.plan:
+            print_plan(
+                creation_calls(args.course_category_id, missing, args.batch_size)
+            )
+            return
+
+        # With a snapshot, we only connect once we know there is something to create
+        add_cohorts(
+            moodle or get_moodle_client(args.instance),
+            args.course_category_id,
+            missing,
+            args.batch_size,
+            args.instance,
+        )
 
-    moodle = get_moodle_client()
 
-    preprocessed = pl.read_csv(args.preprocessed)
-    add_cohorts(moodle, args.course_category_id, preprocessed)
+if __name__ == "__main__":
+    main()
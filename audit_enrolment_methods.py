@@ -0,0 +1,215 @@
+"""
+Takes a csv obtained by running prepare_enrolment_methods.py, and an output file
+
+checks that each cohort sync method of the file does its job in moodle: that
+the members of the cohort are enrolled in the course with the role.
+The web services don't list the cohort sync methods of a course, so we look at
+their effect instead:
+- missing: no member of the cohort is enrolled in the course,
+- wrong role: members are enrolled, but none with the role (or the method is
+  disabled, which removes their roles),
+- incomplete: some members are enrolled with the role, others not yet,
+- empty cohort: the cohort has no member, there is nothing to check.
+
+Writes the rows of the missing and wrong role methods to the output file, in
+the format of the input, so that only these are uploaded again.
+Courses and cohorts of the file that don't exist in moodle are reported, not
+checked (see validate_imports.py).
+
+The members of all the cohorts are fetched in batches, and the enrolled users
+of every course concurrently.
+
+Uses the Moodle API
+"""
+
+import argparse
+from enum import StrEnum
+
+import polars as pl
+import structlog
+
+from lib.cohort import fetch_cohort_members
+from lib.config import get_moodle_client
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS, run_concurrently
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.snapshot import fetch_cohorts, fetch_courses
+from verify_teacher_enrolments import fetch_enrolled_users
+
+log = structlog.get_logger()
+
+SHORTNAME = "shortname"
+METACOHORT = "metacohort"
+ROLE = "role"
+USER_ID = "user_id"
+STATUS = "status"
+
+
+class Status(StrEnum):
+    OK = "ok"
+    MISSING = "missing"
+    WRONG_ROLE = "wrong role"
+    INCOMPLETE = "incomplete"
+    EMPTY_COHORT = "empty cohort"
+
+
+# The methods to upload again
+TO_FIX = [Status.MISSING, Status.WRONG_ROLE]
+
+
+def expected_methods(src: pl.DataFrame) -> pl.DataFrame:
+    """The cohort sync methods the file adds."""
+    return src.filter(
+        (pl.col("operation") == "add") & (pl.col("method") == "cohort")
+    ).unique(maintain_order=True)
+
+
+def audit(
+    expected: pl.DataFrame, members: pl.DataFrame, enrolments: pl.DataFrame
+) -> pl.DataFrame:
+    """The expected methods, with a status column.
+
+    members: metacohort, user_id
+    enrolments: shortname, user_id, role, one row per role of each enrolled user
+    """
+    enrolled = enrolments.select(SHORTNAME, USER_ID).unique()
+    with_role = enrolments.unique()
+    counts = (
+        expected.select(SHORTNAME, METACOHORT, ROLE)
+        .join(members, on=METACOHORT, how="left")
+        .with_columns(
+            enrolled=pl.struct(SHORTNAME, USER_ID).is_in(
+                enrolled.select(pl.struct(SHORTNAME, USER_ID)).to_series().implode()
+            ),
+            with_role=pl.struct(SHORTNAME, USER_ID, ROLE).is_in(
+                with_role.select(pl.struct(SHORTNAME, USER_ID, ROLE))
+                .to_series()
+                .implode()
+            ),
+        )
+        .group_by(SHORTNAME, METACOHORT, ROLE)
+        .agg(
+            members=pl.col(USER_ID).count(),
+            enrolled=pl.col("enrolled").sum(),
+            with_role=pl.col("with_role").sum(),
+        )
+    )
+    status = (
+        pl.when(pl.col("members") == 0)
+        .then(pl.lit(Status.EMPTY_COHORT))
+        .when(pl.col("enrolled") == 0)
+        .then(pl.lit(Status.MISSING))
+        .when(pl.col("with_role") == 0)
+        .then(pl.lit(Status.WRONG_ROLE))
+        .when(pl.col("with_role") < pl.col("members"))
+        .then(pl.lit(Status.INCOMPLETE))
+        .otherwise(pl.lit(Status.OK))
+    )
+    return expected.join(
+        counts.with_columns(status.alias(STATUS)),
+        on=[SHORTNAME, METACOHORT, ROLE],
+        how="left",
+        maintain_order="left",
+    )
+
+
+def audit_moodle(
+    moodle: MoodleClient,
+    expected: pl.DataFrame,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> pl.DataFrame:
+    """The expected methods whose course and cohort exist, with a status column."""
+    with step("courses and cohorts"):
+        fetched = run_concurrently(
+            {
+                "courses": lambda: fetch_courses(moodle),
+                "cohorts": lambda: fetch_cohorts(moodle),
+            }
+        )
+    courses, cohorts = fetched["courses"], fetched["cohorts"]
+    course_ids = dict(zip(courses["shortname"], courses["id"], strict=True))
+    cohort_ids = dict(zip(cohorts["name"], cohorts["id"], strict=True))
+
+    for what, column, known in (
+        ("courses", SHORTNAME, course_ids),
+        ("cohorts", METACOHORT, cohort_ids),
+    ):
+        unknown = expected.filter(~pl.col(column).is_in(list(known)))[column]
+        if len(unknown):
+            values = unknown.unique().sort().to_list()
+            log.warning(f"{what} not in moodle", count=len(values), values=values)
+    checked = expected.filter(
+        pl.col(SHORTNAME).is_in(list(course_ids))
+        & pl.col(METACOHORT).is_in(list(cohort_ids))
+    )
+
+    with step("cohort members"):
+        names = checked[METACOHORT].unique().sort().to_list()
+        user_ids = fetch_cohort_members(
+            moodle, [cohort_ids[n] for n in names], max_workers
+        )
+        members = pl.DataFrame(
+            [
+                {METACOHORT: cohort, USER_ID: user_id}
+                for cohort in names
+                for user_id in user_ids.get(cohort_ids[cohort], [])
+            ],
+            schema={METACOHORT: pl.String, USER_ID: pl.Int64},
+        )
+
+    with step("enrolled users"):
+        shortnames = checked[SHORTNAME].unique().sort().to_list()
+        enrolled = fetch_enrolled_users(
+            moodle, {s: course_ids[s] for s in shortnames}, max_workers
+        )
+        enrolments = pl.DataFrame(
+            [
+                {SHORTNAME: shortname, USER_ID: user.id, ROLE: role.shortname}
+                for shortname, users in enrolled.items()
+                for user in users
+                for role in user.roles
+            ],
+            schema={SHORTNAME: pl.String, USER_ID: pl.Int64, ROLE: pl.String},
+        )
+
+    return audit(checked, members, enrolments)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("enrolment_methods")
+    parser.add_argument("fixes", help="Write the methods to upload again here")
+    parser.add_argument("--output", help="Write the status of every method here")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        src = pl.read_csv(args.enrolment_methods)
+        expected = expected_methods(src)
+        log.info("expected methods", count=len(expected))
+
+        audited = audit_moodle(
+            get_moodle_client(args.instance), expected, args.max_workers
+        )
+        for (status,), group in audited.group_by(STATUS, maintain_order=True):
+            log.info(
+                status,
+                count=len(group),
+                methods=group.select(SHORTNAME, METACOHORT).rows(),
+            )
+
+        fixes = audited.filter(pl.col(STATUS).is_in(TO_FIX)).select(src.columns)
+        fixes.write_csv(args.fixes)
+        log.info("done", fix_count=len(fixes), fixes=args.fixes)
+        if args.output:
+            audited.write_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Takes:
+- an output directory
+- several essaim exports of teachers and courses, each one given as
+  YYYY=path/to/export.xlsx where YYYY is the first year of its schoolyear
+
+Runs preprocess_teachers_and_courses.py on each export, in parallel processes,
+and writes one year-suffixed file per export, e.g. preprocessed_2026-2027.csv
+
+Useful during the summer rollover, when we juggle with last year's and
+next year's exports.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.archive import PREPROCESSED, add_archive_arguments, archive_frame
+from lib.logs import add_log_arguments, configure_logging
+from lib.profiling import add_profile_arguments, profiled
+from lib.schoolyear import SchoolYear
+from preprocess_teachers_and_courses import preprocess
+
+log = structlog.get_logger()
+
+
+def output_path(output_dir: Path, year: SchoolYear) -> Path:
+    return output_dir / f"preprocessed_{year.long_label}.csv"
+
+
+def preprocess_file(
+    year: SchoolYear, workbook: Path, output: Path, archive: bool = False
+) -> int:
+    # Runs in a worker process
+    teachers_and_courses = pl.read_excel(workbook)
+    res = preprocess(teachers_and_courses, year)
+    res.write_csv(output)
+    if archive:
+        archive_frame(res, PREPROCESSED, year)
+    return len(res)
+
+
+def parse_export(value: str) -> tuple[SchoolYear, Path]:
+    year, _, path = value.partition("=")
+    if not path:
+        raise argparse.ArgumentTypeError(f"expected YYYY=path, got {value!r}")
+    return SchoolYear(int(year)), Path(path)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("exports", nargs="+", type=parse_export, metavar="YYYY=PATH")
+    parser.add_argument("--max-workers", type=int, help="Default: one per CPU")
+    add_archive_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
+            futures = {
+                year: executor.submit(
+                    preprocess_file,
+                    year,
+                    workbook,
+                    output_path(args.output_dir, year),
+                    not args.no_archive,
+                )
+                for year, workbook in args.exports
+            }
+            for year, future in futures.items():
+                log.info(
+                    "preprocessed",
+                    schoolyear=year.long_label,
+                    num_courses=future.result(),
+                    output=str(output_path(args.output_dir, year)),
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Compares the decoding of large Moodle responses:
+- munch: json + munchify, what MoodleClient.__call__ does,
+- typed (json): MoodleClient.call_as without msgspec,
+- typed (msgspec): MoodleClient.call_as with msgspec.
+
+The payloads are synthetic responses of 10k records, with the fields Moodle
+sends. Reports the best decoding time, and the memory held by the decoded
+response (tracemalloc, measured separately from the time).
+
+    uv run benchmarks/decode.py [--records N] [--repeat N]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from munch import munchify  # noqa: E402
+
+from lib import schemas  # noqa: E402
+from lib.schemas import CohortSearch, User  # noqa: E402
+
+
+def users_payload(count: int) -> bytes:
+    return json.dumps(
+        [
+            {
+                "id": i,
+                "username": f"user{i}@eduvaud.ch",
+                "firstname": "Firstname",
+                "lastname": f"LASTNAME{i}",
+                "fullname": f"Firstname LASTNAME{i}",
+                "email": f"user{i}@eduvaud.ch",
+                "department": "",
+                "firstaccess": 1700000000,
+                "lastaccess": 1760000000,
+                "auth": "oauth2",
+                "suspended": False,
+                "confirmed": True,
+                "lang": "fr",
+                "theme": "",
+                "timezone": "99",
+                "mailformat": 1,
+                "description": "",
+                "descriptionformat": 1,
+                "profileimageurlsmall": f"https://moodle.example.com/user/{i}/f2",
+                "profileimageurl": f"https://moodle.example.com/user/{i}/f1",
+                "preferences": [
+                    {"name": "auth_forcepasswordchange", "value": "0"},
+                    {"name": "email_bounce_count", "value": "1"},
+                ],
+            }
+            for i in range(count)
+        ]
+    ).encode()
+
+
+def cohorts_payload(count: int) -> bytes:
+    return json.dumps(
+        {
+            "cohorts": [
+                {
+                    "id": i,
+                    "name": f"2627_{i}",
+                    "idnumber": "",
+                    "description": "",
+                    "descriptionformat": 1,
+                    "visible": True,
+                    "theme": "",
+                }
+                for i in range(count)
+            ]
+        }
+    ).encode()
+
+
+def decoders(schema: Any) -> dict[str, Callable[[bytes], object]]:
+    def typed_json(content: bytes) -> object:
+        with patch.object(schemas, "msgspec", None):
+            return schemas.decode(schema, content)
+
+    result: dict[str, Callable[[bytes], object]] = {
+        "munch": lambda content: munchify(json.loads(content)),
+        "typed (json)": typed_json,
+    }
+    if schemas.msgspec is not None:
+        result["typed (msgspec)"] = lambda content: schemas.decode(schema, content)
+    return result
+
+
+def measure(decode: Callable[[bytes], object], content: bytes, repeat: int):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(content)
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = decode(content)
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return min(seconds), held / 1e6, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = {
+        "core_user_get_users_by_field": (list[User], users_payload(args.records)),
+        "core_cohort_search_cohorts": (CohortSearch, cohorts_payload(args.records)),
+    }
+    if schemas.msgspec is None:
+        print("msgspec is not installed, only comparing the json paths")
+
+    for fname, (schema, content) in payloads.items():
+        print()
+        print(f"{fname}, {args.records} records, {len(content) / 1e6:.1f} MB")
+        print(f"{'decoder':20}{'seconds':>10}{'held MB':>10}{'peak MB':>10}")
+        for name, decode in decoders(schema).items():
+            seconds, held, peak = measure(decode, content, args.repeat)
+            print(f"{name:20}{seconds:>10.4f}{held:>10.1f}{peak:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
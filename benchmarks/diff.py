@@ -0,0 +1,93 @@
+"""
+Compares the diff of what's in Moodle with what's in a file:
+- sets: Python set differences, sorted, what the diff_* scripts used to do,
+- anti-join: lib.diff.diff_keys.
+
+As in the scripts, the existing keys come as a set (fetched from Moodle) and
+the wanted ones as a column of the file. A tenth of the keys are only on one
+side, and a seventh of the Moodle ones have a different case. Reports the best
+time, exact and case-insensitive.
+
+    uv run benchmarks/diff.py [--keys N] [--repeat N]
+"""
+
+import argparse
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import polars as pl
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lib.diff import diff_keys  # noqa: E402
+
+
+def keys(count: int) -> tuple[set[str], pl.Series]:
+    shift = count // 10
+    # Some emails have their case changed in Moodle
+    existing = {
+        f"{'User' if i % 7 == 0 else 'user'}.{i}@eduvaud.ch" for i in range(count)
+    }
+    wanted = pl.Series(
+        "email", [f"user.{i}@eduvaud.ch" for i in range(shift, count + shift)]
+    )
+    return existing, wanted
+
+
+def with_sets(existing: set[str], wanted: pl.Series, case_insensitive: bool):
+    if case_insensitive:
+        existing_by_match = {k.lower(): k for k in existing}
+        wanted_by_match = {k.lower(): k for k in wanted.drop_nulls()}
+        extra = sorted(
+            existing_by_match[k]
+            for k in existing_by_match.keys() - wanted_by_match.keys()
+        )
+        missing = sorted(
+            wanted_by_match[k]
+            for k in wanted_by_match.keys() - existing_by_match.keys()
+        )
+        unchanged = sorted(
+            wanted_by_match[k]
+            for k in wanted_by_match.keys() & existing_by_match.keys()
+        )
+    else:
+        wanted_set = set(wanted.drop_nulls())
+        extra = sorted(existing - wanted_set)
+        missing = sorted(wanted_set - existing)
+        unchanged = sorted(wanted_set & existing)
+    return extra, missing, unchanged
+
+
+def with_anti_join(existing: set[str], wanted: pl.Series, case_insensitive: bool):
+    return diff_keys(existing, wanted, case_insensitive)
+
+
+def best(run: Callable[[], object], repeat: int) -> float:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    existing, wanted = keys(args.keys)
+    print(f"{args.keys} keys on each side")
+    print(f"{'diff':20}{'exact s':>10}{'ci s':>10}")
+    for name, diff in (("sets", with_sets), ("anti-join", with_anti_join)):
+        exact = best(lambda: diff(existing, wanted, False), args.repeat)
+        insensitive = best(lambda: diff(existing, wanted, True), args.repeat)
+        print(f"{name:20}{exact:>10.4f}{insensitive:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures the cold-start import cost of each cli.py command, with -X importtime.
+
+For each command, a fresh interpreter imports only the module of that command,
+which is what cli.py does. The baseline is a CLI importing every script up
+front. Also tells whether the command ends up importing polars.
+
+    uv run benchmarks/import_time.py [--repeat N]
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from cli import COMMANDS  # noqa: E402
+
+
+def import_cost(modules: list[str]) -> tuple[float, bool]:
+    """Cumulative import time in ms of the modules, and whether polars was loaded."""
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total_us = 0
+    polars = False
+    # Lines look like "import time:       153 |        269 |   lib.columns",
+    # top-level imports are the ones whose name isn't indented.
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        polars = polars or name.strip() == "polars"
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, polars
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    def measure(modules: list[str]) -> tuple[float, bool]:
+        runs = [import_cost(modules) for _ in range(args.repeat)]
+        # The minimum is the least noisy estimate of the cost itself
+        return min(ms for ms, _ in runs), runs[0][1]
+
+    all_modules = sorted({module for module, _ in COMMANDS.values()})
+    baseline, _ = measure(all_modules)
+
+    print(f"{'command':28}{'import ms':>10}{'vs eager':>10}  polars")
+    print(f"{'(eager, all scripts)':28}{baseline:>10.1f}{'':>10}  yes")
+    for name, (module, _) in COMMANDS.items():
+        ms, polars = measure([module])
+        print(f"{name:28}{ms:>10.1f}{ms / baseline:>9.0%}  {'yes' if polars else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compares two ways of writing a user upload file on a synthetic set of users:
+- wide: list.to_struct + unnest into cohortN columns, then write_csv
+  (what prepare_students.py used to do),
+- stream: lib.widecsv.write_wide_csv.
+
+Most users have around 12 courses, a few have many more, which is what makes
+the wide frame wide. Each method runs in a fresh interpreter so that its peak
+resident memory can be measured.
+
+    uv run benchmarks/wide_csv.py [--users N] [--repeat N]
+"""
+
+import argparse
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import polars as pl  # noqa: E402
+
+from lib.widecsv import Spread, write_wide_csv  # noqa: E402
+
+METHODS = ("wide", "stream")
+
+
+def synthetic_users(count: int) -> pl.DataFrame:
+    rng = random.Random(42)
+    courses = [f"2627_{c}" for c in range(2000)]
+
+    def course_count():
+        return rng.randint(40, 80) if rng.random() < 0.001 else rng.randint(8, 16)
+
+    return pl.DataFrame(
+        {
+            "email": [f"user{i}@eduvaud.ch" for i in range(count)],
+            "username": [f"user{i}@eduvaud.ch" for i in range(count)],
+            "firstname": ["Firstname"] * count,
+            "lastname": [f"LASTNAME{i}" for i in range(count)],
+            "password": ["changeme"] * count,
+            "cohort1": ["2627_eleves"] * count,
+            "courses": [rng.sample(courses, course_count()) for _ in range(count)],
+        }
+    )
+
+
+def run(method: str, users: int, path: Path):
+    frame = synthetic_users(users)
+    start = time.perf_counter()
+    if method == "wide":
+        width = frame.select(pl.col("courses").list.len().max()).item()
+        wide = frame.with_columns(
+            pl.col("courses").list.to_struct(
+                fields=[f"cohort{i + 2}" for i in range(width)]
+            )
+        ).unnest("courses")
+        wide.write_csv(path)
+    else:
+        write_wide_csv(frame, path, {"courses": Spread("cohort", start=2)})
+    seconds = time.perf_counter() - start
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{seconds} {max_rss_mb}")
+
+
+def measure(method: str, users: int, path: Path) -> tuple[float, float]:
+    result = subprocess.run(
+        [sys.executable, __file__, "--run", method, "--users", str(users), str(path)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # The last line, structlog also writes to stdout
+    seconds, max_rss_mb = result.stdout.splitlines()[-1].split()
+    return float(seconds), float(max_rss_mb)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--run", choices=METHODS, help=argparse.SUPPRESS)
+    parser.add_argument("path", nargs="?", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.users, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'method':10}{'seconds':>10}{'max rss MB':>12}{'file MB':>10}")
+        outputs = {}
+        for method in METHODS:
+            path = Path(tmp) / f"{method}.csv"
+            runs = [measure(method, args.users, path) for _ in range(args.repeat)]
+            seconds = min(r[0] for r in runs)
+            max_rss_mb = min(r[1] for r in runs)
+            size_mb = path.stat().st_size / 1e6
+            print(f"{method:10}{seconds:>10.3f}{max_rss_mb:>12.1f}{size_mb:>10.1f}")
+            outputs[method] = path.read_bytes()
+        print()
+        print("identical outputs:", outputs["wide"] == outputs["stream"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Takes two schoolyears, e.g. 2025 2026
+
+Compares what the archive (see lib/archive.py) holds for them:
+- the students that joined or left,
+- the courses (class and course) that changed teacher.
+
+Prints both, and writes them as csv files into --output-dir if given.
+"""
+
+import argparse
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.archive import (
+    ARCHIVE_DIR,
+    JOINED,
+    LEFT,
+    course_reassignments,
+    student_churn,
+)
+from lib.logs import add_log_arguments, configure_logging
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.schoolyear import SchoolYear
+
+log = structlog.get_logger()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before", type=lambda s: SchoolYear(int(s)), metavar="YYYY")
+    parser.add_argument("after", type=lambda s: SchoolYear(int(s)), metavar="YYYY")
+    parser.add_argument("--archive-dir", type=Path, default=ARCHIVE_DIR)
+    parser.add_argument("--output-dir", type=Path)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        with step("student churn"):
+            students = student_churn(args.before, args.after, args.archive_dir)
+        with step("course reassignments"):
+            courses = course_reassignments(args.before, args.after, args.archive_dir)
+
+        log.info(
+            "churn",
+            before=args.before.long_label,
+            after=args.after.long_label,
+            joined=(students["change"] == JOINED).sum(),
+            left=(students["change"] == LEFT).sum(),
+            reassigned_courses=len(courses),
+        )
+        with pl.Config(tbl_rows=-1, fmt_table_cell_list_len=-1, fmt_str_lengths=100):
+            print(students)
+            print(courses)
+
+        if args.output_dir:
+            args.output_dir.mkdir(parents=True, exist_ok=True)
+            students.write_csv(args.output_dir / "student_churn.csv")
+            courses.with_columns(
+                pl.col("teachers_before", "teachers_after").list.join(" ")
+            ).write_csv(args.output_dir / "course_reassignments.csv")
+
+
+if __name__ == "__main__":
+    main()
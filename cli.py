@@ -0,0 +1,93 @@
+"""
+A single entry point for all the scripts:
+
+    uv run cli.py <command> [arguments of the command]
+
+Each command runs the main() of the matching script. The script is only
+imported once the command is known, so a command doesn't pay for the imports
+of the others (polars in particular, for the commands that only talk to the
+Moodle API). Keep the imports of this file to the standard library.
+"""
+
+import argparse
+import importlib
+
+# command -> (module, description)
+COMMANDS = {
+    "preprocess": (
+        "preprocess_teachers_and_courses",
+        "Preprocess an essaim export of teachers and courses",
+    ),
+    "batch-preprocess": (
+        "batch_preprocess",
+        "Preprocess the exports of several schoolyears in parallel",
+    ),
+    "prepare-courses": ("prepare_courses", "Make the courses import file"),
+    "prepare-enrolment-methods": (
+        "prepare_enrolment_methods",
+        "Make the enrolment methods import file",
+    ),
+    "prepare-students": ("prepare_students", "Make the students import file"),
+    "prepare-teachers": (
+        "prepare_teachers_with_courses",
+        "Make the teachers import file",
+    ),
+    "watch": (
+        "watch",
+        "Keep the import files up to date with the latest essaim exports",
+    ),
+    "diff-courses": ("diff_courses", "Compare the courses with moodle"),
+    "diff-students": ("diff_students", "Compare the students with moodle"),
+    "diff-teachers": ("diff_teachers", "Compare the teachers with moodle"),
+    "diff-cohort-members": (
+        "diff_cohort_members",
+        "Compare the members of every cohort with moodle",
+    ),
+    "verify-teacher-enrolments": (
+        "verify_teacher_enrolments",
+        "Check that the teachers are enrolled in their courses",
+    ),
+    "audit-enrolment-methods": (
+        "audit_enrolment_methods",
+        "Check that the cohort sync methods enrol the cohorts",
+    ),
+    "validate-imports": (
+        "validate_imports",
+        "Check that the import files only refer to what exists in moodle",
+    ),
+    "churn": ("churn", "Compare two schoolyears of the archive"),
+    "reconcile": ("reconcile", "All of the diffs at once"),
+    "snapshot": ("snapshot", "Save the state of moodle locally"),
+    "compare-instances": (
+        "compare_instances",
+        "Compare the state of several moodle instances",
+    ),
+    "sidecar": ("sidecar", "Share warm connections to moodle between the scripts"),
+    "add-cohorts": ("add_cohorts", "Create the missing cohorts"),
+    "delete-cohorts": ("delete_cohorts_with_prefix", "Delete cohorts by prefix"),
+    "delete-courses": (
+        "delete_courses_in_category",
+        "Delete the courses under a category",
+    ),
+}
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n"
+        + "\n".join(
+            f"  {name:28}{description}" for name, (_, description) in COMMANDS.items()
+        ),
+    )
+    parser.add_argument("command", choices=COMMANDS, metavar="command")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+
+    module_name, _ = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+    module.main(args.arguments)
+
+
+if __name__ == "__main__":
+    main()
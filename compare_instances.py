@@ -0,0 +1,162 @@
+"""
+Takes a directory and the names of several moodle instances (see
+lib/instances.py), the first one being the reference
+
+Takes a snapshot of every instance concurrently, each into its own
+subdirectory (directory/production, directory/staging...), then compares
+the other instances with the reference: the categories (by path), courses (by
+shortname), cohorts (by name) and cohort members (by cohort name and email)
+that are only on one side.
+
+Prints a summary and writes the details to directory/comparison.json.
+
+The diff scripts can then run against each instance's snapshot with
+--snapshot directory/<instance>, or against an instance with --instance.
+
+Uses the Moodle API
+"""
+
+import argparse
+import json
+from datetime import UTC, datetime
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.config import get_moodle_client
+from lib.instances import PRODUCTION, get_instance
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_index import category_paths
+from lib.parallel import run_concurrently
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.snapshot import (
+    CATEGORIES,
+    COHORT_MEMBERS,
+    COHORTS,
+    COURSES,
+    USERS,
+    Snapshot,
+    take_snapshot,
+)
+
+log = structlog.get_logger()
+
+COMPARISON = "comparison.json"
+
+
+def compared_keys(snapshot: Snapshot) -> dict[str, pl.DataFrame]:
+    """What identifies each entity across instances, where ids differ."""
+    cohorts = snapshot.read(COHORTS)
+    members = (
+        snapshot.read(COHORT_MEMBERS)
+        .join(
+            cohorts.select(cohort_id="id", cohort="name"), on="cohort_id", how="inner"
+        )
+        .join(snapshot.read(USERS).rename({"id": "user_id"}), on="user_id")
+        .select("cohort", "email")
+    )
+    return {
+        CATEGORIES: category_paths(snapshot.read(CATEGORIES)).alias("path").to_frame(),
+        COURSES: snapshot.read(COURSES).select("shortname"),
+        COHORTS: cohorts.select("name"),
+        COHORT_MEMBERS: members,
+    }
+
+
+def compare(
+    reference: dict[str, pl.DataFrame], other: dict[str, pl.DataFrame]
+) -> dict[str, dict]:
+    """For each entity, the counts and the keys only on either side."""
+
+    def only_in(a: pl.DataFrame, b: pl.DataFrame) -> list:
+        rows = a.unique().join(b, on=a.columns, how="anti").sort(a.columns).rows()
+        return [row[0] if len(row) == 1 else list(row) for row in rows]
+
+    return {
+        entity: {
+            "reference_count": len(reference[entity]),
+            "other_count": len(other[entity]),
+            "only_in_reference": only_in(reference[entity], other[entity]),
+            "only_in_other": only_in(other[entity], reference[entity]),
+        }
+        for entity in reference
+    }
+
+
+def print_comparison(reference: str, other: str, comparison: dict[str, dict]):
+    print()
+    print(f"{reference} vs {other}")
+    print(
+        f"{'':16}{reference:>12}{other:>12}"
+        f"{'only in ' + reference:>24}{'only in ' + other:>24}"
+    )
+    for entity, c in comparison.items():
+        print(
+            f"{entity:16}{c['reference_count']:>12}{c['other_count']:>12}"
+            f"{len(c['only_in_reference']):>24}{len(c['only_in_other']):>24}"
+        )
+    print()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", type=Path)
+    parser.add_argument(
+        "instances",
+        nargs="*",
+        default=[PRODUCTION, "staging"],
+        help="The reference instance first (default: production staging)",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Ignore the existing snapshots"
+    )
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    if len(args.instances) < 2:
+        parser.error("Give at least two instances to compare")
+
+    with profiled(args):
+        # Fails early on an unknown instance or a missing token
+        clients = {name: get_moodle_client(name) for name in args.instances}
+
+        def snapshot(name: str):
+            return lambda: take_snapshot(
+                clients[name],
+                args.directory / name,
+                full=args.full,
+                max_workers=get_instance(name).max_workers,
+            )
+
+        with step("snapshots"):
+            run_concurrently(
+                {name: snapshot(name) for name in args.instances},
+                max_workers=len(args.instances),
+            )
+
+        keys = {
+            name: compared_keys(Snapshot(args.directory / name))
+            for name in args.instances
+        }
+        reference, *others = args.instances
+        comparisons = {}
+        for other in others:
+            comparisons[other] = compare(keys[reference], keys[other])
+            print_comparison(reference, other, comparisons[other])
+
+        report = {
+            "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "reference": reference,
+            "urls": {name: client.url for name, client in clients.items()},
+            "comparisons": comparisons,
+        }
+        path = args.directory / COMPARISON
+        path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        log.info("comparison written", path=str(path))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,23 +4,41 @@ The prefix should be something like "2324_".
 
 We need this script because there is no bulk cohort delete in the moodle admin interface
 
+With --plan, only prints the deletion calls that would be made, and an
+estimate of how long they would take (see lib/plan.py).
+
+Deleted cohorts are recorded in a journal (see lib/journal.py). If the run
+dies midway, rerun with --resume to delete the remaining cohorts straight away.
+The cohorts of the plan that are gone by then count as deleted.
+
 Uses the Moodle API
 """
 
 import argparse
 import sys
+from collections.abc import Sequence
 
 import structlog
 
 from lib.config import get_moodle_client
+from lib.instances import PRODUCTION, add_instance_arguments
+from lib.journal import Journal, journal_path
+from lib.logs import add_log_arguments, configure_logging
 from lib.moodle_api import MoodleClient
+from lib.parallel import chunked
+from lib.plan import Call, add_plan_arguments, print_plan
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.progress import Progress
 
 log = structlog.get_logger()
 
 BATCH_SIZE = 500
 
+# Cohorts are deleted in smaller batches, each one recorded in the journal
+DELETE_BATCH_SIZE = 50
+
 
-def delete_moodle_cohorts_with_prefix(moodle: MoodleClient, prefix: str):
+def search_cohorts(moodle: MoodleClient, prefix: str) -> list:
     result = moodle(
         "core_cohort_search_cohorts",
         query=prefix,
@@ -30,7 +48,18 @@ def delete_moodle_cohorts_with_prefix(moodle: MoodleClient, prefix: str):
         limitfrom=0,
         limitnum=BATCH_SIZE,
     )
-    cohorts_to_delete = result.cohorts
+    return result.cohorts
+
+
+def delete_moodle_cohorts_with_prefix(
+    moodle: MoodleClient,
+    prefix: str,
+    batch_size: int = DELETE_BATCH_SIZE,
+    plan: bool = False,
+    instance: str = PRODUCTION,
+):
+    with step("search cohorts"):
+        cohorts_to_delete = search_cohorts(moodle, prefix)
 
     if not cohorts_to_delete:
         print("No cohorts found, nothing to do")
@@ -42,6 +71,11 @@ def delete_moodle_cohorts_with_prefix(moodle: MoodleClient, prefix: str):
             name=cohort.name,
         )
 
+    items = [{"id": c.id, "name": c.name} for c in cohorts_to_delete]
+    if plan:
+        print_plan(deletion_calls(items, batch_size))
+        return
+
     print()
     user_input = input(
         f"Do you want to delete these {len(cohorts_to_delete)} cohorts (yes/no): "
@@ -50,18 +84,82 @@ def delete_moodle_cohorts_with_prefix(moodle: MoodleClient, prefix: str):
         print("Aborting")
         sys.exit(0)
 
-    cohort_ids_to_delete = [cohort.id for cohort in cohorts_to_delete]
-    moodle("core_cohort_delete_cohorts", cohortids=cohort_ids_to_delete)
-    log.info("Done")
+    journal = Journal.start(
+        journal_path("delete_cohorts_with_prefix", prefix, instance), items
+    )
+    delete_journaled_cohorts(moodle, journal, batch_size)
 
 
-if __name__ == "__main__":
+def deletion_call(cohorts: Sequence[dict]) -> Call:
+    return Call("core_cohort_delete_cohorts", {"cohortids": [c["id"] for c in cohorts]})
+
+
+def deletion_calls(cohorts: list[dict], batch_size: int) -> list[Call]:
+    return [deletion_call(batch) for batch in chunked(cohorts, batch_size)]
+
+
+def delete_journaled_cohorts(
+    moodle: MoodleClient, journal: Journal, batch_size: int = DELETE_BATCH_SIZE
+):
+    with step("delete cohorts"):
+        pending = journal.pending()
+        progress = Progress("delete cohorts", len(pending), bar=True)
+        for batch in chunked(pending, batch_size):
+            with progress.timed(len(batch)):
+                deletion_call(batch).make(moodle)
+            for cohort in batch:
+                journal.record_done(cohort["id"])
+    log.info("Done", **journal.throughput())
+
+
+def resume_deletion(
+    moodle: MoodleClient,
+    prefix: str,
+    journal: Journal,
+    batch_size: int = DELETE_BATCH_SIZE,
+):
+    # The batch in flight when the run died may be deleted already, and
+    # core_cohort_delete_cohorts fails on the ids it doesn't find
+    journal.record_gone(c.id for c in search_cohorts(moodle, prefix))
+    delete_journaled_cohorts(moodle, journal, batch_size)
+
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser(
         description=f"Deletes {BATCH_SIZE} moodle cohorts that start with a prefix"
     )
     parser.add_argument("prefix")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Delete the cohorts left over by an interrupted run",
+    )
+    add_plan_arguments(parser, DELETE_BATCH_SIZE)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        moodle = get_moodle_client(args.instance)
+
+        if args.resume:
+            path = journal_path(
+                "delete_cohorts_with_prefix", args.prefix, args.instance
+            )
+            if not path.exists():
+                sys.exit(f"No journal to resume from at {path}")
+            journal = Journal.resume(path)
+            if args.plan:
+                print_plan(deletion_calls(journal.pending(), args.batch_size))
+            else:
+                resume_deletion(moodle, args.prefix, journal, args.batch_size)
+        else:
+            delete_moodle_cohorts_with_prefix(
+                moodle, args.prefix, args.batch_size, args.plan, args.instance
+            )
 
-    moodle = get_moodle_client()
 
-    delete_moodle_cohorts_with_prefix(moodle, args.prefix)
+if __name__ == "__main__":
+    main()
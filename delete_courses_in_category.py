@@ -9,26 +9,46 @@ Automatically unenrolls students and teachers from the deleted courses.
 We need this script because doing so manually for a large number
 of courses just hangs.
 
+With --plan, only prints the deletion calls that would be made, and an
+estimate of how long they would take (see lib/plan.py).
+
+Every deleted course is recorded in a journal (see lib/journal.py). If the run
+dies midway, rerun with --resume to delete the remaining courses straight away.
+The courses of the plan that are gone by then count as deleted.
+
 Uses the Moodle API
 """
 
 import argparse
+import sys
+from collections.abc import Sequence
 
-import progressbar
 import structlog
 
 from lib.config import get_moodle_client
+from lib.instances import PRODUCTION, add_instance_arguments
+from lib.journal import Journal, journal_path
+from lib.logs import add_log_arguments, configure_logging
 from lib.moodle_api import MoodleClient
+from lib.parallel import chunked
+from lib.plan import Call, add_plan_arguments, print_plan
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.progress import Progress
 
 log = structlog.get_logger()
 
+# We delete the courses one by one even though the API can do many at a
+# time. This is because we are weary of the php script time limit.
+DELETE_BATCH_SIZE = 1
+
 
-def delete_moodle_courses(moodle: MoodleClient, category_id: str):
-    categories_to_delete = moodle(
+def collect_courses(moodle: MoodleClient, category_id: str) -> list:
+    """The courses of the category and of its subcategories."""
+    categories = moodle(
         "core_course_get_categories", criteria=[{"key": "id", "value": category_id}]
     )
-    courses_to_delete = []
-    for category in categories_to_delete:
+    courses = []
+    for category in categories:
         log.info(
             "collecting courses",
             category=category.name,
@@ -37,7 +57,19 @@ def delete_moodle_courses(moodle: MoodleClient, category_id: str):
         courses_in_category = moodle(
             "core_course_get_courses_by_field", field="category", value=category.id
         )
-        courses_to_delete.extend(courses_in_category.courses)
+        courses.extend(courses_in_category.courses)
+    return courses
+
+
+def delete_moodle_courses(
+    moodle: MoodleClient,
+    category_id: str,
+    batch_size: int = DELETE_BATCH_SIZE,
+    plan: bool = False,
+    instance: str = PRODUCTION,
+):
+    with step("collect courses"):
+        courses_to_delete = collect_courses(moodle, category_id)
 
     if not courses_to_delete:
         print("No courses found, nothing to do")
@@ -50,6 +82,11 @@ def delete_moodle_courses(moodle: MoodleClient, category_id: str):
             category=course.categoryname,
         )
 
+    items = [{"id": c.id, "shortname": c.shortname} for c in courses_to_delete]
+    if plan:
+        print_plan(deletion_calls(items, batch_size))
+        return
+
     print()
     user_input = input(
         f"Do you want to delete these {len(courses_to_delete)} courses (yes/no): "
@@ -58,14 +95,50 @@ def delete_moodle_courses(moodle: MoodleClient, category_id: str):
         print("Aborting")
         return
 
-    # We delete the courses one by one even though the API can do many at a
-    # time. This is because we are weary of the php script time limit.
-    for course in progressbar.progressbar(courses_to_delete):
-        log.info("deleting course", course=course.shortname)
-        moodle("core_course_delete_courses", courseids=[course.id])
+    journal = Journal.start(
+        journal_path("delete_courses_in_category", category_id, instance), items
+    )
+    delete_journaled_courses(moodle, journal, batch_size)
 
 
-if __name__ == "__main__":
+def deletion_call(courses: Sequence[dict]) -> Call:
+    return Call("core_course_delete_courses", {"courseids": [c["id"] for c in courses]})
+
+
+def deletion_calls(courses: list[dict], batch_size: int) -> list[Call]:
+    return [deletion_call(batch) for batch in chunked(courses, batch_size)]
+
+
+def delete_journaled_courses(
+    moodle: MoodleClient, journal: Journal, batch_size: int = DELETE_BATCH_SIZE
+):
+    with step("delete courses"):
+        pending = journal.pending()
+        progress = Progress("delete courses", len(pending), bar=True)
+        for batch in chunked(pending, batch_size):
+            log.info("deleting courses", courses=[c["shortname"] for c in batch])
+            with progress.timed(len(batch)):
+                result = deletion_call(batch).make(moodle)
+            # e.g. a course that no longer exists
+            for warning in result.warnings:
+                log.warning("not deleted", **warning)
+            for course in batch:
+                journal.record_done(course["id"])
+    log.info("done", **journal.throughput())
+
+
+def resume_deletion(
+    moodle: MoodleClient,
+    category_id: str,
+    journal: Journal,
+    batch_size: int = DELETE_BATCH_SIZE,
+):
+    # The batch in flight when the run died may be deleted already
+    journal.record_gone(c.id for c in collect_courses(moodle, category_id))
+    delete_journaled_courses(moodle, journal, batch_size)
+
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser(
         description="Deletes all moodle courses living under a given category"
     )
@@ -73,8 +146,37 @@ if __name__ == "__main__":
         "category_id",
         help="The root category containing the courses to delete",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Delete the courses left over by an interrupted run",
+    )
+    add_plan_arguments(parser, DELETE_BATCH_SIZE)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        moodle = get_moodle_client(args.instance)
+
+        if args.resume:
+            path = journal_path(
+                "delete_courses_in_category", args.category_id, args.instance
+            )
+            if not path.exists():
+                sys.exit(f"No journal to resume from at {path}")
+            journal = Journal.resume(path)
+            if args.plan:
+                print_plan(deletion_calls(journal.pending(), args.batch_size))
+            else:
+                resume_deletion(moodle, args.category_id, journal, args.batch_size)
+        else:
+            delete_moodle_courses(
+                moodle, args.category_id, args.batch_size, args.plan, args.instance
+            )
 
-    moodle = get_moodle_client()
 
-    delete_moodle_courses(moodle, args.category_id)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Takes a csv obtained by running prepare_students.py
+
+compares, cohort by cohort, the students found in moodle vs the students in the
+file: every cohortN column of the file says which cohorts a student should be in.
+
+All the cohorts of the file, and all the cohorts of moodle starting with the
+year prefix, are checked. Their members are fetched in concurrent batches, and
+the user ids are resolved to emails in a single deduplicated lookup.
+
+Uses the Moodle API
+"""
+
+import argparse
+
+import polars as pl
+import polars.selectors as cs
+import structlog
+
+from lib.cohort import fetch_cohort_members, fetch_user_emails
+from lib.config import get_moodle_client
+from lib.diff import STATUS, diff_rows
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS
+from lib.profiling import add_profile_arguments, profiled
+from lib.schoolyear import add_schoolyear_argument
+from lib.snapshot import fetch_cohorts
+
+log = structlog.get_logger()
+
+COHORT = "cohort"
+EMAIL = "email"
+_EMAIL_MATCH = "email_match"
+
+
+def wanted_memberships(src: pl.DataFrame) -> pl.DataFrame:
+    """One (cohort, email) row per cohortN cell of the file."""
+    return (
+        src.unpivot(index=EMAIL, on=cs.starts_with(COHORT), value_name=COHORT)
+        .drop_nulls(COHORT)
+        .select(COHORT, EMAIL)
+        .unique()
+    )
+
+
+def fetch_memberships(
+    moodle: MoodleClient,
+    cohorts: pl.DataFrame,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> pl.DataFrame:
+    """One (cohort, email) row per member of each of the cohorts (id, name)."""
+    members = fetch_cohort_members(moodle, cohorts["id"].to_list(), max_workers)
+    emails = fetch_user_emails(
+        moodle, (u for user_ids in members.values() for u in user_ids), max_workers
+    )
+
+    names = dict(zip(cohorts["id"], cohorts["name"], strict=True))
+    return pl.DataFrame(
+        [
+            {COHORT: names[cohort_id], EMAIL: emails[user_id]}
+            for cohort_id, user_ids in members.items()
+            for user_id in user_ids
+            if user_id in emails
+        ],
+        schema={COHORT: pl.String, EMAIL: pl.String},
+    )
+
+
+def diff_memberships(existing: pl.DataFrame, wanted: pl.DataFrame) -> pl.DataFrame:
+    """The (cohort, email) pairs that are only on one side, with a status column.
+
+    Emails are compared case-insensitively, each side keeps its own spelling.
+    """
+    match = pl.col(EMAIL).str.to_lowercase().alias(_EMAIL_MATCH)
+    return diff_rows(
+        existing.with_columns(match),
+        wanted.with_columns(match),
+        on=[COHORT, _EMAIL_MATCH],
+    ).drop(_EMAIL_MATCH)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("students_csv")
+    parser.add_argument("--output", help="Write every difference to this csv")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    add_schoolyear_argument(parser)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        wanted = wanted_memberships(pl.read_csv(args.students_csv))
+        log.info(
+            "wanted memberships",
+            count=len(wanted),
+            cohort_count=wanted[COHORT].n_unique(),
+        )
+
+        moodle = get_moodle_client(args.instance)
+        cohorts = fetch_cohorts(moodle)
+        wanted_names = wanted[COHORT].unique().implode()
+        unknown = wanted.filter(~pl.col(COHORT).is_in(cohorts["name"].implode()))
+        if len(unknown):
+            log.warning(
+                "cohorts not in moodle",
+                cohorts=unknown[COHORT].unique().sort().to_list(),
+            )
+
+        checked = cohorts.filter(
+            pl.col("name").str.starts_with(f"{args.schoolyear.prefix}_")
+            | pl.col("name").is_in(wanted_names)
+        )
+        existing = fetch_memberships(moodle, checked, args.max_workers)
+
+        diff = diff_memberships(existing, wanted)
+        for (cohort, status), group in diff.group_by(
+            COHORT, STATUS, maintain_order=True
+        ):
+            log.info(status, cohort=cohort, count=len(group))
+        log.info("done", difference_count=len(diff))
+
+        if args.output:
+            diff.write_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
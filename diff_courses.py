@@ -5,59 +5,97 @@ Takes:
 
 compares the list of courses found in moodle vs the list of courses in the file
 
-Uses the Moodle API
+Uses the Moodle API, or a snapshot taken by snapshot.py (--snapshot)
 """
 
 import argparse
+from pathlib import Path
 
 import polars as pl
 import structlog
 
+from lib.columns import COURSE_SHORTNAME
 from lib.config import get_moodle_client
+from lib.diff import KeyDiff, diff_keys, report_diff
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
 from lib.moodle_api import MoodleClient
-from preprocess_teachers_and_courses import COURSE_SHORTNAME
+from lib.parallel import map_concurrently
+from lib.profiling import add_profile_arguments, profiled
+from lib.schemas import Category, Courses
+from lib.snapshot import Snapshot
 
 log = structlog.get_logger()
 
 
-def diff_courses(moodle: MoodleClient, course_category_id: str, src: pl.DataFrame):
-    categories = moodle(
+def fetch_existing_shortnames(
+    moodle: MoodleClient, course_category_id: str
+) -> set[str]:
+    categories = moodle.call_as(
+        list[Category],
         "core_course_get_categories",
         criteria=[{"key": "id", "value": course_category_id}],
     )
     categories.sort(key=lambda x: x.id)
 
-    existing_courses = []
-    for category in categories:
+    def collect(category):
         log.debug(
             "collecting courses",
             category=category.name,
             course_count=category.coursecount,
         )
-        courses_in_category = moodle(
-            "core_course_get_courses_by_field", field="category", value=category.id
+        courses_in_category = moodle.call_as(
+            Courses,
+            "core_course_get_courses_by_field",
+            field="category",
+            value=category.id,
         )
-        existing_courses.extend(courses_in_category.courses)
+        return courses_in_category.courses
 
-    wanted = set(src[COURSE_SHORTNAME])
-    existing = {c.shortname for c in existing_courses}
+    existing_courses = [
+        course
+        for courses in map_concurrently(collect, categories, progress="fetch courses")
+        for course in courses
+    ]
 
-    # We just display these, in case the user wants to remove them
-    extra = sorted(existing - wanted)
-    log.info("in moodle but not in file", courses=extra)
+    return {c.shortname for c in existing_courses}
 
-    missing = sorted(wanted - existing)
-    log.info("in file but not in moodle", courses=missing)
 
+def diff_courses(
+    existing: set[str], src: pl.DataFrame, output: Path | None = None
+) -> KeyDiff:
+    diff = diff_keys(existing, src[COURSE_SHORTNAME])
+    report_diff(diff, "courses", output)
+    return diff
 
-if __name__ == "__main__":
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("course_category_id")
     parser.add_argument("preprocessed")
+    parser.add_argument("--snapshot", type=Path, help="Use this snapshot directory")
+    parser.add_argument(
+        "--output", type=Path, help="Write all the differences to this csv file"
+    )
 
-    args = parser.parse_args()
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
 
-    preprocessed = pl.read_csv(args.preprocessed)
+    with profiled(args):
+        preprocessed = pl.read_csv(args.preprocessed)
 
-    moodle = get_moodle_client()
-    diff_courses(moodle, args.course_category_id, preprocessed)
+        if args.snapshot:
+            existing = Snapshot(args.snapshot).course_shortnames(
+                int(args.course_category_id)
+            )
+        else:
+            moodle = get_moodle_client(args.instance)
+            existing = fetch_existing_shortnames(moodle, args.course_category_id)
+        diff_courses(existing, preprocessed, args.output)
+
+
+if __name__ == "__main__":
+    main()
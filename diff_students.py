@@ -6,38 +6,58 @@ Takes:
 
 compares the list of students found in moodle vs the list of students in the file
 
-Uses the Moodle API
+Uses the Moodle API, or a snapshot taken by snapshot.py (--snapshot)
 """
 
 import argparse
+from pathlib import Path
 
 import polars as pl
 import structlog
 
 from lib.cohort import fetch_cohort_member_emails, report_email_diff
 from lib.config import get_moodle_client
-from lib.moodle_api import MoodleClient
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.profiling import add_profile_arguments, profiled
+from lib.snapshot import Snapshot
 
 log = structlog.get_logger()
 
 
-def diff_students(moodle: MoodleClient, yearly_cohort_id: str, src: pl.DataFrame):
-    existing = fetch_cohort_member_emails(moodle, yearly_cohort_id)
+def diff_students(existing: set[str], src: pl.DataFrame, output: Path | None = None):
+    log.info("wanted students", count=src["email"].n_unique())
 
-    wanted = set(src["email"])
-    log.info("wanted students", count=len(wanted))
+    report_email_diff(existing, src["email"], output)
 
-    report_email_diff(existing, wanted)
 
-
-if __name__ == "__main__":
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("yearly_cohort_id")
     parser.add_argument("students_csv")
+    parser.add_argument("--snapshot", type=Path, help="Use this snapshot directory")
+    parser.add_argument(
+        "--output", type=Path, help="Write all the differences to this csv file"
+    )
+
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        wanted = pl.read_csv(args.students_csv)
+
+        if args.snapshot:
+            existing = Snapshot(args.snapshot).cohort_member_emails(
+                int(args.yearly_cohort_id)
+            )
+        else:
+            moodle = get_moodle_client(args.instance)
+            existing = fetch_cohort_member_emails(moodle, args.yearly_cohort_id)
+        diff_students(existing, wanted, args.output)
 
-    args = parser.parse_args()
 
-    wanted = pl.read_csv(args.students_csv)
-
-    moodle = get_moodle_client()
-    diff_students(moodle, args.yearly_cohort_id, wanted)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+An archive of the outputs of every run, year after year, to answer questions
+like "which students left since last year" or "which courses changed teacher"
+without digging through old files.
+
+Each run stores its output as Parquet, partitioned by dataset, schoolyear and
+run (a UTC timestamp), the way polars reads partitions back:
+
+    archive/preprocessed/schoolyear=2026/run=20260820T093000/part-0.parquet
+    archive/students/schoolyear=2026/run=20260821T101500/part-0.parquet
+
+The queries scan the whole archive lazily: the filters on schoolyear and run
+select the files to read, so only the years asked about are ever loaded.
+A year is represented by its latest run.
+
+The passwords are not archived. --no-archive skips the archiving.
+"""
+
+import argparse
+from datetime import UTC, datetime
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.columns import CLASS, COURSE, TEACHER_EMAIL
+from lib.schoolyear import SchoolYear
+
+log = structlog.get_logger()
+
+ARCHIVE_DIR = Path("archive")
+
+# Datasets
+PREPROCESSED = "preprocessed"
+STUDENTS = "students"
+
+# Partition columns
+SCHOOLYEAR = "schoolyear"
+RUN = "run"
+
+RUN_FORMAT = "%Y%m%dT%H%M%S"
+
+SECRET_COLUMNS = ["password"]
+
+# Values of the change column of student_churn
+JOINED = "joined"
+LEFT = "left"
+
+
+def add_archive_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help=f"Don't keep a copy of the output in {ARCHIVE_DIR}",
+    )
+
+
+def new_run() -> str:
+    return datetime.now(UTC).strftime(RUN_FORMAT)
+
+
+def archive_frame(
+    frame: pl.DataFrame,
+    dataset: str,
+    year: SchoolYear,
+    run: str | None = None,
+    root: Path = ARCHIVE_DIR,
+) -> Path:
+    """Store frame as the output of a run for year, return the file written."""
+    directory = (
+        root / dataset / f"{SCHOOLYEAR}={year.start_yyyy}" / f"{RUN}={run or new_run()}"
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "part-0.parquet"
+    frame.drop(SECRET_COLUMNS, strict=False).write_parquet(path)
+    log.info("archived", dataset=dataset, path=str(path), row_count=len(frame))
+    return path
+
+
+def runs(dataset: str, year: SchoolYear, root: Path = ARCHIVE_DIR) -> list[str]:
+    """The runs archived for year, oldest first."""
+    directory = root / dataset / f"{SCHOOLYEAR}={year.start_yyyy}"
+    return sorted(
+        p.name.removeprefix(f"{RUN}=") for p in directory.glob(f"{RUN}=*") if p.is_dir()
+    )
+
+
+def scan(dataset: str, root: Path = ARCHIVE_DIR) -> pl.LazyFrame:
+    """All the runs of dataset, with schoolyear and run columns."""
+    return pl.scan_parquet(
+        root / dataset / "**" / "*.parquet",
+        hive_partitioning=True,
+        hive_schema={SCHOOLYEAR: pl.Int64, RUN: pl.String},
+    )
+
+
+def scan_year(dataset: str, year: SchoolYear, root: Path = ARCHIVE_DIR) -> pl.LazyFrame:
+    """The latest run of dataset for year."""
+    archived = runs(dataset, year, root)
+    if not archived:
+        raise ValueError(f"Nothing archived in {dataset} for {year.long_label}")
+    return scan(dataset, root).filter(
+        pl.col(SCHOOLYEAR) == year.start_yyyy, pl.col(RUN) == archived[-1]
+    )
+
+
+def student_churn(
+    before: SchoolYear, after: SchoolYear, root: Path = ARCHIVE_DIR
+) -> pl.DataFrame:
+    """The students that joined or left between two years: email, change."""
+    emails_before = scan_year(STUDENTS, before, root).select(
+        pl.col("username").alias("email")
+    )
+    emails_after = scan_year(STUDENTS, after, root).select(
+        pl.col("username").alias("email")
+    )
+    return (
+        pl.concat(
+            [
+                emails_after.join(emails_before, on="email", how="anti").with_columns(
+                    change=pl.lit(JOINED)
+                ),
+                emails_before.join(emails_after, on="email", how="anti").with_columns(
+                    change=pl.lit(LEFT)
+                ),
+            ]
+        )
+        .unique()
+        .sort("change", "email")
+        .collect()
+    )
+
+
+def course_reassignments(
+    before: SchoolYear, after: SchoolYear, root: Path = ARCHIVE_DIR
+) -> pl.DataFrame:
+    """The courses (class and course) taught both years, but by other teachers.
+
+    Columns: class, course, teachers_before, teachers_after
+    """
+
+    def teachers(year: SchoolYear) -> pl.LazyFrame:
+        return (
+            scan_year(PREPROCESSED, year, root)
+            .group_by(CLASS, COURSE)
+            .agg(pl.col(TEACHER_EMAIL).str.to_lowercase().unique().sort())
+        )
+
+    return (
+        teachers(before)
+        .join(teachers(after), on=[CLASS, COURSE], suffix="_after")
+        .rename({TEACHER_EMAIL: "teachers_before"})
+        .rename({f"{TEACHER_EMAIL}_after": "teachers_after"})
+        .filter(pl.col("teachers_before") != pl.col("teachers_after"))
+        .sort(CLASS, COURSE)
+        .collect()
+    )
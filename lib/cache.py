@@ -0,0 +1,104 @@
+"""
+A cache of the frames computed by preprocess_teachers_and_courses.py and the
+prepare_* scripts, so that running them again on unchanged inputs costs next
+to nothing.
+
+A stage's result is stored as Parquet under a key made of:
+- the content of its input files,
+- the configuration it depends on (schoolyear, salt...),
+- the code: the script and everything in lib/.
+Change any of those and the key changes, so there is nothing to invalidate.
+On a hit, the frame is read back and written out as usual.
+
+The cache lives in .cache/stages, keeping the most recent entries of each
+stage. It holds the same data as the outputs (passwords included), so it must
+stay as private as they are. --no-cache computes everything again.
+"""
+
+import argparse
+import hashlib
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.pipeline import fingerprint_file
+
+log = structlog.get_logger()
+
+CACHE_DIR = Path(".cache/stages")
+LIB_DIR = Path(__file__).parent
+
+MAX_ENTRIES_PER_STAGE = 10
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Compute again, even if the inputs didn't change",
+    )
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def stage_key(
+    stage: str,
+    inputs: list[Path],
+    config: dict[str, str],
+    code: list[Path],
+) -> str:
+    digest = hashlib.sha256(stage.encode())
+    for path in inputs:
+        digest.update(fingerprint_file(path).encode())
+    for name in sorted(config):
+        digest.update(f"{name}={config[name]}".encode())
+    for path in [*code, *sorted(LIB_DIR.glob("*.py"))]:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def cached_frame(
+    args: argparse.Namespace,
+    stage: str,
+    inputs: list[str | Path],
+    config: dict[str, str],
+    code: list[str | Path],
+    compute: Callable[[], pl.DataFrame],
+) -> pl.DataFrame:
+    """The result of compute, from the cache if its inputs didn't change.
+
+    code lists the source files of the stage outside of lib/, usually just
+    the script (__file__).
+    """
+    start = time.perf_counter()
+    key = stage_key(stage, [Path(p) for p in inputs], config, [Path(p) for p in code])
+    path = CACHE_DIR / stage / f"{key}.parquet"
+
+    if path.exists() and not args.no_cache:
+        frame = pl.read_parquet(path)
+        path.touch()  # Keeps it among the most recent entries
+        _report(stage, "reused", key, start)
+        return frame
+
+    frame = compute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    frame.write_parquet(path)
+    _prune(path.parent)
+    _report(stage, "computed", key, start)
+    return frame
+
+
+def _report(stage: str, outcome: str, key: str, start: float):
+    seconds = round(time.perf_counter() - start, 3)
+    log.info("stage " + outcome, stage=stage, key=key[:12], seconds=seconds)
+
+
+def _prune(directory: Path):
+    entries = sorted(directory.glob("*.parquet"), key=lambda p: p.stat().st_mtime)
+    for old in entries[:-MAX_ENTRIES_PER_STAGE]:
+        old.unlink()
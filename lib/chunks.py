@@ -0,0 +1,167 @@
+"""
+Splits a Moodle import file into chunks, for when the upload pages time out on
+the whole file.
+
+With --chunk-rows and/or --chunk-bytes, a prepare_* script writes, instead of
+its output file (e.g. students.csv):
+- students.part001.csv, students.part002.csv... in the order of the output,
+  each with the full header and at most that many rows and/or bytes,
+- students.manifest.json, listing the chunks with their row count, size and
+  sha256, so that each upload can be checked and retried on its own.
+
+All the chunks have the same columns, so they can be uploaded in any order,
+from several browser sessions at once.
+
+Like the unchunked output, the chunks are rendered a slice of rows at a time
+(see lib/widecsv.py), so the whole wide csv is never in memory.
+"""
+
+import argparse
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.widecsv import Spread, iter_wide_csv, write_wide_csv
+
+log = structlog.get_logger()
+
+
+def add_chunk_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        metavar="N",
+        help="Split the output into chunk files of at most N rows",
+    )
+    parser.add_argument(
+        "--chunk-bytes",
+        type=int,
+        metavar="N",
+        help="Split the output into chunk files of at most N bytes",
+    )
+
+
+def write_output(
+    frame: pl.DataFrame,
+    path: str | Path,
+    args: argparse.Namespace,
+    spreads: dict[str, Spread] | None = None,
+):
+    """Write frame to path, in chunks if asked to on the command line."""
+    spreads = spreads or {}
+    if args.chunk_rows or args.chunk_bytes:
+        write_chunks(frame, Path(path), spreads, args.chunk_rows, args.chunk_bytes)
+    else:
+        write_wide_csv(frame, path, spreads)
+
+
+def chunk_path(path: Path, number: int) -> Path:
+    return path.with_name(f"{path.stem}.part{number:03}{path.suffix}")
+
+
+def manifest_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.manifest.json")
+
+
+def split_rows(
+    rows: Iterable[bytes],
+    header_size: int,
+    max_rows: int | None,
+    max_bytes: int | None,
+) -> Iterator[list[bytes]]:
+    """Group consecutive rows so that no group goes over the limits.
+
+    A row too large to fit any chunk gets a chunk of its own.
+    """
+    current: list[bytes] = []
+    size = header_size
+    for row in rows:
+        too_many = max_rows is not None and len(current) >= max_rows
+        too_big = max_bytes is not None and size + len(row) > max_bytes
+        if current and (too_many or too_big):
+            yield current
+            current, size = [], header_size
+        if max_bytes is not None and header_size + len(row) > max_bytes:
+            log.warning("row larger than a chunk", row_bytes=len(row))
+        current.append(row)
+        size += len(row)
+    if current:
+        yield current
+
+
+def _has_line_breaks(frame: pl.DataFrame) -> bool:
+    texts = [
+        pl.col(name) if dtype == pl.String else pl.col(name).list.join("")
+        for name, dtype in frame.schema.items()
+        if dtype in (pl.String, pl.List(pl.String))
+    ]
+    if not texts:
+        return False
+    return frame.select(
+        pl.any_horizontal(t.str.contains("[\\r\\n]").any() for t in texts)
+    ).item()
+
+
+def write_chunks(
+    frame: pl.DataFrame,
+    path: Path,
+    spreads: dict[str, Spread],
+    max_rows: int | None,
+    max_bytes: int | None,
+) -> dict:
+    # A value with a line break: we'd cut a row in half
+    if _has_line_breaks(frame):
+        raise ValueError("Can't split an output with multi-line values")
+
+    slices = iter_wide_csv(frame, spreads)
+    _, first = next(slices)
+    header, *first_rows = first.splitlines(keepends=True)
+
+    def rows() -> Iterator[bytes]:
+        yield from first_rows
+        for _, content in slices:
+            yield from content.splitlines(keepends=True)
+
+    # Leftovers of a previous run with more chunks would get uploaded by mistake
+    for stale in path.parent.glob(f"{path.stem}.part[0-9]*{path.suffix}"):
+        # Past part999 the numbers have more digits
+        if stale.stem.removeprefix(f"{path.stem}.part").isdigit():
+            stale.unlink()
+
+    chunks = []
+    row_count = 0
+    for number, group in enumerate(
+        split_rows(rows(), len(header), max_rows, max_bytes), start=1
+    ):
+        row_count += len(group)
+        data = header + b"".join(group)
+        chunk = chunk_path(path, number)
+        chunk.write_bytes(data)
+        chunks.append(
+            {
+                "file": chunk.name,
+                "rows": len(group),
+                "bytes": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+        )
+
+    manifest = {
+        "source": path.name,
+        "rows": row_count,
+        "max_rows": max_rows,
+        "max_bytes": max_bytes,
+        "chunks": chunks,
+    }
+    manifest_path(path).write_text(json.dumps(manifest, indent=2))
+    log.info(
+        "written in chunks",
+        manifest=str(manifest_path(path)),
+        row_count=row_count,
+        chunk_count=len(chunks),
+    )
+    return manifest
@@ -0,0 +1,140 @@
+"""
+A circuit breaker for the calls to Moodle, shared by all the threads of a
+client.
+
+When the server is down, every worker of a concurrent run would otherwise go
+through its own timeouts and retries, and they would all hammer the server
+again the moment it comes back. Instead, after FAILURE_THRESHOLD calls in a
+row fail with an outage (connection error, timeout, 5xx), the circuit opens:
+- the calls wait, without reaching the server, for a cooldown,
+- then a single call goes through as a probe, the others waiting for it,
+- if the probe succeeds the circuit closes and everyone resumes, otherwise
+  the cooldown doubles (up to MAX_COOLDOWN) and the next probe waits for it.
+
+Once the server has been down for GIVE_UP_AFTER seconds, the calls fail fast
+with CircuitOpenError rather than waiting any longer, but for the probes,
+so that the circuit still closes when the server comes back.
+"""
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import requests
+import structlog
+
+log = structlog.get_logger()
+
+FAILURE_THRESHOLD = 5
+
+# Seconds
+COOLDOWN = 5
+MAX_COOLDOWN = 60
+GIVE_UP_AFTER = 600
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling a server that has been down for too long."""
+
+
+def is_outage(e: Exception) -> bool:
+    """Whether the error says the server is down, rather than the call wrong."""
+    if isinstance(e, requests.HTTPError):
+        # Without a response, the error was relayed by the sidecar
+        return e.response is None or e.response.status_code >= 500
+    return isinstance(
+        e, requests.ConnectionError | requests.Timeout | requests.exceptions.RetryError
+    )
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        threshold: int = FAILURE_THRESHOLD,
+        cooldown: float = COOLDOWN,
+        max_cooldown: float = MAX_COOLDOWN,
+        give_up_after: float = GIVE_UP_AFTER,
+    ):
+        self.threshold = threshold
+        self.initial_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.give_up_after = give_up_after
+        self.failures = 0  # In a row
+        self._cooldown = cooldown
+        self._opened_at: float | None = None
+        self._retry_at = 0.0
+        self._probing = False
+        self._condition = threading.Condition()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    @contextmanager
+    def call(self) -> Iterator[None]:
+        """Wraps a call to the server: waits while it is down, records the
+        outcome of the call."""
+        probe = self._wait_turn()
+        ok = None
+        try:
+            yield
+            ok = True
+        except Exception as e:
+            ok = not is_outage(e)
+            raise
+        finally:
+            # Also when interrupted (KeyboardInterrupt, SystemExit...), or a
+            # probe would never let the next one through
+            self._record(ok, probe)
+
+    def _wait_turn(self) -> bool:
+        """Returns whether the call is the probe."""
+        with self._condition:
+            while self._opened_at is not None:
+                now = time.monotonic()
+                deadline = self._opened_at + self.give_up_after
+                if not self._probing and now >= self._retry_at:
+                    self._probing = True
+                    return True
+                if now >= deadline:
+                    raise CircuitOpenError(
+                        f"Moodle has been down for {round(now - self._opened_at)}s"
+                    )
+                until = deadline if self._probing else min(self._retry_at, deadline)
+                self._condition.wait(until - now)
+            return False
+
+    def _record(self, ok: bool | None, probe: bool):
+        """ok is None when the call was interrupted, which says nothing about
+        the server."""
+        with self._condition:
+            now = time.monotonic()
+            if ok is None:
+                if probe:
+                    self._probing = False
+            elif ok:
+                if self._opened_at is not None:
+                    log.info(
+                        "circuit closed", down_seconds=round(now - self._opened_at, 1)
+                    )
+                self.failures = 0
+                self._opened_at = None
+                self._cooldown = self.initial_cooldown
+                self._probing = False
+            else:
+                self.failures += 1
+                if self._opened_at is None and self.failures >= self.threshold:
+                    self._opened_at = now
+                    self._retry_at = now + self._cooldown
+                    log.warning(
+                        "circuit open",
+                        failures=self.failures,
+                        cooldown_seconds=self._cooldown,
+                    )
+                elif probe:
+                    self._probing = False
+                    self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                    self._retry_at = now + self._cooldown
+                    log.warning("still down", cooldown_seconds=self._cooldown)
+            self._condition.notify_all()
@@ -5,36 +5,94 @@ import file, by email address.
 Shared by diff_students.py and diff_teachers.py, which both answer the same
 question: which people are in the cohort but not the file (candidates for
 removal), and which are in the file but not yet in Moodle.
+
+The batched fetchers also serve diff_cohort_members.py, which asks the same
+question for hundreds of cohorts at once.
 """
 
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+import polars as pl
 import structlog
 
+from lib.diff import KeyDiff, diff_keys, report_diff
 from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS, chunked, map_concurrently
+from lib.schemas import CohortMembers, User
 
 log = structlog.get_logger()
 
+# Both endpoints below take a list of ids. Every list element counts against
+# php's max_input_vars (1000 by default), so we stay well below it.
+MEMBERS_BATCH_SIZE = 100
+USERS_BATCH_SIZE = 500
+
 
 def fetch_cohort_member_emails(moodle: MoodleClient, cohort_id: str) -> set[str]:
     """Return the set of email addresses of the members of a cohort."""
-    response = moodle("core_cohort_get_cohort_members", cohortids=[cohort_id])
-    member_ids = response[0].userids
+    member_ids = fetch_cohort_members(moodle, [int(cohort_id)])[int(cohort_id)]
     log.info(
         "got member ids for cohort",
         cohort_id=cohort_id,
         member_count=len(member_ids),
     )
 
-    response = moodle("core_user_get_users_by_field", field="id", values=member_ids)
-    emails = {u.email for u in response}
+    emails = set(fetch_user_emails(moodle, member_ids).values())
     log.info("got member emails", email_count=len(emails))
     return emails
 
 
-def report_email_diff(existing: set[str], wanted: set[str]) -> None:
-    """Log the symmetric difference between the cohort and the file."""
-    # We just display these, in case the user wants to remove them
-    extra = sorted(existing - wanted)
-    log.info("in moodle but not in file", count=len(extra), emails=extra)
+def fetch_cohort_members(
+    moodle: MoodleClient,
+    cohort_ids: Sequence[int],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[int, list[int]]:
+    """Return the member user ids of each cohort, fetched in concurrent batches."""
+    responses = map_concurrently(
+        lambda batch: moodle.call_as(
+            list[CohortMembers],
+            "core_cohort_get_cohort_members",
+            cohortids=list(batch),
+        ),
+        chunked(cohort_ids, MEMBERS_BATCH_SIZE),
+        max_workers,
+        progress="fetch cohort members",
+    )
+    members = {c.cohortid: c.userids for r in responses for c in r}
+    log.info("got cohort members", cohort_count=len(members))
+    return members
+
+
+def fetch_user_emails(
+    moodle: MoodleClient,
+    user_ids: Iterable[int],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[int, str]:
+    """Return the email of each user, looking up every distinct id only once."""
+    unique_ids = sorted(set(user_ids))
+    responses = map_concurrently(
+        lambda batch: moodle.call_as(
+            list[User], "core_user_get_users_by_field", field="id", values=list(batch)
+        ),
+        chunked(unique_ids, USERS_BATCH_SIZE),
+        max_workers,
+        progress="fetch users",
+    )
+    emails = {u.id: u.email for r in responses for u in r if u.email}
+    log.info("got user emails", user_count=len(emails))
+    return emails
+
+
+def report_email_diff(
+    existing: Iterable[str],
+    wanted: Iterable[str] | pl.Series,
+    output: Path | None = None,
+) -> KeyDiff:
+    """Log the symmetric difference between the cohort and the file.
 
-    missing = sorted(wanted - existing)
-    log.info("in file but not in moodle", count=len(missing), emails=missing)
+    Emails are compared case-insensitively, Moodle doesn't keep their case.
+    """
+    diff = diff_keys(existing, wanted, case_insensitive=True)
+    report_diff(diff, "emails", output)
+    return diff
@@ -0,0 +1,30 @@
+"""
+Column names of the file produced by preprocess_teachers_and_courses.py
+
+All other tools feed from that file. They import these names from here rather
+than from the preprocessing script, so they don't pay for loading it.
+"""
+
+TEACHER_TLA = "teacher_tla"
+TEACHER_LASTNAME = "teacher_lastname"
+TEACHER_FIRSTNAME = "teacher_firstname"
+TEACHER_EMAIL = "teacher_email"
+CLASS = "class"
+COURSE = "course"
+COURSE_SHORTNAME = "shortname"
+COURSE_FULLNAME = "fullname"
+COURSE_CATEGORY_PATH = "category_path"
+COURSE_COHORT = "cohort"
+
+ALL_FIELDS = [
+    TEACHER_TLA,
+    TEACHER_LASTNAME,
+    TEACHER_FIRSTNAME,
+    TEACHER_EMAIL,
+    CLASS,
+    COURSE,
+    COURSE_SHORTNAME,
+    COURSE_FULLNAME,
+    COURSE_CATEGORY_PATH,
+    COURSE_COHORT,
+]
@@ -6,13 +6,22 @@ so the individual scripts don't repeat the boilerplate, and so we never
 accidentally log the token.
 """
 
+import atexit
 import os
 import sys
 
 import dotenv
 import structlog
 
-from lib.moodle_api import URL, MoodleClient
+from lib.instances import PRODUCTION, get_instance
+from lib.latency import LatencyStats, record_run
+from lib.moodle_api import (
+    DEFAULT_POOL_MAXSIZE,
+    DEFAULT_TIMEOUT,
+    READ_TIMEOUTS,
+    MoodleClient,
+)
+from lib.sidecar import SidecarClient, sidecar_running
 
 log = structlog.get_logger()
 
@@ -25,15 +34,49 @@ def _require_env(name: str) -> str:
     return value
 
 
-def get_moodle_client() -> MoodleClient:
-    """Build a MoodleClient from the TOKEN environment variable.
+def get_moodle_client(instance: str = PRODUCTION) -> MoodleClient:
+    """Build a MoodleClient for an instance (see lib/instances.py), with the
+    token from its environment variable (TOKEN for production).
 
-    Exits with an error message if TOKEN is not set.
+    Goes through the sidecar (see lib/sidecar.py) when it is running.
+    The read timeouts of production are tuned from its recorded latencies.
+
+    Exits with an error message if the instance is unknown or the token not set.
     """
-    token = _require_env("TOKEN")
+    target = get_instance(instance)
+    token = _require_env(target.token_env)
     # Note: we deliberately don't log the token, it is a secret.
-    log.info("connecting", url=URL)
-    return MoodleClient(URL, token)
+    pool_maxsize = max(target.max_workers, DEFAULT_POOL_MAXSIZE)
+    read_timeouts = None
+    if instance == PRODUCTION:
+        read_timeouts = LatencyStats.load().read_timeouts(
+            READ_TIMEOUTS, DEFAULT_TIMEOUT[1]
+        )
+        log.debug("tuned read timeouts", **read_timeouts)
+    client: MoodleClient
+    if sidecar_running():
+        log.info("connecting through the sidecar", instance=instance, url=target.url)
+        client = SidecarClient(
+            target.url,
+            token,
+            pool_maxsize=pool_maxsize,
+            max_concurrent=target.max_workers,
+            read_timeouts=read_timeouts,
+        )
+    else:
+        log.info("connecting", instance=instance, url=target.url)
+        client = MoodleClient(
+            target.url,
+            token,
+            pool_maxsize=pool_maxsize,
+            max_concurrent=target.max_workers,
+            read_timeouts=read_timeouts,
+        )
+    # So that the next --plan knows how long calls take. Only production's
+    # latencies, that's what the plans are for.
+    if instance == PRODUCTION:
+        atexit.register(record_run, client.latencies)
+    return client
 
 
 def get_salt() -> str:
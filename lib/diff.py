@@ -0,0 +1,122 @@
+"""
+Compares what exists in Moodle with what we want, key by key.
+
+The differences are computed with polars anti-joins (hash joins) instead of
+Python set arithmetic, so they stay cheap on large inputs, and come out sorted
+so that reports are stable between runs.
+
+Keys can be compared case-insensitively (emails), the differences then keep
+the spelling of their own side.
+
+report_diff logs the counts and a sample of the differences, and writes them
+all to a csv file when asked to.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+log = structlog.get_logger()
+
+KEY = "key"
+STATUS = "status"
+_MATCH = "match"
+
+EXTRA = "in moodle but not in file"
+MISSING = "in file but not in moodle"
+UNCHANGED = "in both"
+
+# Above this many differences, the log only shows the first ones
+LOG_LIMIT = 20
+
+
+@dataclass(frozen=True)
+class KeyDiff:
+    extra: pl.Series  # In moodle but not wanted
+    missing: pl.Series  # Wanted but not in moodle
+    unchanged: pl.Series  # Both in moodle and wanted
+
+    def to_dict(self) -> dict[str, list[str]]:
+        return {"extra": self.extra.to_list(), "missing": self.missing.to_list()}
+
+    def frame(self, include_unchanged: bool = False) -> pl.DataFrame:
+        """All the keys in a single frame, with their status."""
+        parts = [(self.extra, EXTRA), (self.missing, MISSING)]
+        if include_unchanged:
+            parts.append((self.unchanged, UNCHANGED))
+        return pl.concat(
+            pl.DataFrame({KEY: keys, STATUS: status}, schema=_FRAME_SCHEMA)
+            for keys, status in parts
+        )
+
+
+_FRAME_SCHEMA = pl.Schema({KEY: pl.String, STATUS: pl.String})
+
+
+def _keys(values: Iterable[str] | pl.Series, case_insensitive: bool) -> pl.DataFrame:
+    if isinstance(values, pl.Series):
+        series = values.cast(pl.String).rename(KEY)
+    else:
+        series = pl.Series(KEY, list(values), dtype=pl.String)
+    match = pl.col(KEY).str.to_lowercase() if case_insensitive else pl.col(KEY)
+    return (
+        series.drop_nulls()
+        .to_frame()
+        .with_columns(match.alias(_MATCH))
+        .unique(_MATCH, keep="first", maintain_order=True)
+    )
+
+
+def diff_keys(
+    existing: Iterable[str] | pl.Series,
+    wanted: Iterable[str] | pl.Series,
+    case_insensitive: bool = False,
+) -> KeyDiff:
+    existing_keys = _keys(existing, case_insensitive)
+    wanted_keys = _keys(wanted, case_insensitive)
+    return KeyDiff(
+        extra=existing_keys.join(wanted_keys, on=_MATCH, how="anti")[KEY].sort(),
+        missing=wanted_keys.join(existing_keys, on=_MATCH, how="anti")[KEY].sort(),
+        unchanged=wanted_keys.join(existing_keys, on=_MATCH, how="semi")[KEY].sort(),
+    )
+
+
+def diff_rows(
+    existing: pl.DataFrame, wanted: pl.DataFrame, on: list[str]
+) -> pl.DataFrame:
+    """The rows that are only on one side, with a status column, sorted.
+
+    For diffs whose keys are made of several columns, (cohort, email) pairs...
+    """
+    return pl.concat(
+        [
+            existing.join(wanted, on=on, how="anti").with_columns(
+                pl.lit(EXTRA).alias(STATUS)
+            ),
+            wanted.join(existing, on=on, how="anti").with_columns(
+                pl.lit(MISSING).alias(STATUS)
+            ),
+        ]
+    ).sort(on)
+
+
+def report_diff(diff: KeyDiff, what: str, output: Path | None = None):
+    """Log the differences, the first LOG_LIMIT of each side, and write them
+    all to output if given.
+    """
+    # We just display the extra ones, in case the user wants to remove them
+    for event, keys in ((EXTRA, diff.extra), (MISSING, diff.missing)):
+        log.info(
+            event,
+            count=len(keys),
+            **{what: keys.head(LOG_LIMIT).to_list()},
+            **({"truncated": True} if len(keys) > LOG_LIMIT else {}),
+        )
+    log.info(UNCHANGED, count=len(diff.unchanged))
+
+    if output is not None:
+        diff.frame().write_csv(output)
+        log.info("differences written", path=str(output))
@@ -0,0 +1,62 @@
+"""
+The Moodle instances the scripts can run against, by name.
+
+Production is always there. Other instances (a staging copy to rehearse the
+rollover on...) are described in instances.toml:
+
+    [staging]
+    url = "https://moodle-staging.example.ch/webservice/rest/server.php"
+    token_env = "STAGING_TOKEN"
+    max_workers = 4
+
+The token itself stays in the environment (or .env), under token_env.
+max_workers caps the number of concurrent calls the scripts make to that
+instance, whatever their --max-workers.
+"""
+
+import argparse
+import sys
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+
+from lib.moodle_api import URL
+from lib.parallel import DEFAULT_MAX_WORKERS
+
+INSTANCES_PATH = Path("instances.toml")
+
+PRODUCTION = "production"
+
+
+@dataclass(frozen=True)
+class Instance:
+    name: str
+    url: str
+    token_env: str = "TOKEN"
+    max_workers: int = DEFAULT_MAX_WORKERS
+
+
+def load_instances(path: Path = INSTANCES_PATH) -> dict[str, Instance]:
+    instances = {PRODUCTION: Instance(PRODUCTION, URL)}
+    if path.exists():
+        with path.open("rb") as f:
+            for name, fields in tomllib.load(f).items():
+                instances[name] = Instance(name, **fields)
+    return instances
+
+
+def get_instance(name: str, path: Path = INSTANCES_PATH) -> Instance:
+    """Exits with an error message if there is no such instance."""
+    instances = load_instances(path)
+    if name not in instances:
+        sys.exit(f"Unknown instance '{name}', known: {', '.join(instances)}")
+    return instances[name]
+
+
+def add_instance_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--instance",
+        default=PRODUCTION,
+        help=f"The moodle instance to use, from {INSTANCES_PATH} "
+        f"(default {PRODUCTION})",
+    )
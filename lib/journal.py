@@ -0,0 +1,132 @@
+"""
+An append-only journal of the work done by the long-running destructive
+scripts (course deletion, cohort deletion and creation), so that a rerun after
+a crash can skip straight to what is left to do.
+
+The journal is a JSON-lines file:
+- the first record is the plan, the list of items the user confirmed,
+- then one record per completed item, with a timestamp.
+
+Resuming reads the plan back and subtracts the completed items, without
+asking for confirmation again. A last record left half-written by the process
+dying is dropped. An item is only recorded once the call doing it returned, so
+the items of the call in flight when the run died are still pending, though
+they may be done (see record_gone). The timestamps double as a throughput log
+of the run.
+"""
+
+import json
+import os
+import sys
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Self
+
+import structlog
+
+from lib.instances import PRODUCTION
+
+log = structlog.get_logger()
+
+JOURNAL_DIR = Path("journals")
+
+PLAN = "plan"
+DONE = "done"
+
+
+def journal_path(script: str, key: str, instance: str = PRODUCTION) -> Path:
+    """Where a script keeps the journal of its run on key (e.g. a category id)."""
+    if instance != PRODUCTION:
+        script = f"{script}-{instance}"
+    return JOURNAL_DIR / f"{script}-{key}.jsonl"
+
+
+class Journal:
+    def __init__(self, path: Path, plan: list[dict[str, Any]], done: list[dict]):
+        self.path = path
+        self.plan = plan
+        self.done = done
+        self._done_ids = {record["id"] for record in done}
+
+    @classmethod
+    def start(cls, path: Path, items: list[dict[str, Any]]) -> Self:
+        """Start a new journal, replacing any previous one at path.
+
+        Every item must have an "id" key, the rest is just for information.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+        journal = cls(path, items, [])
+        journal._append({"type": PLAN, "at": time.time(), "items": items})
+        log.info("journal started", path=str(path), item_count=len(items))
+        return journal
+
+    @classmethod
+    def resume(cls, path: Path) -> Self:
+        lines = path.read_text().splitlines()
+        records = []
+        for i, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                if i < len(lines) - 1:
+                    raise
+                log.warning("dropping a half-written record", path=str(path))
+                # Otherwise the next record would be appended to it
+                path.write_text("".join(f"{line}\n" for line in lines[:-1]))
+        if not records or records[0]["type"] != PLAN:
+            sys.exit(f"The journal at {path} has no plan, start over")
+        plan = records[0]["items"]
+        done = [r for r in records[1:] if r["type"] == DONE]
+        journal = cls(path, plan, done)
+        log.info(
+            "journal resumed",
+            path=str(path),
+            done=len(done),
+            pending=len(journal.pending()),
+            **journal.throughput(),
+        )
+        return journal
+
+    def pending(self) -> list[dict[str, Any]]:
+        return [item for item in self.plan if item["id"] not in self._done_ids]
+
+    def record_gone(self, remaining: Iterable[Any]) -> list[Any]:
+        """Record as done the pending items whose id isn't in remaining, for the
+        deleting scripts: the call in flight when the run died may have gone
+        through. Returns their ids.
+        """
+        remaining = set(remaining)
+        gone = [item["id"] for item in self.pending() if item["id"] not in remaining]
+        for item_id in gone:
+            self.record_done(item_id)
+        if gone:
+            log.info("already deleted", count=len(gone), ids=gone)
+        return gone
+
+    def record_done(self, item_id: Any):
+        record = {"type": DONE, "at": time.time(), "id": item_id}
+        self._append(record)
+        self.done.append(record)
+        self._done_ids.add(item_id)
+
+    def throughput(self) -> dict[str, float]:
+        """Items per minute over the recorded part of the run."""
+        if len(self.done) < 2:
+            return {}
+        elapsed = self.done[-1]["at"] - self.done[0]["at"]
+        return {
+            "elapsed_minutes": round(elapsed / 60, 1),
+            "items_per_minute": round((len(self.done) - 1) / elapsed * 60, 1)
+            if elapsed
+            else 0.0,
+        }
+
+    def _append(self, record: dict):
+        # Flushed and synced on every record: the whole point is to survive
+        # the process (or the machine) dying mid-run.
+        with self.path.open("a") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,111 @@
+"""
+How long each Moodle web-service function takes, kept across runs to estimate
+how long a planned run will take (see lib/plan.py).
+
+The client records every call it makes, with the size of its payload. At the
+end of a run, the new samples are added to the latency file, which keeps the
+most recent ones for each function. Runs can end at the same time, so the file
+is updated under a lock and replaced in one go, rather than rewritten in place.
+
+A function's latency is estimated from the recorded samples as a fixed cost
+per call plus a cost per byte of payload, when the samples have different
+sizes. Otherwise it is just the median of the samples.
+
+The same samples tune the read timeouts of the quick lookups (see
+READ_TIMEOUTS in lib/moodle_api.py): a few times their slowest recent calls.
+"""
+
+import fcntl
+import json
+import os
+import statistics
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Self
+
+import structlog
+
+log = structlog.get_logger()
+
+LATENCY_PATH = Path("latency.json")
+
+# Per function, older samples are dropped
+MAX_SAMPLES = 500
+
+# A tuned read timeout is TIMEOUT_FACTOR times the 99th percentile of the
+# samples, at least MIN_READ_TIMEOUT seconds. Functions with fewer than
+# MIN_TIMEOUT_SAMPLES samples keep their timeout.
+TIMEOUT_FACTOR = 4
+MIN_READ_TIMEOUT = 10
+MIN_TIMEOUT_SAMPLES = 20
+
+
+class LatencyStats:
+    def __init__(self, samples: dict[str, list[tuple[int, float]]]):
+        # For each function, (payload bytes, seconds) pairs, oldest first
+        self.samples = samples
+
+    @classmethod
+    def load(cls, path: Path = LATENCY_PATH) -> Self:
+        if not path.exists():
+            return cls({})
+        data = json.loads(path.read_text())
+        return cls(
+            {
+                fname: [(int(size), float(s)) for size, s in samples]
+                for fname, samples in data.items()
+            }
+        )
+
+    def save(self, path: Path = LATENCY_PATH):
+        # A reader never sees a half-written file
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, prefix=path.name, delete=False
+        ) as f:
+            f.write(json.dumps(self.samples))
+        os.replace(f.name, path)
+
+    def add(self, samples: dict[str, list[tuple[int, float]]]):
+        for fname, new in samples.items():
+            kept = self.samples.get(fname, []) + new
+            self.samples[fname] = kept[-MAX_SAMPLES:]
+
+    def estimate(self, fname: str, payload_bytes: int) -> float | None:
+        """Seconds a call of fname with that payload should take, None if unknown."""
+        samples = self.samples.get(fname)
+        if not samples:
+            return None
+        sizes = [size for size, _ in samples]
+        seconds = [s for _, s in samples]
+        if len(set(sizes)) < 2:
+            return statistics.median(seconds)
+        slope, intercept = statistics.linear_regression(sizes, seconds)
+        return max(intercept + slope * payload_bytes, 0.0)
+
+    def read_timeouts(self, fnames: Iterable[str], ceiling: float) -> dict[str, float]:
+        """Read timeouts for those of fnames with enough samples, up to ceiling."""
+        timeouts = {}
+        for fname in fnames:
+            samples = self.samples.get(fname, [])
+            if len(samples) < MIN_TIMEOUT_SAMPLES:
+                continue
+            slowest = statistics.quantiles([s for _, s in samples], n=100)[-1]
+            timeouts[fname] = round(
+                min(max(slowest * TIMEOUT_FACTOR, MIN_READ_TIMEOUT), ceiling), 1
+            )
+        return timeouts
+
+
+def record_run(samples: dict[str, list[tuple[int, float]]], path: Path = LATENCY_PATH):
+    """Add the samples of this run to the latency file."""
+    if not samples:
+        return
+    # Without the lock, two runs ending together would each save what they
+    # loaded plus their own samples, and the first one's would be lost.
+    with open(path.with_name(path.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        stats = LatencyStats.load(path)
+        stats.add(samples)
+        stats.save(path)
+    log.debug("latencies recorded", path=str(path), functions=sorted(samples))
@@ -0,0 +1,141 @@
+"""
+The logging setup of the scripts, switched from the command line.
+
+By default the scripts log everything to the console, debug events included,
+as structlog does out of the box. For bulk runs:
+- --log-level info or warning drops the events below before they are even
+  rendered,
+- --log-file writes the events as json lines to a file instead, much cheaper
+  to render than the console format, and meant to be analysed afterwards.
+  The json is encoded with msgspec when it is installed,
+- --log-sample N only keeps one in N of the events logged once per item
+  (PER_ITEM_EVENTS: a line per course to delete...),
+- lists longer than --log-max-items are cut down to their first items, the
+  full length going into a <key>_count field.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+try:
+    import msgspec
+except ImportError:  # Optional, see the module docstring
+    msgspec = None  # type: ignore[assignment]
+
+LEVELS = ["debug", "info", "warning", "error"]
+
+DEFAULT_MAX_ITEMS = 100
+
+# Events logged once per item of a bulk run
+PER_ITEM_EVENTS = frozenset(
+    ["course", "cohort", "collecting courses", "deleting courses", "call"]
+)
+
+
+def add_log_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--log-level", choices=LEVELS, default="debug")
+    parser.add_argument(
+        "--log-file",
+        type=Path,
+        help="Write the logs to this file as json lines, instead of the console",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Only log one in N of the per-item events",
+    )
+    parser.add_argument(
+        "--log-max-items",
+        type=int,
+        default=DEFAULT_MAX_ITEMS,
+        metavar="N",
+        help=f"Cut the logged lists to N items, 0 to keep them whole "
+        f"(default {DEFAULT_MAX_ITEMS})",
+    )
+
+
+class Sampler:
+    """Drops all but one in every n of the per-item events, by event name."""
+
+    def __init__(self, n: int, events: frozenset[str] = PER_ITEM_EVENTS):
+        self.n = n
+        self.events = events
+        self._seen: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, logger: Any, method: str, event_dict: dict) -> dict:
+        event = event_dict.get("event")
+        if event not in self.events:
+            return event_dict
+        with self._lock:
+            seen = self._seen[event]
+            self._seen[event] += 1
+        if seen % self.n:
+            raise structlog.DropEvent
+        return event_dict
+
+
+def summarize_lists(max_items: int):
+    """A processor cutting the long lists of an event to their first items."""
+
+    def processor(logger: Any, method: str, event_dict: dict) -> dict:
+        for key, value in list(event_dict.items()):
+            if isinstance(value, list | tuple | set) and len(value) > max_items:
+                event_dict[key] = list(value)[:max_items]
+                event_dict[f"{key}_count"] = len(value)
+        return event_dict
+
+    return processor
+
+
+def _dumps(event_dict: dict, **kwargs: Any) -> str:
+    if msgspec is not None:
+        return msgspec.json.encode(event_dict, enc_hook=str).decode()
+    return json.dumps(event_dict, default=str, ensure_ascii=False)
+
+
+def configure_logging(args: argparse.Namespace):
+    processors: list[Any] = []
+    if args.log_sample > 1:
+        processors.append(Sampler(args.log_sample))
+    if args.log_max_items > 0:
+        processors.append(summarize_lists(args.log_max_items))
+    processors += [
+        structlog.processors.add_log_level,
+        structlog.processors.StackInfoRenderer(),
+        structlog.dev.set_exc_info,
+    ]
+
+    logger_factory: Any
+    if args.log_file:
+        processors += [
+            structlog.processors.TimeStamper(fmt="iso", utc=True),
+            structlog.processors.dict_tracebacks,
+            structlog.processors.JSONRenderer(serializer=_dumps),
+        ]
+        logger_factory = structlog.WriteLoggerFactory(file=args.log_file.open("a"))
+    else:
+        processors += [
+            structlog.processors.TimeStamper(fmt="%Y-%m-%d %H:%M:%S", utc=False),
+            structlog.dev.ConsoleRenderer(),
+        ]
+        logger_factory = structlog.PrintLoggerFactory(sys.stdout)
+
+    structlog.configure(
+        processors=processors,
+        # Filters the levels below before anything else runs
+        wrapper_class=structlog.make_filtering_bound_logger(
+            logging.getLevelNamesMapping()[args.log_level.upper()]
+        ),
+        logger_factory=logger_factory,
+    )
@@ -1,10 +1,19 @@
 # ruff: noqa: ANN001 ANN003 ANN204
 
+import contextlib
+import json
+import threading
+import time
+from collections import defaultdict
+
 import requests
 from munch import munchify
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from lib import schemas
+from lib.circuit import CircuitBreaker
+
 """
 Didn't find a good library that covers our needs to connect to moodle from python.
 
@@ -19,13 +28,27 @@ URL = "https://moodle.gymnasedebeaulieu.ch/webservice/rest/server.php"
 # because some calls (e.g. deleting a course) can be slow server-side.
 DEFAULT_TIMEOUT = (10, 300)
 
+# Read timeouts of the lookups that answer quickly, so that a hung one doesn't
+# stall a run for DEFAULT_TIMEOUT's. get_moodle_client tunes them from the
+# recorded latencies (see lib/latency.py). Listing all the courses takes long,
+# and a write that times out may still go through, so they keep the default.
+READ_TIMEOUTS = {
+    "core_cohort_search_cohorts": 30,
+    "core_cohort_get_cohort_members": 60,
+    "core_course_get_categories": 30,
+    "core_course_search_courses": 60,
+    "core_enrol_get_enrolled_users": 60,
+    "core_user_get_users_by_field": 60,
+}
+
 # Retry transient failures so a single network blip doesn't abort a long
-# run (e.g. the hour-plus course-deletion script). We retry on connection
-# errors and 5xx responses. Moodle web-service calls all use POST, so we
-# explicitly opt POST into the retried methods. The risk of retrying a POST
-# whose side effect actually went through (e.g. a duplicate cohort) is
-# acceptable here: these scripts are run interactively and their results are
-# diffed against Moodle afterwards.
+# run (e.g. the hour-plus course-deletion script). When the server is down
+# for longer, the circuit breaker of the client takes over (see
+# lib/circuit.py). We retry on connection errors and 5xx responses. Moodle
+# web-service calls all use POST, so we explicitly opt POST into the retried
+# methods. The risk of retrying a POST whose side effect actually went through
+# (e.g. a duplicate cohort) is acceptable here: these scripts are run
+# interactively and their results are diffed against Moodle afterwards.
 DEFAULT_RETRY = Retry(
     total=3,
     backoff_factor=1.0,
@@ -33,6 +56,10 @@ DEFAULT_RETRY = Retry(
     allowed_methods=frozenset(["POST"]),
 )
 
+# Size of the connection pool shared by the threads of lib.parallel.
+# Must be at least its DEFAULT_MAX_WORKERS.
+DEFAULT_POOL_MAXSIZE = 8
+
 
 class MoodleApiError(Exception):
     """Raised when the Moodle web service returns an exception payload."""
@@ -70,15 +97,50 @@ def rest_api_parameters(in_args, prefix="", out_dict=None):
     return out_dict
 
 
+def request_parameters(fname, kwargs, token):
+    """The form parameters of a call to fname, as they are posted."""
+    parameters = rest_api_parameters(kwargs)
+    parameters.update(
+        {"wstoken": token, "moodlewsrestformat": "json", "wsfunction": fname}
+    )
+    return parameters
+
+
+def make_session(pool_maxsize=DEFAULT_POOL_MAXSIZE):
+    """A session with our retries and connection pool size."""
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=DEFAULT_RETRY, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class MoodleClient:
-    def __init__(self, url, token, timeout=DEFAULT_TIMEOUT):
+    def __init__(
+        self,
+        url,
+        token,
+        timeout=DEFAULT_TIMEOUT,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_concurrent=None,
+        read_timeouts=None,
+    ):
         self.url = url
         self.token = token
         self.timeout = timeout
-        self.session = requests.Session()
-        adapter = HTTPAdapter(max_retries=DEFAULT_RETRY)
-        self.session.mount("https://", adapter)
-        self.session.mount("http://", adapter)
+        # By function, the read timeouts that differ from timeout's
+        self.read_timeouts = {**READ_TIMEOUTS, **(read_timeouts or {})}
+        # Shared by all the threads making calls
+        self.breaker = CircuitBreaker()
+        self.session = make_session(pool_maxsize)
+        # Caps the calls in flight, whatever the number of threads making them
+        self._slots = (
+            threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        )
+        # For each function called, (payload bytes, seconds) of every call.
+        # See lib/latency.py
+        self.latencies = defaultdict(list)
+        self._latencies_lock = threading.Lock()
 
     def __call__(self, fname, **kwargs):
         """Calls moodle API function with function name fname and keyword arguments.
@@ -87,13 +149,45 @@ class MoodleClient:
         >>> client('core_course_update_courses',
                                courses = [{'id': 1, 'fullname': 'My favorite course'}])
         """
-        parameters = rest_api_parameters(kwargs)
-        parameters.update(
-            {"wstoken": self.token, "moodlewsrestformat": "json", "wsfunction": fname}
-        )
-        response = self.session.post(self.url, parameters, timeout=self.timeout)
-        response.raise_for_status()
-        payload = response.json()
+        payload = json.loads(self._post(fname, kwargs))
         if isinstance(payload, dict) and payload.get("exception"):
             raise MoodleApiError(fname, payload)
         return munchify(payload)
+
+    def call_as[T](self, schema: type[T], fname: str, **kwargs) -> T:
+        """Same as calling the client, but decodes the response into schema,
+        one of the types of lib.schemas.
+
+        Example:
+        >>> client.call_as(list[schemas.User], 'core_user_get_users_by_field',
+                           field='id', values=[1, 2])
+        """
+        content = self._post(fname, kwargs)
+        try:
+            return schemas.decode(schema, content)
+        except ValueError:
+            payload = json.loads(content)
+            if isinstance(payload, dict) and payload.get("exception"):
+                raise MoodleApiError(fname, payload) from None
+            raise
+
+    def timeout_for(self, fname):
+        """The (connect, read) timeout of a call to fname."""
+        connect, read = self.timeout
+        return connect, self.read_timeouts.get(fname, read)
+
+    def _post(self, fname, kwargs) -> bytes:
+        parameters = request_parameters(fname, kwargs, self.token)
+        with self.breaker.call(), self._slots or contextlib.nullcontext():
+            start = time.perf_counter()
+            response = self.session.post(
+                self.url, parameters, timeout=self.timeout_for(fname)
+            )
+            seconds = time.perf_counter() - start
+            response.raise_for_status()
+        self._record_latency(fname, len(response.request.body or ""), seconds)
+        return response.content
+
+    def _record_latency(self, fname, payload_bytes, seconds):
+        with self._latencies_lock:
+            self.latencies[fname].append((payload_bytes, seconds))
@@ -0,0 +1,152 @@
+"""
+An index of everything the import files refer to in Moodle, and the check of
+an import file against it.
+
+The index is a single frame of (kind, value) rows:
+- course: every course shortname,
+- cohort: every cohort name, idnumber and id (the users upload accepts any),
+- category: every category path, as in the courses upload ("2026-2027 / Maths").
+
+It is built from three bulk calls, or from a snapshot (see lib/snapshot.py).
+
+Checking a file unpivots all its referencing columns at once and anti-joins
+them against the index, so a file of any size is checked in a single pass.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Self
+
+import polars as pl
+import structlog
+
+from lib.moodle_api import MoodleClient
+from lib.parallel import run_concurrently
+from lib.snapshot import (
+    CATEGORIES,
+    COHORTS,
+    COURSES,
+    Snapshot,
+    fetch_categories,
+    fetch_cohorts,
+    fetch_courses,
+)
+
+log = structlog.get_logger()
+
+KIND = "kind"
+VALUE = "value"
+ROW = "row"
+COLUMN = "column"
+
+COURSE = "course"
+COHORT = "cohort"
+CATEGORY = "category"
+
+# As in the courses upload
+CATEGORY_SEPARATOR = " / "
+
+COHORT_COLUMN = re.compile(r"cohort\d+")
+COURSE_COLUMN = re.compile(r"course\d+")
+
+
+def category_paths(categories: pl.DataFrame) -> pl.Series:
+    """The path of each category, made of the names of its ancestors."""
+    names = dict(zip(categories["id"], categories["name"], strict=True))
+    return categories.select(
+        pl.col("path")
+        .str.strip_chars("/")
+        .str.split("/")
+        .list.eval(
+            pl.element().cast(pl.Int64).replace_strict(names, return_dtype=pl.String)
+        )
+        .list.join(CATEGORY_SEPARATOR)
+    ).to_series()
+
+
+@dataclass(frozen=True)
+class MoodleIndex:
+    frame: pl.DataFrame  # kind, value
+
+    @classmethod
+    def from_frames(
+        cls, categories: pl.DataFrame, courses: pl.DataFrame, cohorts: pl.DataFrame
+    ) -> Self:
+        """From frames shaped like the entities of a snapshot."""
+        parts = [
+            (COURSE, courses["shortname"]),
+            (COHORT, cohorts["name"]),
+            (COHORT, cohorts["idnumber"]),
+            (COHORT, cohorts["id"].cast(pl.String)),
+            (CATEGORY, category_paths(categories)),
+        ]
+        frame = pl.concat(
+            pl.DataFrame({KIND: kind, VALUE: values.rename(VALUE)}).select(
+                pl.col(KIND).cast(pl.String), pl.col(VALUE).cast(pl.String)
+            )
+            for kind, values in parts
+        )
+        frame = frame.filter(pl.col(VALUE).is_not_null() & (pl.col(VALUE) != ""))
+        return cls(frame.unique())
+
+    @classmethod
+    def fetch(cls, moodle: MoodleClient) -> Self:
+        fetched = run_concurrently(
+            {
+                CATEGORIES: lambda: fetch_categories(moodle),
+                COURSES: lambda: fetch_courses(moodle),
+                COHORTS: lambda: fetch_cohorts(moodle),
+            }
+        )
+        return cls.from_frames(fetched[CATEGORIES], fetched[COURSES], fetched[COHORTS])
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Snapshot) -> Self:
+        return cls.from_frames(
+            snapshot.read(CATEGORIES), snapshot.read(COURSES), snapshot.read(COHORTS)
+        )
+
+    def counts(self) -> dict[str, int]:
+        return dict(self.frame.group_by(KIND).len().iter_rows())
+
+
+def references(columns: list[str]) -> dict[str, str]:
+    """The columns of an import file that refer to Moodle, and to what kind."""
+    refs = {}
+    for column in columns:
+        if column == "category_path":
+            refs[column] = CATEGORY
+        elif column == "metacohort" or COHORT_COLUMN.fullmatch(column):
+            refs[column] = COHORT
+        elif COURSE_COLUMN.fullmatch(column):
+            refs[column] = COURSE
+    # The enrolment methods file adds methods to existing courses, whereas the
+    # shortnames of the courses file are created by the upload
+    if "metacohort" in columns and "shortname" in columns:
+        refs["shortname"] = COURSE
+    return refs
+
+
+def unresolved_references(frame: pl.DataFrame, index: MoodleIndex) -> pl.DataFrame:
+    """One (row, column, kind, value) row per reference missing from the index.
+
+    The rows are numbered as the lines of the csv file, the header being line 1.
+    """
+    refs = references(frame.columns)
+    schema = {ROW: pl.UInt32, COLUMN: pl.String, KIND: pl.String, VALUE: pl.String}
+    if not refs:
+        return pl.DataFrame(schema=schema)
+    return (
+        frame.with_row_index(ROW, offset=2)
+        .unpivot(
+            index=ROW,
+            on=list(refs),
+            variable_name=COLUMN,
+            value_name=VALUE,
+        )
+        .filter(pl.col(VALUE).is_not_null() & (pl.col(VALUE) != ""))
+        .with_columns(pl.col(COLUMN).replace_strict(refs).alias(KIND))
+        .join(index.frame, on=[KIND, VALUE], how="anti")
+        .select(pl.col(name).cast(dtype) for name, dtype in schema.items())
+        .sort(ROW, COLUMN)
+    )
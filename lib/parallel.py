@@ -0,0 +1,60 @@
+"""
+Helpers for running independent Moodle web-service calls concurrently.
+
+The calls are I/O bound, so a thread pool is all we need: the GIL is released
+while we wait on the network. All the threads share the MoodleClient (and
+therefore its requests.Session and connection pool), which is fine because we
+never mutate the session once it is built.
+"""
+
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.progress import Progress
+
+# Enough to hide the latency of a handful of slow calls without hammering the
+# server. Keep in sync with DEFAULT_POOL_MAXSIZE in lib.moodle_api, otherwise
+# urllib3 discards the extra connections.
+DEFAULT_MAX_WORKERS = 8
+
+
+def run_concurrently[T](
+    tasks: dict[str, Callable[[], T]], max_workers: int = DEFAULT_MAX_WORKERS
+) -> dict[str, T]:
+    """Run each task in a thread pool, return their results by name.
+
+    The first exception raised by a task is re-raised here.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def map_concurrently[T, R](
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    progress: str | None = None,
+) -> list[R]:
+    """Like the builtin map, but in a thread pool. Keeps the order of items.
+
+    With a task name as progress, reports the progress of the calls (see
+    lib/progress.py).
+    """
+    if progress is not None:
+        items = list(items)
+        tracker = Progress(progress, len(items))
+
+        def tracked(item: T) -> R:
+            with tracker.timed():
+                return fn(item)
+
+        return map_concurrently(tracked, items, max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fn, items))
+
+
+def chunked[T](items: Sequence[T], size: int) -> list[Sequence[T]]:
+    """Split items into consecutive slices of at most size elements."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
@@ -0,0 +1,103 @@
+"""
+The --plan mode of the scripts that change Moodle in bulk.
+
+Such a script builds the web-service calls of its run as a list of Call, and
+either makes them or, with --plan, prints them instead: the exact sequence of
+calls, the size of what each one posts, and an estimate of how long the run
+takes, based on the latencies recorded by previous runs (see lib/latency.py).
+
+The number of form parameters of a call matters too: php drops whatever goes
+over its max_input_vars setting (1000 by default), so calls that go over it
+are flagged.
+"""
+
+import argparse
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlencode
+
+from lib.latency import LatencyStats
+from lib.moodle_api import MoodleClient, request_parameters
+
+MAX_INPUT_VARS = 1000
+
+# Moodle tokens are 32 characters long, we don't need the real one to plan
+PLACEHOLDER_TOKEN = "x" * 32
+
+
+@dataclass(frozen=True)
+class Call:
+    fname: str
+    kwargs: dict[str, Any]
+
+    def make(self, moodle: MoodleClient) -> Any:
+        return moodle(self.fname, **self.kwargs)
+
+    def parameters(self) -> dict:
+        return request_parameters(self.fname, self.kwargs, PLACEHOLDER_TOKEN)
+
+    def payload_bytes(self) -> int:
+        return len(urlencode(self.parameters()))
+
+
+def add_plan_arguments(parser: argparse.ArgumentParser, batch_size: int):
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Only print the calls that would be made, and how long they would take",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=batch_size,
+        help=f"Number of items changed per call (default {batch_size})",
+    )
+
+
+def print_plan(calls: list[Call], stats: LatencyStats | None = None):
+    if stats is None:
+        stats = LatencyStats.load()
+
+    print()
+    print(f"{'#':>6}  {'function':32}{'parameters':>12}{'bytes':>10}{'seconds':>10}")
+    total: float | None = 0.0
+    total_bytes = 0
+    too_many = 0
+    for i, call in enumerate(calls, start=1):
+        parameter_count = len(call.parameters())
+        payload_bytes = call.payload_bytes()
+        total_bytes += payload_bytes
+        seconds = stats.estimate(call.fname, payload_bytes)
+        if seconds is None or total is None:
+            total = None
+        else:
+            total += seconds
+        flag = ""
+        if parameter_count > MAX_INPUT_VARS:
+            too_many += 1
+            flag = "  over max_input_vars!"
+        print(
+            f"{i:>6}  {call.fname:32}{parameter_count:>12}{payload_bytes:>10}"
+            f"{_seconds(seconds):>10}{flag}"
+        )
+
+    print()
+    print(f"{len(calls)} calls, {total_bytes} bytes")
+    if total is None:
+        unknown = sorted({c.fname for c in calls if c.fname not in stats.samples})
+        print(f"No recorded latency for {', '.join(unknown)}, can't estimate the ETA")
+    else:
+        print(f"Estimated duration: {_duration(total)}")
+    if too_many:
+        print(f"{too_many} calls go over max_input_vars, use a smaller --batch-size")
+    print()
+
+
+def _seconds(seconds: float | None) -> str:
+    return "?" if seconds is None else f"{seconds:.2f}"
+
+
+def _duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02}m{seconds:02}s"
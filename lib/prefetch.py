@@ -0,0 +1,82 @@
+"""
+Moodle lookups started in the background as soon as the client is built, and
+awaited only where their result is needed.
+
+A script declares its lookups by name, as functions of the client:
+
+    with Prefetch(moodle, {"cohorts": fetch_existing_moodle_cohorts}) as prefetch:
+        rows = ...  # Parse the workbook meanwhile
+        cohorts = prefetch.get("cohorts")
+
+The lookups run in a thread pool while the main thread works on something else
+(usually parsing an Excel file), so the network latency is hidden behind the
+CPU work. When a result is awaited, the time spent fetching and the time spent
+waiting are logged: the difference is the time the overlap saved.
+"""
+
+import time
+from collections.abc import Callable, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Self
+
+import structlog
+
+from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS
+
+log = structlog.get_logger()
+
+
+class Prefetch:
+    def __init__(
+        self,
+        moodle: MoodleClient,
+        lookups: Mapping[str, Callable[[MoodleClient], Any]],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=min(max_workers, max(len(lookups), 1))
+        )
+        self._futures: dict[str, Future] = {}
+        # When each lookup started and finished fetching
+        self._started: dict[str, float] = {}
+        self._finished: dict[str, float] = {}
+        for name, lookup in lookups.items():
+            self._futures[name] = self._executor.submit(
+                self._fetch, name, lookup, moodle
+            )
+
+    def _fetch(self, name: str, lookup: Callable[[MoodleClient], Any], moodle):
+        self._started[name] = time.perf_counter()
+        try:
+            return lookup(moodle)
+        finally:
+            self._finished[name] = time.perf_counter()
+
+    def get(self, name: str) -> Any:
+        """The result of the lookup, waiting for it if needed.
+
+        Raises whatever the lookup raised.
+        """
+        start = time.perf_counter()
+        result = self._futures[name].result()
+        waited = time.perf_counter() - start
+        fetched = self._finished[name] - self._started[name]
+        log.info(
+            "prefetch awaited",
+            lookup=name,
+            fetch_seconds=round(fetched, 3),
+            waited_seconds=round(waited, 3),
+            saved_seconds=round(fetched - waited, 3),
+        )
+        return result
+
+    def close(self):
+        """Drop the lookups that haven't started, wait for the running ones."""
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,95 @@
+"""
+Progress of the long-running loops: the batch loops that change Moodle, and
+the concurrent fetches of lib.parallel.
+
+A Progress counts the items done out of a known total, and the calls that did
+them along with how long each call took. From these it derives:
+- the throughput, in items and in calls per second since the start,
+- the latency, averaged over the most recent calls,
+- the ETA, at the current throughput.
+
+It is thread-safe, so the workers of a pool can all report to the same one.
+
+It regularly emits a "progress" event through structlog, whose fields are
+meant to be analysed later (see the json log format), and a last one when
+all the items are done. The loops that take long enough can also show a
+progress bar.
+"""
+
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import progressbar
+import structlog
+
+log = structlog.get_logger()
+
+# Seconds between two progress events
+LOG_INTERVAL = 10
+
+# Number of calls the latency is averaged over
+LATENCY_WINDOW = 50
+
+
+class Progress:
+    def __init__(self, task: str, total: int, bar: bool = False):
+        self.task = task
+        self.total = total
+        self.done = 0
+        self.calls = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.perf_counter()
+        self._logged_at = self.started
+        self._lock = threading.Lock()
+        self._bar = progressbar.ProgressBar(max_value=total) if bar else None
+
+    def add(self, count: int = 1, seconds: float | None = None):
+        """Record count items done by a call that took seconds."""
+        with self._lock:
+            self.done += count
+            self.calls += 1
+            if seconds is not None:
+                self._latencies.append(seconds)
+            if self._bar is not None:
+                self._bar.update(self.done)
+            now = time.perf_counter()
+            finished = self.done >= self.total
+            if finished or now - self._logged_at >= LOG_INTERVAL:
+                self._logged_at = now
+                event = self.metrics(now)
+            else:
+                event = None
+        if event is not None:
+            if finished and self._bar is not None:
+                self._bar.finish()
+            log.info("progress", **event)
+
+    @contextmanager
+    def timed(self, count: int = 1) -> Iterator[None]:
+        """Time the call in the block, and record count items done by it."""
+        start = time.perf_counter()
+        yield
+        self.add(count, time.perf_counter() - start)
+
+    def metrics(self, now: float | None = None) -> dict:
+        elapsed = (now or time.perf_counter()) - self.started
+        items_per_second = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done
+        return {
+            "task": self.task,
+            "done": self.done,
+            "total": self.total,
+            "calls": self.calls,
+            "elapsed_seconds": round(elapsed, 1),
+            "items_per_second": round(items_per_second, 2),
+            "calls_per_second": round(self.calls / elapsed if elapsed else 0.0, 2),
+            "latency_seconds": round(sum(self._latencies) / len(self._latencies), 3)
+            if self._latencies
+            else None,
+            "eta_seconds": round(remaining / items_per_second, 1)
+            if items_per_second
+            else None,
+        }
@@ -0,0 +1,140 @@
+"""
+Typed responses of the Moodle API functions that return the most records.
+
+MoodleClient.__call__ munchifies whole responses: a dict per record, holding
+every field Moodle sends. MoodleClient.call_as instead decodes a response
+directly into these slotted dataclasses, keeping only the fields we use and
+ignoring the others. With msgspec installed the decoding skips the
+intermediate dicts altogether, without it we fall back on the json module.
+
+Fields that Moodle doesn't always send have a default.
+"""
+
+import json
+import types
+from dataclasses import dataclass, field, fields, is_dataclass
+from functools import cache
+from typing import Any, Union, get_args, get_origin, get_type_hints
+
+try:
+    import msgspec
+except ImportError:  # Optional, see the module docstring
+    msgspec = None  # type: ignore[assignment]
+
+
+@dataclass(frozen=True, slots=True)
+class Cohort:
+    id: int
+    name: str
+    idnumber: str = ""
+    visible: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class CohortSearch:
+    """core_cohort_search_cohorts"""
+
+    cohorts: list[Cohort]
+
+
+@dataclass(frozen=True, slots=True)
+class CohortMembers:
+    """core_cohort_get_cohort_members returns a list of these"""
+
+    cohortid: int
+    userids: list[int]
+
+
+@dataclass(frozen=True, slots=True)
+class User:
+    """core_user_get_users_by_field returns a list of these"""
+
+    id: int
+    username: str | None = None
+    firstname: str | None = None
+    lastname: str | None = None
+    email: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Course:
+    id: int
+    shortname: str
+    fullname: str
+    categoryid: int
+    timemodified: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Courses:
+    """core_course_get_courses_by_field"""
+
+    courses: list[Course]
+
+
+@dataclass(frozen=True, slots=True)
+class Category:
+    """core_course_get_categories returns a list of these"""
+
+    id: int
+    name: str
+    parent: int
+    path: str
+    depth: int
+    coursecount: int
+    timemodified: int | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Role:
+    roleid: int
+    shortname: str
+
+
+@dataclass(frozen=True, slots=True)
+class EnrolledUser:
+    """core_enrol_get_enrolled_users returns a list of these"""
+
+    id: int
+    email: str | None = None
+    roles: list[Role] = field(default_factory=list)
+
+
+def decode[T](schema: type[T], content: bytes) -> T:
+    """Decode a JSON response into schema, raise ValueError if it doesn't fit."""
+    if msgspec is not None:
+        return msgspec.json.decode(content, type=schema)
+    try:
+        return _convert(schema, json.loads(content))
+    except (TypeError, KeyError, AttributeError) as e:
+        raise ValueError(f"Response doesn't match {schema}: {e}") from e
+
+
+@cache
+def _hints(cls: type) -> dict[str, Any]:
+    return get_type_hints(cls)
+
+
+def _convert(tp: Any, value: Any) -> Any:
+    """The json module fallback of msgspec's decoding, for our schemas only."""
+    origin = get_origin(tp)
+    if origin is list:
+        (item,) = get_args(tp)
+        return [_convert(item, v) for v in value]
+    if origin in (Union, types.UnionType):
+        if value is None:
+            return None
+        (arm,) = [a for a in get_args(tp) if a is not type(None)]
+        return _convert(arm, value)
+    if isinstance(tp, type) and is_dataclass(tp):
+        hints = _hints(tp)
+        return tp(
+            **{
+                f.name: _convert(hints[f.name], value[f.name])
+                for f in fields(tp)
+                if f.name in value
+            }
+        )
+    if not isinstance(value, tp):
+        raise TypeError(f"Expected {tp.__name__}, got {value!r}")
+    return value
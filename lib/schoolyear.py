@@ -1,3 +1,15 @@
+"""
+The schoolyear that the naming rules (course shortnames, cohorts, categories)
+are built from.
+
+START_YYYY is the default. The scripts that apply naming rules also take a
+--schoolyear option, so that during the summer rollover last year's and next
+year's exports can be processed without editing this file.
+"""
+
+import argparse
+from dataclasses import dataclass
+
 # XXX. Change this every year
 START_YYYY = 2026
 
@@ -5,3 +17,48 @@ END_YYYY = START_YYYY + 1
 
 START_YY = START_YYYY % 100
 END_YY = START_YY + 1
+
+
+@dataclass(frozen=True)
+class SchoolYear:
+    start_yyyy: int
+
+    @property
+    def end_yyyy(self) -> int:
+        return self.start_yyyy + 1
+
+    @property
+    def start_yy(self) -> int:
+        return self.start_yyyy % 100
+
+    @property
+    def end_yy(self) -> int:
+        return self.start_yy + 1
+
+    @property
+    def prefix(self) -> str:
+        """Prefix of courses and cohorts, e.g. 2627"""
+        return f"{self.start_yy}{self.end_yy}"
+
+    @property
+    def short_label(self) -> str:
+        """Used in course fullnames, e.g. 26-27"""
+        return f"{self.start_yy}-{self.end_yy}"
+
+    @property
+    def long_label(self) -> str:
+        """Used in category paths, e.g. 2026-2027"""
+        return f"{self.start_yyyy}-{self.end_yyyy}"
+
+
+CURRENT = SchoolYear(START_YYYY)
+
+
+def add_schoolyear_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--schoolyear",
+        type=lambda s: SchoolYear(int(s)),
+        default=CURRENT,
+        metavar="YYYY",
+        help=f"First calendar year of the schoolyear (default {START_YYYY})",
+    )
@@ -0,0 +1,297 @@
+"""
+A local daemon that the scripts talk to Moodle through, when it is running
+(see sidecar.py):
+
+- it holds warm keep-alive connections to Moodle, so a script doesn't pay for
+  the TLS handshakes again,
+- it caches the responses of the read functions (*_get_*, *_search_*) for a
+  few seconds, so running several scripts in a row doesn't fetch the same
+  cohorts and users again. Calling any other function empties the cache,
+- the retries, and the limit on the number of concurrent calls to Moodle, are
+  shared by all the scripts.
+
+It listens on a Unix socket, only accessible to its user. Each connection
+carries a single request: a json line, answered with a json header line and
+the raw body of the response. The token comes with each request, the daemon
+doesn't need one.
+
+get_moodle_client() returns a SidecarClient when the daemon answers. Should
+the daemon go away during a run, the client connects to Moodle directly.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlencode
+
+import requests
+import structlog
+
+from lib.moodle_api import (
+    DEFAULT_POOL_MAXSIZE,
+    MoodleClient,
+    make_session,
+    request_parameters,
+)
+
+log = structlog.get_logger()
+
+SOCKET_PATH = Path(".cache/sidecar.sock")
+
+DEFAULT_CACHE_TTL = 60  # seconds
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Moodle names its read-only functions like core_cohort_search_cohorts
+READ_MARKERS = ("_get_", "_search_")
+
+PING_TIMEOUT = 1  # seconds
+
+# The kind of error -> the exception the client raises
+ERRORS: dict[str, type[requests.RequestException]] = {
+    "http": requests.HTTPError,
+    "timeout": requests.Timeout,
+    "connection": requests.ConnectionError,
+    "retries": requests.exceptions.RetryError,
+    "other": requests.RequestException,
+}
+
+
+def is_read(fname: str) -> bool:
+    return any(marker in fname for marker in READ_MARKERS)
+
+
+def _error_kind(e: Exception) -> str:
+    if isinstance(e, requests.HTTPError):
+        return "http"
+    if isinstance(e, requests.Timeout):
+        return "timeout"
+    if isinstance(e, requests.ConnectionError):
+        return "connection"
+    if isinstance(e, requests.exceptions.RetryError):
+        return "retries"
+    return "other"
+
+
+class Sidecar:
+    def __init__(
+        self,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+        max_cache_bytes: int = MAX_CACHE_BYTES,
+        max_concurrent: int = DEFAULT_POOL_MAXSIZE,
+    ):
+        self.cache_ttl = cache_ttl
+        self.max_cache_bytes = max_cache_bytes
+        self.session = make_session(max_concurrent)
+        # Bounds the calls to Moodle across all the clients
+        self._upstream = threading.BoundedSemaphore(max_concurrent)
+        # key -> (expiry, content), least recently used first
+        self._cache: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self.stats: Counter[str] = Counter()
+
+    def call(
+        self, url: str, fname: str, parameters: dict, timeout: Any
+    ) -> tuple[bytes, bool, float]:
+        """The content of the response, whether it was cached, and the seconds
+        the call to Moodle took."""
+        key = hashlib.sha256(
+            json.dumps([url, parameters], sort_keys=True).encode()
+        ).hexdigest()
+        read = is_read(fname) and self.cache_ttl > 0
+        if read and (content := self._cached(key)) is not None:
+            self.stats["cached"] += 1
+            return content, True, 0.0
+
+        with self._upstream:
+            start = time.perf_counter()
+            content = self.post(url, parameters, timeout)
+            seconds = time.perf_counter() - start
+        self.stats["forwarded"] += 1
+
+        if not read:
+            # It may have changed anything we cached
+            self.flush()
+        elif not content.startswith(b'{"exception"'):
+            self._store(key, content)
+        return content, False, seconds
+
+    def post(self, url: str, parameters: dict, timeout: Any) -> bytes:
+        response = self.session.post(url, parameters, timeout=timeout)
+        response.raise_for_status()
+        return response.content
+
+    def flush(self):
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def _cached(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expiry, content = entry
+            if expiry < time.monotonic():
+                self._drop(key)
+                return None
+            self._cache.move_to_end(key)
+            return content
+
+    def _store(self, key: str, content: bytes):
+        if len(content) > self.max_cache_bytes:
+            return
+        with self._lock:
+            if key in self._cache:
+                self._drop(key)
+            self._cache[key] = (time.monotonic() + self.cache_ttl, content)
+            self._cache_bytes += len(content)
+            while self._cache_bytes > self.max_cache_bytes:
+                self._drop(next(iter(self._cache)))
+
+    def _drop(self, key: str):
+        _, content = self._cache.pop(key)
+        self._cache_bytes -= len(content)
+
+    def handle(self, request: dict) -> tuple[dict, bytes]:
+        """The header and body answering a request."""
+        command = request.get("command")
+        if command == "ping":
+            return {"ok": True}, b""
+        if command == "flush":
+            self.flush()
+            return {"ok": True}, b""
+        if command != "call":
+            return {"ok": False, "kind": "other", "error": f"unknown {command!r}"}, b""
+
+        fname = request["fname"]
+        try:
+            content, cached, seconds = self.call(
+                request["url"],
+                fname,
+                request["parameters"],
+                # A (connect, read) tuple, that json turned into a list
+                tuple(request["timeout"]),
+            )
+        except Exception as e:
+            log.warning("call failed", fname=fname, error=str(e))
+            return {"ok": False, "kind": _error_kind(e), "error": str(e)}, b""
+        log.debug("call", fname=fname, cached=cached, seconds=round(seconds, 3))
+        header = {"ok": True, "cached": cached, "seconds": seconds}
+        return header | {"length": len(content)}, content
+
+    def make_server(
+        self, socket_path: Path = SOCKET_PATH
+    ) -> socketserver.ThreadingUnixStreamServer:
+        sidecar = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                header, body = sidecar.handle(json.loads(self.rfile.readline()))
+                self.wfile.write(json.dumps(header).encode() + b"\n" + body)
+
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        socket_path.unlink(missing_ok=True)
+        server = socketserver.ThreadingUnixStreamServer(str(socket_path), Handler)
+        os.chmod(socket_path, 0o600)
+        server.daemon_threads = True
+        return server
+
+    def serve(self, socket_path: Path = SOCKET_PATH):
+        """Serve until interrupted."""
+        with self.make_server(socket_path) as server:
+            log.info("sidecar listening", socket=str(socket_path))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                socket_path.unlink(missing_ok=True)
+                log.info("sidecar stopped", **self.stats)
+
+
+def _connect(socket_path: Path, timeout: float | None = None) -> socket.socket:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _exchange(sock: socket.socket, request: dict) -> tuple[dict, bytes]:
+    with sock, sock.makefile("rb") as f:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        line = f.readline()
+        if not line:
+            raise ConnectionError("the sidecar closed the connection")
+        header = json.loads(line)
+        body = f.read(header.get("length", 0))
+    return header, body
+
+
+def send(request: dict, socket_path: Path = SOCKET_PATH) -> tuple[dict, bytes]:
+    return _exchange(_connect(socket_path, PING_TIMEOUT), request)
+
+
+def sidecar_running(socket_path: Path = SOCKET_PATH) -> bool:
+    try:
+        header, _ = send({"command": "ping"}, socket_path)
+    except OSError:
+        return False
+    return header.get("ok", False)
+
+
+class SidecarClient(MoodleClient):
+    """A MoodleClient that goes through the sidecar."""
+
+    def __init__(self, url, token, socket_path: Path = SOCKET_PATH, **kwargs):
+        super().__init__(url, token, **kwargs)
+        self.socket_path = socket_path
+        self.direct = False
+
+    def _post(self, fname, kwargs) -> bytes:
+        if not self.direct:
+            try:
+                # A stalled sidecar must not hang the script: it gets as long
+                # as the call to Moodle would (connect + read)
+                sock = _connect(self.socket_path, sum(self.timeout_for(fname)))
+            except OSError:
+                # Nothing was sent, so it is safe to make the call ourselves
+                log.warning("sidecar gone, connecting directly")
+                self.direct = True
+            else:
+                with self.breaker.call(), self._slots or contextlib.nullcontext():
+                    return self._post_through(sock, fname, kwargs)
+        return super()._post(fname, kwargs)
+
+    def _post_through(self, sock: socket.socket, fname, kwargs) -> bytes:
+        parameters = request_parameters(fname, kwargs, self.token)
+        request = {
+            "command": "call",
+            "url": self.url,
+            "fname": fname,
+            "parameters": parameters,
+            "timeout": self.timeout_for(fname),
+        }
+        try:
+            header, body = _exchange(sock, request)
+        except TimeoutError as e:
+            raise requests.Timeout(f"sidecar: {e}") from e
+        except OSError as e:
+            raise requests.ConnectionError(f"sidecar: {e}") from e
+        if not header["ok"]:
+            raise ERRORS.get(header["kind"], requests.RequestException)(header["error"])
+        if not header["cached"]:
+            self._record_latency(fname, len(urlencode(parameters)), header["seconds"])
+        return body
@@ -0,0 +1,325 @@
+"""
+A local copy of the parts of Moodle that the diff scripts look at.
+
+Each entity is stored as one Parquet file in the snapshot directory:
+
+    categories.parquet      id, name, parent, path, depth, coursecount, timemodified
+    courses.parquet         id, shortname, fullname, categoryid, timemodified
+    cohorts.parquet         id, name, idnumber, visible, category_id
+    cohort_members.parquet  cohort_id, user_id
+    users.parquet           id, email
+
+next to a manifest.json that records when each entity was fetched.
+
+Refreshing an existing snapshot only re-fetches what may have changed:
+- categories, cohorts and cohort members are always re-fetched, they only take
+  a handful of calls,
+- courses are only re-fetched for the categories whose coursecount or
+  timemodified changed,
+- users are only looked up for the ids we haven't seen yet.
+
+So a refresh can miss some changes: a course renamed or replaced without the
+coursecount or timemodified of its category changing, and the changed email
+of a user we already know. Take the snapshot again with --full before a diff
+that must be exact (the rollover...).
+
+The cohorts' category_id is only known for cohorts living directly in a
+top-level category (that's where add_cohorts.py creates them), it is null for
+all the others.
+"""
+
+import json
+from collections.abc import Sequence
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Self
+
+import polars as pl
+import structlog
+
+from lib.cohort import fetch_cohort_members, fetch_user_emails
+from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS, map_concurrently, run_concurrently
+from lib.schemas import Category, CohortSearch, Courses
+
+log = structlog.get_logger()
+
+CATEGORIES = "categories"
+COURSES = "courses"
+COHORTS = "cohorts"
+COHORT_MEMBERS = "cohort_members"
+USERS = "users"
+
+MANIFEST = "manifest.json"
+
+SCHEMAS = {
+    CATEGORIES: pl.Schema(
+        {
+            "id": pl.Int64,
+            "name": pl.String,
+            "parent": pl.Int64,
+            "path": pl.String,
+            "depth": pl.Int64,
+            "coursecount": pl.Int64,
+            "timemodified": pl.Int64,
+        }
+    ),
+    COURSES: pl.Schema(
+        {
+            "id": pl.Int64,
+            "shortname": pl.String,
+            "fullname": pl.String,
+            "categoryid": pl.Int64,
+            "timemodified": pl.Int64,
+        }
+    ),
+    COHORTS: pl.Schema(
+        {
+            "id": pl.Int64,
+            "name": pl.String,
+            "idnumber": pl.String,
+            "visible": pl.Boolean,
+            "category_id": pl.Int64,
+        }
+    ),
+    COHORT_MEMBERS: pl.Schema({"cohort_id": pl.Int64, "user_id": pl.Int64}),
+    USERS: pl.Schema({"id": pl.Int64, "email": pl.String}),
+}
+
+
+def _frame(entity: str, rows: Sequence[object]) -> pl.DataFrame:
+    schema = SCHEMAS[entity]
+    return pl.DataFrame(
+        [{k: getattr(row, k, None) for k in schema} for row in rows], schema=schema
+    )
+
+
+def fetch_categories(moodle: MoodleClient) -> pl.DataFrame:
+    return _frame(
+        CATEGORIES, moodle.call_as(list[Category], "core_course_get_categories")
+    )
+
+
+def fetch_courses(moodle: MoodleClient, category_id: int | None = None) -> pl.DataFrame:
+    """The courses directly in a category, or all the courses in a single call."""
+    if category_id is None:
+        result = moodle.call_as(Courses, "core_course_get_courses_by_field")
+    else:
+        result = moodle.call_as(
+            Courses,
+            "core_course_get_courses_by_field",
+            field="category",
+            value=category_id,
+        )
+    return _frame(COURSES, result.courses)
+
+
+def fetch_cohorts(moodle: MoodleClient, category_id: int | None = None) -> pl.DataFrame:
+    """All the cohorts, or only those living directly in the given category."""
+    context: dict[str, str | int]
+    if category_id is None:
+        context = {"contextlevel": "system"}
+        includes = "all"
+    else:
+        context = {"contextlevel": "coursecat", "instanceid": category_id}
+        includes = "self"
+    result = moodle.call_as(
+        CohortSearch,
+        "core_cohort_search_cohorts",
+        query="",
+        context=context,
+        includes=includes,
+        limitfrom=0,
+        limitnum=10000,
+    )
+    return _frame(COHORTS, result.cohorts).with_columns(
+        category_id=pl.lit(category_id, dtype=pl.Int64)
+    )
+
+
+def take_snapshot(
+    moodle: MoodleClient,
+    directory: Path,
+    full: bool = False,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict:
+    """Fetch the state of moodle into directory, return the manifest.
+
+    Unless full is set, reuses whatever an existing snapshot in directory
+    allows us to (see the module docstring).
+    """
+    previous = None if full else Snapshot.open_if_exists(directory)
+    refreshed: dict[str, int] = {}
+
+    fetched = run_concurrently(
+        {
+            CATEGORIES: lambda: fetch_categories(moodle),
+            COHORTS: lambda: fetch_cohorts(moodle),
+        },
+        max_workers,
+    )
+    categories = fetched[CATEGORIES]
+    all_cohorts = fetched[COHORTS]
+    refreshed[CATEGORIES] = len(categories)
+
+    ###
+    # Courses, only for the categories that changed
+    ###
+    fingerprint = ["id", "coursecount", "timemodified"]
+    if previous is None:
+        changed_ids = categories["id"].to_list()
+        kept_courses = _frame(COURSES, [])
+    else:
+        changed = categories.select(fingerprint).join(
+            previous.read(CATEGORIES).select(fingerprint),
+            on=fingerprint,
+            how="anti",
+        )["id"]
+        changed_ids = changed.to_list()
+        kept_courses = previous.read(COURSES).filter(
+            pl.col("categoryid").is_in(categories["id"].implode())
+            & ~pl.col("categoryid").is_in(changed.implode())
+        )
+    log.info("fetching courses", changed_categories=len(changed_ids))
+    fresh_courses = map_concurrently(
+        lambda category_id: fetch_courses(moodle, category_id),
+        changed_ids,
+        max_workers,
+        progress="fetch courses",
+    )
+    courses = pl.concat([kept_courses, *fresh_courses])
+    refreshed[COURSES] = sum(len(c) for c in fresh_courses)
+
+    ###
+    # Cohorts, annotated with their top-level category when they have one
+    ###
+    top_level_ids = categories.filter(pl.col("depth") == 1)["id"].to_list()
+    category_cohorts = pl.concat(
+        map_concurrently(
+            lambda category_id: fetch_cohorts(moodle, category_id),
+            top_level_ids,
+            max_workers,
+            progress="fetch category cohorts",
+        )
+        or [_frame(COHORTS, [])]
+    )
+    cohorts = (
+        all_cohorts.drop("category_id")
+        .join(
+            category_cohorts.select("id", "category_id"),
+            on="id",
+            how="left",
+            maintain_order="left",
+        )
+        .select(SCHEMAS[COHORTS].names())
+    )
+    refreshed[COHORTS] = len(cohorts)
+
+    ###
+    # Cohort members, and the emails of the users we don't know yet
+    ###
+    members = fetch_cohort_members(moodle, cohorts["id"].to_list(), max_workers)
+    cohort_members = pl.DataFrame(
+        [
+            {"cohort_id": cohort_id, "user_id": user_id}
+            for cohort_id, user_ids in members.items()
+            for user_id in user_ids
+        ],
+        schema=SCHEMAS[COHORT_MEMBERS],
+    )
+    refreshed[COHORT_MEMBERS] = len(cohort_members)
+
+    known_users = _frame(USERS, []) if previous is None else previous.read(USERS)
+    wanted_ids = cohort_members["user_id"].unique()
+    unknown_ids = wanted_ids.filter(~wanted_ids.is_in(known_users["id"].implode()))
+    emails = fetch_user_emails(moodle, unknown_ids.to_list(), max_workers)
+    users = pl.concat(
+        [
+            known_users.filter(pl.col("id").is_in(wanted_ids.implode())),
+            pl.DataFrame(
+                {"id": list(emails.keys()), "email": list(emails.values())},
+                schema=SCHEMAS[USERS],
+            ),
+        ]
+    )
+    refreshed[USERS] = len(emails)
+
+    ###
+    # Write everything
+    ###
+    directory.mkdir(parents=True, exist_ok=True)
+    frames = {
+        CATEGORIES: categories,
+        COURSES: courses,
+        COHORTS: cohorts,
+        COHORT_MEMBERS: cohort_members,
+        USERS: users,
+    }
+    for entity, frame in frames.items():
+        frame.write_parquet(directory / f"{entity}.parquet")
+
+    manifest = {
+        "taken_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "url": moodle.url,
+        "entities": {
+            entity: {"rows": len(frame), "refreshed": refreshed[entity]}
+            for entity, frame in frames.items()
+        },
+    }
+    (directory / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    log.info("snapshot written", directory=str(directory), **manifest["entities"])
+    return manifest
+
+
+class Snapshot:
+    """Read access to a snapshot written by take_snapshot.
+
+    Answers the same questions the diff scripts otherwise ask the Moodle API.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.manifest = json.loads((directory / MANIFEST).read_text())
+        log.info(
+            "using snapshot",
+            directory=str(directory),
+            taken_at=self.manifest["taken_at"],
+        )
+
+    @classmethod
+    def open_if_exists(cls, directory: Path) -> Self | None:
+        if not (directory / MANIFEST).exists():
+            return None
+        return cls(directory)
+
+    def read(self, entity: str) -> pl.DataFrame:
+        return pl.read_parquet(self.directory / f"{entity}.parquet")
+
+    def course_shortnames(self, category_id: int) -> set[str]:
+        """Shortnames of the courses in a category and all its subcategories."""
+        categories = self.read(CATEGORIES).filter(
+            pl.col("path").str.split("/").list.contains(str(category_id))
+        )
+        courses = self.read(COURSES).filter(
+            pl.col("categoryid").is_in(categories["id"].implode())
+        )
+        return set(courses["shortname"])
+
+    def cohort_names(self) -> set[str]:
+        return set(self.read(COHORTS)["name"])
+
+    def cohort_names_in_category(self, category_id: int) -> set[str]:
+        """Names of the cohorts living directly in a top-level category."""
+        categories = self.read(CATEGORIES)
+        if category_id not in categories.filter(pl.col("depth") == 1)["id"]:
+            raise ValueError(
+                f"Category {category_id} is not a top-level category, "
+                "the snapshot only knows the cohorts of those"
+            )
+        cohorts = self.read(COHORTS).filter(pl.col("category_id") == category_id)
+        return set(cohorts["name"])
+
+    def cohort_member_emails(self, cohort_id: int) -> set[str]:
+        members = self.read(COHORT_MEMBERS).filter(pl.col("cohort_id") == cohort_id)
+        users = self.read(USERS).join(members, left_on="id", right_on="user_id")
+        return set(users["email"])
@@ -0,0 +1,107 @@
+"""
+Writes the Moodle user upload files, where the variable-length information of
+a user (its cohorts, courses, roles) is spread over numbered columns:
+cohort1, cohort2, ... course1, course2, ..., type1, type2, ...
+
+The frames keep that information as list columns. Turning the whole frame
+into a wide one (list.to_struct + unnest) makes every row as wide as the user
+with the most courses, which costs a lot of memory for mostly empty cells.
+Instead, the frame is widened and written a slice of rows at a time, so only
+one slice is ever wide. Only the length of the longest list is computed
+upfront, since every slice must have the same columns.
+"""
+
+import io
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import polars as pl
+import structlog
+
+log = structlog.get_logger()
+
+ROWS_PER_SLICE = 5000
+
+
+@dataclass(frozen=True)
+class Spread:
+    """How a list column is spread over numbered columns: prefix1, prefix2..."""
+
+    prefix: str
+    start: int = 1
+
+    def names(self, count: int) -> list[str]:
+        return [f"{self.prefix}{i}" for i in range(self.start, self.start + count)]
+
+
+def write_wide_csv(
+    frame: pl.DataFrame,
+    path: str | Path,
+    spreads: dict[str, Spread],
+    rows_per_slice: int = ROWS_PER_SLICE,
+):
+    """Write frame as csv, with its list columns spread as described by spreads.
+
+    The other columns are written as they are. The output is the same as the
+    one of write_csv() on the whole frame widened at once.
+    """
+    with open(path, "wb") as f:
+        column_count = _write_slices(frame, f, spreads, rows_per_slice)
+    log.info("written", path=str(path), row_count=len(frame), column_count=column_count)
+
+
+def render_wide_csv(
+    frame: pl.DataFrame,
+    spreads: dict[str, Spread],
+    rows_per_slice: int = ROWS_PER_SLICE,
+) -> bytes:
+    """Same as write_wide_csv, to memory."""
+    buffer = io.BytesIO()
+    _write_slices(frame, buffer, spreads, rows_per_slice)
+    return buffer.getvalue()
+
+
+def iter_wide_csv(
+    frame: pl.DataFrame,
+    spreads: dict[str, Spread],
+    rows_per_slice: int = ROWS_PER_SLICE,
+) -> Iterator[tuple[int, bytes]]:
+    """Same as render_wide_csv, a slice at a time: the row count and the csv
+    of each slice, the header at the start of the first one."""
+    for i, wide in enumerate(_wide_slices(frame, spreads, rows_per_slice)):
+        yield len(wide), wide.write_csv(include_header=i == 0).encode()
+
+
+def _wide_slices(
+    frame: pl.DataFrame,
+    spreads: dict[str, Spread],
+    rows_per_slice: int,
+) -> Iterator[pl.DataFrame]:
+    names = {
+        column: spread.names(frame.select(pl.col(column).list.len().max()).item() or 0)
+        for column, spread in spreads.items()
+    }
+
+    # An empty frame still gets its header
+    slices = frame.iter_slices(rows_per_slice) if len(frame) else [frame]
+
+    for rows in slices:
+        yield rows.with_columns(
+            pl.col(column).list.to_struct(fields=fields)
+            for column, fields in names.items()
+        ).unnest(*names)
+
+
+def _write_slices(
+    frame: pl.DataFrame,
+    f: BinaryIO,
+    spreads: dict[str, Spread],
+    rows_per_slice: int,
+) -> int:
+    column_count = 0
+    for i, wide in enumerate(_wide_slices(frame, spreads, rows_per_slice)):
+        wide.write_csv(f, include_header=i == 0)
+        column_count = wide.width
+    return column_count
@@ -10,11 +10,15 @@ import argparse
 import polars as pl
 import structlog
 
-from preprocess_teachers_and_courses import (
+from lib.cache import add_cache_arguments, cached_frame
+from lib.chunks import add_chunk_arguments, write_output
+from lib.columns import (
     COURSE_CATEGORY_PATH,
     COURSE_FULLNAME,
     COURSE_SHORTNAME,
 )
+from lib.logs import add_log_arguments, configure_logging
+from lib.profiling import add_profile_arguments, profiled
 
 log = structlog.get_logger()
 
@@ -29,12 +33,28 @@ def to_courses(src: pl.DataFrame) -> pl.DataFrame:
     return res
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("preprocessed")
     parser.add_argument("output")
-    args = parser.parse_args()
+    add_cache_arguments(parser)
+    add_chunk_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        courses = cached_frame(
+            args,
+            "prepare courses",
+            inputs=[args.preprocessed],
+            config={},
+            code=[__file__],
+            compute=lambda: to_courses(pl.read_csv(args.preprocessed)),
+        )
+        write_output(courses, args.output, args)
+
 
-    preprocessed = pl.read_csv(args.preprocessed)
-    courses = to_courses(preprocessed)
-    courses.write_csv(args.output)
+if __name__ == "__main__":
+    main()
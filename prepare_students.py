@@ -19,98 +19,125 @@ from collections.abc import Callable
 import polars as pl
 import structlog
 
+from lib.archive import STUDENTS, add_archive_arguments, archive_frame
+from lib.cache import add_cache_arguments, cached_frame, hash_text
+from lib.chunks import add_chunk_arguments, write_output
 from lib.config import get_moodle_client, get_salt
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
 from lib.moodle_api import MoodleClient
 from lib.passwords import password_generator
-from lib.schoolyear import END_YY, START_YY
+from lib.prefetch import Prefetch
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.rules import RULE, Rule, apply_rules
+from lib.schemas import CohortSearch
+from lib.schoolyear import CURRENT, SchoolYear, add_schoolyear_argument
+from lib.widecsv import Spread
 
 log = structlog.get_logger()
 
-YEAR_PREFIX = f"{START_YY}{END_YY}_"
+# The courses of a student become its cohorts, starting with cohort2
+SPREADS = {"courses": Spread("cohort", start=2)}
+
+# Some students don't have an email address (yet),
+# so we can't create their moodle account
+NO_EMAIL = Rule("students with no email", "adcMail", "is_null")
+
+EXCLUSION_RULES = [
+    NO_EMAIL,
+    # The only 4th year students that are taught in Beaulieu are the 4MSOP,
+    # We filter all others because we need to keep the numbers low in moodle so we don't blow up our plan.
+    # Currently these are the 4E, 4MSCI, 4MSSA
+    Rule(
+        "students not attending here",
+        "ElevesCursusActif::classe",
+        "is_in",
+        ("4E1", "4MSCI1", "4MSSA1", "4MSSA2"),
+    ),
+]
 
 
 def transform(
-    src: pl.DataFrame, email_to_password: Callable[[str], str], moodle: MoodleClient
+    src: pl.DataFrame,
+    email_to_password: Callable[[str], str],
+    existing_cohorts: set[str],
+    year: SchoolYear = CURRENT,
 ) -> pl.DataFrame:
-    log.info("start", student_count=len(src))
-
-    # Some students don't have an email address (yet),
-    # so we can't create their moodle account
-    students_with_no_email = src["adcMail"].is_null()
-    missing_email_count = int(students_with_no_email.sum())
-    log.info(
-        "removing students with no email",
-        missing_email_count=missing_email_count,
+    return keep_courses_with_a_cohort(
+        build_students(src, email_to_password, year), existing_cohorts
     )
-    if missing_email_count:
-        with pl.Config() as cfg:
-            cfg.set_tbl_rows(-1)
-            cfg.set_tbl_hide_dataframe_shape(True)
-            cfg.set_tbl_hide_column_names(True)
-            cfg.set_tbl_hide_column_data_types(True)
-            cfg.set_tbl_formatting("NOTHING")
-            print(
-                src.filter(students_with_no_email).select(
-                    "weleveNomUsuel", "welevePrenomUsuel", "ElevesCursusActif::classe"
+
+
+def build_students(
+    src: pl.DataFrame,
+    email_to_password: Callable[[str], str],
+    year: SchoolYear = CURRENT,
+) -> pl.DataFrame:
+    """Everything but the cohort filter, which needs Moodle."""
+    log.info("start", student_count=len(src))
+    year_prefix = f"{year.prefix}_"
+
+    with step("exclusion rules"):
+        src, excluded = apply_rules(src, EXCLUSION_RULES)
+        log.info("after exclusion rules", student_count=len(src))
+        students_with_no_email = excluded.filter(pl.col(RULE) == NO_EMAIL.name)
+        if len(students_with_no_email):
+            with pl.Config() as cfg:
+                cfg.set_tbl_rows(-1)
+                cfg.set_tbl_hide_dataframe_shape(True)
+                cfg.set_tbl_hide_column_names(True)
+                cfg.set_tbl_hide_column_data_types(True)
+                cfg.set_tbl_formatting("NOTHING")
+                print(
+                    students_with_no_email.select(
+                        "weleveNomUsuel",
+                        "welevePrenomUsuel",
+                        "ElevesCursusActif::classe",
+                    )
                 )
-            )
-        src = src.filter(~students_with_no_email)
-        log.info("after removing missing emails", student_count=len(src))
 
     # Sanity check
-    duplicate_emails = src["adcMail"].is_duplicated()
-    if duplicate_emails.any():
-        print("Found duplicates emails: ")
-        print(src.filter(duplicate_emails))
-        sys.exit("Exiting")
-
-    # The only 4th year students that are taught in Beaulieu are the 4MSOP,
-    # We filter all others because we need to keep the numbers low in moodle so we don't blow up our plan.
-    # Currently these are the 4E, 4MSCI, 4MSSA
-    students_not_attending_here = src["ElevesCursusActif::classe"].is_in(
-        ["4E1", "4MSCI1", "4MSSA1", "4MSSA2"]
-    )
-    students_not_attending_here_count = int(students_not_attending_here.sum())
-    log.info(
-        "removing students not attending here",
-        students_not_attending_here=students_not_attending_here_count,
-    )
-    src = src.filter(~students_not_attending_here)
-    log.info("after removing students not attending here", student_count=len(src))
+    with step("check duplicate emails"):
+        duplicate_emails = src["adcMail"].is_duplicated()
+        if duplicate_emails.any():
+            print("Found duplicates emails: ")
+            print(src.filter(duplicate_emails))
+            sys.exit("Exiting")
 
     # Build up most of the data
-    res = pl.DataFrame().with_columns(
-        email=src["adcMail"],
-        username=src["adcMail"].str.to_lowercase(),
-        firstname=src["welevePrenomUsuel"],
-        lastname=src["weleveNomUsuel"],
-        password=src["adcMail"].map_elements(email_to_password, return_dtype=pl.String),
-        cohort1=pl.lit(YEAR_PREFIX + "eleves"),
-        courses=src["ElevesCursusActif::xdisciplines"]
-        .str.split(",")
-        .list.gather_every(3)  # xdisciplines contains (code, name, teacher) triples.
-        .list.unique(maintain_order=True)
-        .list.sort(),  # For the stability of the created file between runs
-    )
+    with step("build user rows"):
+        res = pl.DataFrame().with_columns(
+            email=src["adcMail"],
+            username=src["adcMail"].str.to_lowercase(),
+            firstname=src["welevePrenomUsuel"],
+            lastname=src["weleveNomUsuel"],
+            password=src["adcMail"].map_elements(
+                email_to_password, return_dtype=pl.String
+            ),
+            cohort1=pl.lit(year_prefix + "eleves"),
+            courses=src["ElevesCursusActif::xdisciplines"]
+            .str.split(",")
+            # xdisciplines contains (code, name, teacher) triples.
+            .list.gather_every(3)
+            .list.unique(maintain_order=True)
+            .list.sort(),  # For the stability of the created file between runs
+        )
+
+        # Prefix the year to the courses list
+        res = res.with_columns(pl.col("courses").list.eval(year_prefix + pl.element()))
+
+    return res
 
-    # Prefix the year to the courses list
-    res = res.with_columns(pl.col("courses").list.eval(YEAR_PREFIX + pl.element()))
 
+def keep_courses_with_a_cohort(
+    res: pl.DataFrame, existing_cohorts: set[str]
+) -> pl.DataFrame:
     # Only keep the courses for which a cohort already exists in moodle,
     # thus filtering out all the "marker" courses the students were assigned in essaim.
-    existing_cohorts = fetch_existing_moodle_cohorts(moodle)
-    res = res.with_columns(
-        pl.col("courses").list.filter(pl.element().is_in(existing_cohorts))
-    )
-
-    # Create columns starting with name "cohort2" for the remaining courses
-    max_number_of_courses = res.select(pl.col("courses").list.len().max()).item()
-    res = res.with_columns(
-        pl.col("courses").list.to_struct(
-            fields=lambda idx: f"cohort{idx + 2}",  # Start with cohort2
-            upper_bound=max_number_of_courses,
+    with step("keep courses with a cohort"):
+        res = res.with_columns(
+            pl.col("courses").list.filter(pl.element().is_in(existing_cohorts))
         )
-    ).unnest("courses")
 
     log.info("done", student_counts=len(res))
 
@@ -118,7 +145,8 @@ def transform(
 
 
 def fetch_existing_moodle_cohorts(moodle: MoodleClient) -> set[str]:
-    result = moodle(
+    result = moodle.call_as(
+        CohortSearch,
         "core_cohort_search_cohorts",
         query="",
         context={"contextlevel": "system"},
@@ -131,15 +159,60 @@ def fetch_existing_moodle_cohorts(moodle: MoodleClient) -> set[str]:
     return cohorts
 
 
-if __name__ == "__main__":
+EXISTING_COHORTS = "existing cohorts"
+PREFETCH = {EXISTING_COHORTS: fetch_existing_moodle_cohorts}
+
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("essaim_students")
     parser.add_argument("moodle_students")
-    args = parser.parse_args()
+    add_schoolyear_argument(parser)
+    add_cache_arguments(parser)
+    add_chunk_arguments(parser)
+    add_archive_arguments(parser)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        salt = get_salt()
+        moodle = get_moodle_client(args.instance)
+
+        # The cohorts are fetched while the workbook is parsed
+        with Prefetch(moodle, PREFETCH) as prefetch:
+
+            def compute() -> pl.DataFrame:
+                with step("read workbook"):
+                    essaim_students = pl.read_excel(args.essaim_students)
+                return build_students(
+                    essaim_students, password_generator(salt), args.schoolyear
+                )
 
-    salt = get_salt()
-    moodle = get_moodle_client()
+            # Doesn't depend on Moodle, so it is cached on its own
+            students = cached_frame(
+                args,
+                "prepare students",
+                inputs=[args.essaim_students],
+                config={
+                    "salt": hash_text(salt),
+                    "schoolyear": args.schoolyear.long_label,
+                },
+                code=[__file__],
+                compute=compute,
+            )
+            transformed = keep_courses_with_a_cohort(
+                students, prefetch.get(EXISTING_COHORTS)
+            )
 
-    essaim_students = pl.read_excel(args.essaim_students)
-    transformed = transform(essaim_students, password_generator(salt), moodle)
-    transformed.write_csv(args.moodle_students)
+        with step("write csv"):
+            write_output(transformed, args.moodle_students, args, SPREADS)
+
+        if not args.no_archive:
+            archive_frame(transformed, STUDENTS, args.schoolyear)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,21 +11,28 @@ from collections.abc import Callable
 import polars as pl
 import structlog
 
-from lib.config import get_salt
-from lib.passwords import password_generator
-from preprocess_teachers_and_courses import (
+from lib.cache import add_cache_arguments, cached_frame, hash_text
+from lib.chunks import add_chunk_arguments, write_output
+from lib.columns import (
     COURSE_SHORTNAME,
     TEACHER_EMAIL,
     TEACHER_FIRSTNAME,
     TEACHER_LASTNAME,
     TEACHER_TLA,
 )
+from lib.config import get_salt
+from lib.logs import add_log_arguments, configure_logging
+from lib.passwords import password_generator
+from lib.profiling import add_profile_arguments, profiled
+from lib.widecsv import Spread
 
 log = structlog.get_logger()
 
+COURSES = "courses"
+TYPES = "types"
 
-def make_names(name: str, count: int):
-    return [f"{name}{i + 1}" for i in range(count)]
+# Each course of a teacher goes with its type, in course1, type1, course2...
+SPREADS = {COURSES: Spread("course"), TYPES: Spread("type")}
 
 
 def to_teachers_with_courses(
@@ -38,19 +45,10 @@ def to_teachers_with_courses(
         pl.col(COURSE_SHORTNAME),
     )
 
-    course_count = res.select(pl.col(COURSE_SHORTNAME).list.len()).max().item()
-
-    # Dynamically build the course columns based on the list iwe collected in the
-    # shortname column
-    res = res.with_columns(
-        pl.col(COURSE_SHORTNAME).list.to_struct(
-            fields=make_names("course", course_count)
-        )
-    ).unnest(COURSE_SHORTNAME)
-
-    # Type 2 to make users teachers for their courses
-    type_columns = {name: pl.lit(2) for name in make_names("type", course_count)}
-    res = res.with_columns(**type_columns)
+    # Type 2 to make users teachers for their courses. Every typeN column is
+    # filled, including those past a teacher's last course.
+    course_count = pl.col(COURSE_SHORTNAME).list.len().max()
+    res = res.with_columns(pl.lit(2).repeat_by(course_count).alias(TYPES))
 
     ######
     # Generate all required columns
@@ -71,6 +69,7 @@ def to_teachers_with_courses(
             TEACHER_LASTNAME: "lastname",
             TEACHER_FIRSTNAME: "firstname",
             TEACHER_EMAIL: "email",
+            COURSE_SHORTNAME: COURSES,
         }
     )
 
@@ -86,16 +85,32 @@ def to_teachers_with_courses(
     return res
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("preprocessed")
     parser.add_argument("output")
-    args = parser.parse_args()
+    add_cache_arguments(parser)
+    add_chunk_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        salt = get_salt()
+
+        teachers_with_courses = cached_frame(
+            args,
+            "prepare teachers",
+            inputs=[args.preprocessed],
+            config={"salt": hash_text(salt)},
+            code=[__file__],
+            compute=lambda: to_teachers_with_courses(
+                pl.read_csv(args.preprocessed), password_generator(salt)
+            ),
+        )
+        write_output(teachers_with_courses, args.output, args, SPREADS)
 
-    salt = get_salt()
 
-    preprocessed = pl.read_csv(args.preprocessed)
-    teachers_with_courses = to_teachers_with_courses(
-        preprocessed, password_generator(salt)
-    )
-    teachers_with_courses.write_csv(args.output)
+if __name__ == "__main__":
+    main()
@@ -23,7 +23,7 @@ All business rules are implemented here:
 - The precise naming conventions for courses, categories, and cohorts
 
 
-All other tools feed from the output of this file, using the column names defined in ALL_FIELDS to access information
+All other tools feed from the output of this file, using the column names defined in lib/columns.py to access information
 
 """
 
@@ -33,35 +33,50 @@ import polars as pl
 import structlog
 
 from lib import schoolyear
-
-log = structlog.get_logger()
-
-TEACHER_TLA = "teacher_tla"
-TEACHER_LASTNAME = "teacher_lastname"
-TEACHER_FIRSTNAME = "teacher_firstname"
-TEACHER_EMAIL = "teacher_email"
-CLASS = "class"
-COURSE = "course"
-COURSE_SHORTNAME = "shortname"
-COURSE_FULLNAME = "fullname"
-COURSE_CATEGORY_PATH = "category_path"
-COURSE_COHORT = "cohort"
-
-ALL_FIELDS = [
-    TEACHER_TLA,
-    TEACHER_LASTNAME,
-    TEACHER_FIRSTNAME,
-    TEACHER_EMAIL,
+from lib.archive import PREPROCESSED, add_archive_arguments, archive_frame
+from lib.cache import add_cache_arguments, cached_frame
+from lib.columns import (
+    ALL_FIELDS,
     CLASS,
     COURSE,
-    COURSE_SHORTNAME,
-    COURSE_FULLNAME,
     COURSE_CATEGORY_PATH,
     COURSE_COHORT,
+    COURSE_FULLNAME,
+    COURSE_SHORTNAME,
+    TEACHER_EMAIL,
+    TEACHER_FIRSTNAME,
+    TEACHER_LASTNAME,
+    TEACHER_TLA,
+)
+from lib.logs import add_log_arguments, configure_logging
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.rules import Rule, apply_rules
+
+log = structlog.get_logger()
+
+# Lines that won't become a course in Moodle, evaluated in a single pass.
+EXCLUSION_RULES = [
+    Rule("empty courses", COURSE, "is_null"),
+    Rule(
+        "courses containing 'Travail_personnel'",
+        COURSE,
+        "contains",
+        "Travail_personnel",
+    ),
+    Rule("'Éducation_physique' courses", COURSE, "equals", "Éducation_physique"),
+    # TM* Classes don't need a course.
+    Rule("courses for TM* classes", CLASS, "starts_with", "TM"),
+    # Soutien* Classes don't need a course.
+    Rule("courses for Soutien* classes", CLASS, "starts_with", "Soutien"),
+    # ZZ is a marker for when we don't know who will be giving a class.
+    # We don't create a course in moodle for those.
+    Rule("courses for ZZ* teachers", TEACHER_LASTNAME, "starts_with", "ZZ"),
 ]
 
 
-def preprocess(src: pl.DataFrame) -> pl.DataFrame:
+def preprocess(
+    src: pl.DataFrame, year: schoolyear.SchoolYear = schoolyear.CURRENT
+) -> pl.DataFrame:
     log.info(
         "start",
         num_courses=len(src),
@@ -72,161 +87,144 @@ def preprocess(src: pl.DataFrame) -> pl.DataFrame:
     # 1. Start with the teacher info.
     ###
 
-    teacher_info_lookup = pl.DataFrame().with_columns(
-        [
-            src["Maitre::wsigle"].alias(TEACHER_TLA),
-            src["Maitre::wnom"].alias(TEACHER_LASTNAME),
-            src["Maitre::wemail"].alias(TEACHER_EMAIL),
-            # Usual firstname with fallback to the official one
-            src["Maitre::prenomUsuel"]
-            .fill_null(src["Maitre::wprenom"])
-            .alias(TEACHER_FIRSTNAME),
-        ]
-    )
+    with step("1. teacher info"):
+        teacher_info_lookup = pl.DataFrame().with_columns(
+            [
+                src["Maitre::wsigle"].alias(TEACHER_TLA),
+                src["Maitre::wnom"].alias(TEACHER_LASTNAME),
+                src["Maitre::wemail"].alias(TEACHER_EMAIL),
+                # Usual firstname with fallback to the official one
+                src["Maitre::prenomUsuel"]
+                .fill_null(src["Maitre::wprenom"])
+                .alias(TEACHER_FIRSTNAME),
+            ]
+        )
 
-    teacher_info_lookup = teacher_info_lookup.filter(~pl.col(TEACHER_TLA).is_null())
+        teacher_info_lookup = teacher_info_lookup.filter(~pl.col(TEACHER_TLA).is_null())
 
     ###
     # 2. Unpack course and class information
     ###
 
-    # First find out in which column the data lives depending on "la bascule de l'année"
-    course_column = None
-    if "EnseignementProchain::wNoCoursLDAP" in src.columns:
-        course_column = "EnseignementProchain::wNoCoursLDAP"
-    else:
-        course_column = "EnseignementActuel::wNoCoursLDAP"
-
-    res = pl.DataFrame()
-    res = res.with_columns(
-        src["Maitre::wsigle"].alias(TEACHER_TLA),
-        temp=src[course_column]
-        .map_elements(
-            lambda c: c.split("_", maxsplit=2)[1:], return_dtype=pl.List(pl.String)
-        )
-        .list.to_struct(fields=[CLASS, COURSE]),
-    ).unnest("temp")
+    with step("2. unpack course and class"):
+        # First find out in which column the data lives depending on "la bascule de l'année"
+        course_column = None
+        if "EnseignementProchain::wNoCoursLDAP" in src.columns:
+            course_column = "EnseignementProchain::wNoCoursLDAP"
+        else:
+            course_column = "EnseignementActuel::wNoCoursLDAP"
 
-    res = res.with_columns(pl.col(TEACHER_TLA).fill_null(strategy="forward"))
+        res = pl.DataFrame()
+        res = res.with_columns(
+            src["Maitre::wsigle"].alias(TEACHER_TLA),
+            temp=src[course_column]
+            .map_elements(
+                lambda c: c.split("_", maxsplit=2)[1:], return_dtype=pl.List(pl.String)
+            )
+            .list.to_struct(fields=[CLASS, COURSE]),
+        ).unnest("temp")
+
+        res = res.with_columns(pl.col(TEACHER_TLA).fill_null(strategy="forward"))
 
     ###
     # 4. Join the course and class information to the teacher info
     ###
 
-    res = res.join(teacher_info_lookup, on=TEACHER_TLA, maintain_order="left")
+    with step("4. join teacher info"):
+        res = res.join(teacher_info_lookup, on=TEACHER_TLA, maintain_order="left")
 
     ###
     # 5. Remove lines that won't become a course in Moodle
     ###
 
-    res = res.drop_nulls(subset=[COURSE])
-    log.info("done removing empty courses", num_courses=len(res))
-
-    res = res.filter(~res[COURSE].str.contains("Travail_personnel"))
-    log.info(
-        "done removing courses containing 'Travail_personnel'", num_courses=len(res)
-    )
-
-    res = res.filter(~(res[COURSE] == "Éducation_physique"))
-    log.info("done removing 'Éducation_physique' courses", num_courses=len(res))
-
-    # TM* Classes don't need a course.
-    res = res.filter(~res[CLASS].str.starts_with("TM"))
-    log.info("done removing courses for TM* classes", num_courses=len(res))
-
-    # Soutien* Classes don't need a course.
-    res = res.filter(~res[CLASS].str.starts_with("Soutien"))
-    log.info("done removing courses for Soutien* classes", num_courses=len(res))
-
-    # ZZ is a marker for when we don't know who will be giving a class.
-    # We don't create a course in moodle for those.
-    res = res.filter(~res[TEACHER_LASTNAME].str.starts_with("ZZ"))
-    log.info("done removing courses for ZZ* teachers", num_courses=len(res))
+    with step("5. exclusion rules"):
+        res, _ = apply_rules(res, EXCLUSION_RULES)
+        log.info("done applying exclusion rules", num_courses=len(res))
 
     # Remove duplicate courses for a teacher
     # These duplicates in the input appear when the class is split into half-class groups
     # (it depends on how Emmanuel configured things in essaim, sometimes we get these duplicates, sometimes we don't)
     # We assume the teacher only wants a single Moodle course for both groups.
-    res = res.unique(maintain_order=True)
-    log.info("done removing duplicate courses for a teacher", num_courses=len(res))
+    with step("5. remove duplicate courses"):
+        res = res.unique(maintain_order=True)
+        log.info("done removing duplicate courses for a teacher", num_courses=len(res))
 
     ###
     # 6. Split some of the courses shared between two teachers
     ###
 
-    log.info("splitting some of the courses that are shared between teachers...")
-
-    # We use the index to mark which courses should be split. Add it once to the dataframe
-    res = res.with_row_index()
+    with step("6. split shared courses"):
+        log.info("splitting some of the courses that are shared between teachers...")
 
-    # These are the type of courses that when shared between multiple teachers, will get two separate moodle courses
-    split_candidates = res.filter(res[COURSE].is_in(("Bureautique", "Informatique")))
+        # We use the index to mark which courses should be split. Add it once to the dataframe
+        res = res.with_row_index()
 
-    # Find all the courses where class and course are duplicated, but not the teacher (we took care of those just above)
-    need_split = split_candidates.filter(
-        split_candidates.select([CLASS, COURSE]).is_duplicated()
-    )
+        # These are the type of courses that when shared between multiple teachers, will get two separate moodle courses
+        split_candidates = res.filter(
+            res[COURSE].is_in(("Bureautique", "Informatique"))
+        )
 
-    need_split_index = need_split["index"].implode()
-    res = res.with_columns(
-        pl.when(pl.col("index").is_in(need_split_index))
-        .then(pl.col(COURSE) + "_" + pl.col(TEACHER_TLA))
-        .otherwise(pl.col(COURSE))
-        .alias(COURSE),
-        pl.when(pl.col("index").is_in(need_split_index))
-        .then(pl.lit(None))
-        .otherwise(f"{schoolyear.START_YY}{schoolyear.END_YY}" + "_" + res[CLASS])
-        .alias(COURSE_COHORT),
-    )
+        # Find all the courses where class and course are duplicated, but not the teacher (we took care of those just above)
+        need_split = split_candidates.filter(
+            split_candidates.select([CLASS, COURSE]).is_duplicated()
+        )
 
-    # Print result of split, for information
-    with pl.Config() as cfg:
-        cfg.set_tbl_rows(-1)
-        cfg.set_tbl_hide_dataframe_shape(True)
-        cfg.set_tbl_hide_column_data_types(True)
-        print(
-            res.filter(pl.col("index").is_in(need_split_index))
-            .sort(CLASS)
-            .select([TEACHER_TLA, CLASS, COURSE, COURSE_COHORT])
+        need_split_index = need_split["index"].implode()
+        res = res.with_columns(
+            pl.when(pl.col("index").is_in(need_split_index))
+            .then(pl.col(COURSE) + "_" + pl.col(TEACHER_TLA))
+            .otherwise(pl.col(COURSE))
+            .alias(COURSE),
+            pl.when(pl.col("index").is_in(need_split_index))
+            .then(pl.lit(None))
+            .otherwise(year.prefix + "_" + res[CLASS])
+            .alias(COURSE_COHORT),
         )
-        print()
+
+        # Print result of split, for information
+        with pl.Config() as cfg:
+            cfg.set_tbl_rows(-1)
+            cfg.set_tbl_hide_dataframe_shape(True)
+            cfg.set_tbl_hide_column_data_types(True)
+            print(
+                res.filter(pl.col("index").is_in(need_split_index))
+                .sort(CLASS)
+                .select([TEACHER_TLA, CLASS, COURSE, COURSE_COHORT])
+            )
+            print()
 
     ###
     # 7. Fill-in derived fields
     ###
 
-    res = res.with_columns(
-        (
-            f"{schoolyear.START_YY}{schoolyear.END_YY}"
-            + "_"
-            + res[CLASS]
-            + "_"
-            + res[COURSE]
-        ).alias(COURSE_SHORTNAME)
-    )
+    with step("7. derived fields"):
+        res = res.with_columns(
+            (year.prefix + "_" + res[CLASS] + "_" + res[COURSE]).alias(COURSE_SHORTNAME)
+        )
 
-    res = res.with_columns(
-        (
-            res[COURSE].str.replace_all("_", " ")
-            + " "
-            + res[CLASS]
-            + " "
-            + f"{schoolyear.START_YY}-{schoolyear.END_YY}"
-        ).alias(COURSE_FULLNAME)
-    )
+        res = res.with_columns(
+            (
+                res[COURSE].str.replace_all("_", " ")
+                + " "
+                + res[CLASS]
+                + " "
+                + year.short_label
+            ).alias(COURSE_FULLNAME)
+        )
 
-    res = res.with_columns(
-        (
-            f"{schoolyear.START_YYYY}-{schoolyear.END_YYYY}"
-            + " / "
-            + res[COURSE].map_elements(course_to_category, return_dtype=pl.String)
-        ).alias(COURSE_CATEGORY_PATH)
-    )
+        res = res.with_columns(
+            (
+                year.long_label
+                + " / "
+                + res[COURSE].map_elements(course_to_category, return_dtype=pl.String)
+            ).alias(COURSE_CATEGORY_PATH)
+        )
 
     ###
     # 8. Remove temporary fields
     ###
-    res = res[ALL_FIELDS]
+    with step("8. remove temporary fields"):
+        res = res[ALL_FIELDS]
 
     log.info("done", num_courses=len(res))
 
@@ -271,21 +269,48 @@ def course_to_category(s: str) -> str:
     return s
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser()
     parser.add_argument("teachers_and_courses")
     parser.add_argument("output")
-    args = parser.parse_args()
+    schoolyear.add_schoolyear_argument(parser)
+    add_cache_arguments(parser)
+    add_archive_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+
+        def compute() -> pl.DataFrame:
+            with step("read workbook"):
+                teachers_and_courses = pl.read_excel(args.teachers_and_courses)
+            return preprocess(teachers_and_courses, args.schoolyear)
+
+        output = cached_frame(
+            args,
+            "preprocess",
+            inputs=[args.teachers_and_courses],
+            config={"schoolyear": args.schoolyear.long_label},
+            code=[__file__],
+            compute=compute,
+        )
 
-    teachers_and_courses = pl.read_excel(args.teachers_and_courses)
-    output = preprocess(teachers_and_courses)
+        # Dump categories so we can manually create them in moodle
+        print()
+        print("Categories: ")
+        print()
+        categories = output[COURSE_CATEGORY_PATH].unique()
+        for cat in categories.sort():
+            print(cat)
 
-    # Dump categories so we can manually create them in moodle
-    print()
-    print("Categories: ")
-    print()
-    categories = output[COURSE_CATEGORY_PATH].unique()
-    for cat in categories.sort():
-        print(cat)
+        with step("write csv"):
+            output.write_csv(args.output)
 
-    output.write_csv(args.output)
+        if not args.no_archive:
+            archive_frame(output, PREPROCESSED, args.schoolyear)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Takes:
+- a top-level category id
+- a top-level cohort id (for instance in 2526 the top-level cohort is
+  2526_eleves and its id is 1821)
+- a file preprocessed by preprocess_teachers_and_courses.py
+- a csv obtained by running prepare_students.py
+- a csv obtained by running prepare_teachers_with_courses.py
+
+Does in a single run what diff_courses.py, the diff half of add_cohorts.py,
+diff_students.py and diff_teachers.py do separately. All the Moodle data is
+fetched concurrently, so the whole run takes about as long as the slowest fetch.
+
+Writes a JSON report and prints a summary.
+
+Uses the Moodle API
+"""
+
+import argparse
+import json
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from add_cohorts import fetch_existing_cohort_names
+from diff_courses import fetch_existing_shortnames
+from lib.cohort import fetch_cohort_member_emails
+from lib.columns import COURSE_COHORT, COURSE_SHORTNAME
+from lib.config import get_moodle_client
+from lib.diff import KeyDiff, diff_keys
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_api import MoodleClient
+from lib.parallel import run_concurrently
+from lib.profiling import add_profile_arguments, profiled
+
+log = structlog.get_logger()
+
+COURSES = "courses"
+COHORTS = "cohorts"
+STUDENTS = "students"
+TEACHERS = "teachers"
+
+
+def fetch_existing(
+    moodle: MoodleClient,
+    course_category_id: str,
+    yearly_cohort_id: str,
+    teachers_cohort_id: str,
+) -> tuple[dict[str, set[str]], dict[str, float]]:
+    """Fetch everything we compare against, return it with the time each fetch took."""
+    durations: dict[str, float] = {}
+
+    def timed(name: str, fetch: Callable[[], set[str]]) -> Callable[[], set[str]]:
+        def run():
+            start = time.perf_counter()
+            result = fetch()
+            durations[name] = round(time.perf_counter() - start, 3)
+            return result
+
+        return run
+
+    existing = run_concurrently(
+        {
+            COURSES: timed(
+                COURSES, lambda: fetch_existing_shortnames(moodle, course_category_id)
+            ),
+            COHORTS: timed(
+                COHORTS, lambda: fetch_existing_cohort_names(moodle, course_category_id)
+            ),
+            STUDENTS: timed(
+                STUDENTS, lambda: fetch_cohort_member_emails(moodle, yearly_cohort_id)
+            ),
+            TEACHERS: timed(
+                TEACHERS, lambda: fetch_cohort_member_emails(moodle, teachers_cohort_id)
+            ),
+        }
+    )
+    return existing, durations
+
+
+def reconcile(
+    existing: dict[str, set[str]],
+    preprocessed: pl.DataFrame,
+    students: pl.DataFrame,
+    teachers: pl.DataFrame,
+) -> dict[str, KeyDiff]:
+    wanted = {
+        COURSES: preprocessed[COURSE_SHORTNAME],
+        COHORTS: preprocessed[COURSE_COHORT],
+        STUDENTS: students["email"],
+        TEACHERS: teachers["email"],
+    }
+    # Moodle and the exports don't always agree on the case of the emails
+    emails = {STUDENTS, TEACHERS}
+    return {
+        name: diff_keys(existing[name], wanted[name], case_insensitive=name in emails)
+        for name in wanted
+    }
+
+
+def print_summary(diffs: dict[str, KeyDiff]):
+    print()
+    print(f"{'':10}{'in moodle only':>16}{'in file only':>16}")
+    for name, diff in diffs.items():
+        print(f"{name:10}{len(diff.extra):>16}{len(diff.missing):>16}")
+    print()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("course_category_id")
+    parser.add_argument("yearly_cohort_id")
+    parser.add_argument("preprocessed")
+    parser.add_argument("students_csv")
+    parser.add_argument("teachers_csv")
+    parser.add_argument(
+        "--teachers-cohort-id",
+        default="1",
+        help="The 'Enseignants au gymnase de Beaulieu' cohort",
+    )
+    parser.add_argument("--report", type=Path, default=Path("reconcile_report.json"))
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        preprocessed = pl.read_csv(args.preprocessed)
+        students = pl.read_csv(args.students_csv)
+        teachers = pl.read_csv(args.teachers_csv)
+
+        moodle = get_moodle_client(args.instance)
+        start = time.perf_counter()
+        existing, durations = fetch_existing(
+            moodle,
+            args.course_category_id,
+            args.yearly_cohort_id,
+            args.teachers_cohort_id,
+        )
+        log.info(
+            "fetched from moodle",
+            elapsed=round(time.perf_counter() - start, 3),
+            **durations,
+        )
+
+        diffs = reconcile(existing, preprocessed, students, teachers)
+
+        report = {
+            "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "url": moodle.url,
+            "fetch_durations": durations,
+            "diffs": {name: diff.to_dict() for name, diff in diffs.items()},
+        }
+        args.report.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        log.info("report written", report=str(args.report))
+
+        print_summary(diffs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Runs the sidecar (see lib/sidecar.py) until interrupted: while it runs, the
+scripts started from this directory talk to Moodle through it, sharing warm
+connections and a short-lived cache of the read calls.
+
+Changes made in the Moodle web interface (importing a csv...) are only seen
+once the cache expires, after --cache-ttl seconds, or after --flush.
+
+Uses the Moodle API
+"""
+
+import argparse
+import signal
+import sys
+from pathlib import Path
+
+import structlog
+
+from lib.logs import add_log_arguments, configure_logging
+from lib.sidecar import DEFAULT_CACHE_TTL, SOCKET_PATH, Sidecar, send, sidecar_running
+
+log = structlog.get_logger()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds a read is cached, 0 to disable (default {DEFAULT_CACHE_TTL})",
+    )
+    parser.add_argument(
+        "--flush", action="store_true", help="Empty the cache of the running sidecar"
+    )
+    add_log_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    if args.flush:
+        if not sidecar_running(args.socket):
+            sys.exit("No sidecar running")
+        send({"command": "flush"}, args.socket)
+        log.info("cache flushed")
+        return
+
+    if sidecar_running(args.socket):
+        sys.exit("A sidecar is already running")
+    # Stopping it with kill cleans up as well as with ctrl-c
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    Sidecar(args.cache_ttl).serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Takes a directory
+
+Saves the state of Moodle (categories, courses, cohorts, cohort members and
+user emails) into that directory, as Parquet files.
+
+If the directory already contains a snapshot, only what may have changed is
+fetched again (see lib/snapshot.py), use --full to start from scratch.
+
+diff_courses.py, diff_students.py, diff_teachers.py and add_cohorts.py can then
+run against the snapshot with --snapshot, without calling the Moodle API.
+
+Uses the Moodle API
+"""
+
+import argparse
+from pathlib import Path
+
+from lib.config import get_moodle_client
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.parallel import DEFAULT_MAX_WORKERS
+from lib.profiling import add_profile_arguments, profiled
+from lib.snapshot import take_snapshot
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", type=Path)
+    parser.add_argument(
+        "--full", action="store_true", help="Ignore the existing snapshot"
+    )
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        moodle = get_moodle_client(args.instance)
+        take_snapshot(
+            moodle, args.directory, full=args.full, max_workers=args.max_workers
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+A stand-in for lib.moodle_api.MoodleClient, for tests that exercise code
+calling the Moodle API.
+
+Each web-service function is answered by a handler receiving the keyword
+arguments of the call. Only the HTTP round-trip is faked: the handler's result
+goes through the same JSON decoding as a real response, and unknown functions
+get the exception payload Moodle would send, so they raise MoodleApiError.
+"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from lib.moodle_api import MoodleClient
+
+
+class FakeMoodle(MoodleClient):
+    def __init__(self, handlers: dict[str, Callable[..., Any]]):
+        # Deliberately not calling super().__init__, we never open a session.
+        self.url = "https://moodle.example.com/webservice/rest/server.php"
+        self.handlers = handlers
+        self.calls: list[tuple[str, dict]] = []
+
+    def _post(self, fname, kwargs) -> bytes:
+        self.calls.append((fname, kwargs))
+        if fname not in self.handlers:
+            result: Any = {"exception": "dml_missing_record_exception"}
+        else:
+            result = self.handlers[fname](**kwargs)
+        return json.dumps(result).encode()
+
+    def count(self, fname: str) -> int:
+        return sum(1 for name, _ in self.calls if name == fname)
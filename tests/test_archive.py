@@ -0,0 +1,84 @@
+"""Tests for lib.archive."""
+
+import polars as pl
+import pytest
+
+from lib.archive import (
+    JOINED,
+    LEFT,
+    PREPROCESSED,
+    STUDENTS,
+    archive_frame,
+    course_reassignments,
+    runs,
+    scan,
+    student_churn,
+)
+from lib.columns import CLASS, COURSE, TEACHER_EMAIL
+from lib.schoolyear import SchoolYear
+
+LAST_YEAR = SchoolYear(2025)
+THIS_YEAR = SchoolYear(2026)
+
+
+def students(*emails: str) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            "email": list(emails),
+            "username": [e.lower() for e in emails],
+            "password": ["secret"] * len(emails),
+            "courses": [["2627_3M08_Maths"]] * len(emails),
+        }
+    )
+
+
+def teachers(*rows: tuple[str, str, str]) -> pl.DataFrame:
+    return pl.DataFrame(rows, schema=[CLASS, COURSE, TEACHER_EMAIL], orient="row")
+
+
+def test_student_churn_uses_the_latest_run_of_each_year(tmp_path):
+    archive_frame(students("a@x.ch", "b@x.ch"), STUDENTS, LAST_YEAR, "1", tmp_path)
+    archive_frame(students("a@x.ch", "c@x.ch"), STUDENTS, THIS_YEAR, "1", tmp_path)
+    archive_frame(students("A@x.ch", "d@x.ch"), STUDENTS, THIS_YEAR, "2", tmp_path)
+
+    churn = student_churn(LAST_YEAR, THIS_YEAR, tmp_path)
+
+    assert runs(STUDENTS, THIS_YEAR, tmp_path) == ["1", "2"]
+    assert churn.rows() == [("d@x.ch", JOINED), ("b@x.ch", LEFT)]
+
+
+def test_passwords_are_not_archived(tmp_path):
+    archive_frame(students("a@x.ch"), STUDENTS, THIS_YEAR, "1", tmp_path)
+
+    archived = scan(STUDENTS, tmp_path).collect()
+
+    assert "password" not in archived.columns
+    assert archived["schoolyear"].to_list() == [2026]
+
+
+def test_course_reassignments(tmp_path):
+    archive_frame(
+        teachers(("3M08", "Maths", "p@x.ch"), ("3M08", "Physique", "q@x.ch")),
+        PREPROCESSED,
+        LAST_YEAR,
+        root=tmp_path,
+    )
+    archive_frame(
+        teachers(
+            ("3M08", "Maths", "P@x.ch"),
+            ("3M08", "Physique", "r@x.ch"),
+            ("3M09", "Maths", "p@x.ch"),
+        ),
+        PREPROCESSED,
+        THIS_YEAR,
+        root=tmp_path,
+    )
+
+    reassigned = course_reassignments(LAST_YEAR, THIS_YEAR, tmp_path)
+
+    assert reassigned.rows() == [("3M08", "Physique", ["q@x.ch"], ["r@x.ch"])]
+
+
+def test_missing_year(tmp_path):
+    with pytest.raises(ValueError):
+        student_churn(LAST_YEAR, THIS_YEAR, tmp_path)
@@ -0,0 +1,98 @@
+"""Tests for audit_enrolment_methods.py."""
+
+import polars as pl
+from fake_moodle import FakeMoodle
+
+from audit_enrolment_methods import (
+    STATUS,
+    TO_FIX,
+    Status,
+    audit,
+    audit_moodle,
+    expected_methods,
+)
+
+STUDENT = {"roleid": 5, "shortname": "student"}
+GUEST = {"roleid": 6, "shortname": "guest"}
+
+METHODS = pl.DataFrame(
+    {
+        "metacohort": ["2627_3M08", "2627_3M08", "2627_3M09", "2627_3M09", "2627_X"],
+        "shortname": ["2627_3M08_Maths", "2627_3M08_Bio", "2627_3M09_Maths"]
+        + ["2627_3M09_Bio", "2627_X_Maths"],
+        "operation": ["add"] * 5,
+        "method": ["cohort"] * 5,
+        "disabled": [0] * 5,
+        "role": ["student"] * 5,
+    }
+)
+
+
+def test_audit_statuses():
+    members = pl.DataFrame(
+        {"metacohort": ["2627_3M08", "2627_3M08", "2627_3M09"], "user_id": [1, 2, 3]}
+    )
+    enrolments = pl.DataFrame(
+        {
+            "shortname": ["2627_3M08_Maths", "2627_3M08_Maths", "2627_3M08_Bio"]
+            + ["2627_3M09_Bio"],
+            "user_id": [1, 2, 1, 3],
+            "role": ["student", "student", "student", "guest"],
+        }
+    )
+
+    audited = audit(expected_methods(METHODS), members, enrolments)
+
+    assert audited[STATUS].to_list() == [
+        Status.OK,
+        Status.INCOMPLETE,
+        Status.MISSING,
+        Status.WRONG_ROLE,
+        Status.EMPTY_COHORT,
+    ]
+
+
+def test_audit_moodle():
+    courses = {
+        "2627_3M08_Maths": 10,
+        "2627_3M08_Bio": 11,
+        "2627_3M09_Maths": 12,
+        "2627_3M09_Bio": 13,
+    }
+    enrolled = {
+        10: [{"id": 1, "roles": [STUDENT]}],
+        13: [{"id": 3, "roles": [GUEST]}],
+    }
+    moodle = FakeMoodle(
+        {
+            "core_course_get_courses_by_field": lambda: {
+                "courses": [
+                    {"id": i, "shortname": s, "fullname": s, "categoryid": 1}
+                    for s, i in courses.items()
+                ]
+            },
+            "core_cohort_search_cohorts": lambda **_: {
+                "cohorts": [
+                    {"id": 20, "name": "2627_3M08"},
+                    {"id": 21, "name": "2627_3M09"},
+                ]
+            },
+            "core_cohort_get_cohort_members": lambda cohortids: [
+                {"cohortid": c, "userids": {20: [1], 21: [3]}[c]} for c in cohortids
+            ],
+            "core_enrol_get_enrolled_users": lambda courseid, options: enrolled.get(
+                courseid, []
+            ),
+        }
+    )
+
+    audited = audit_moodle(moodle, expected_methods(METHODS))
+
+    # The course and cohort that don't exist are left out
+    assert len(audited) == 4
+    assert moodle.count("core_enrol_get_enrolled_users") == 4
+    assert audited.filter(pl.col(STATUS).is_in(TO_FIX))["shortname"].to_list() == [
+        "2627_3M08_Bio",
+        "2627_3M09_Maths",
+        "2627_3M09_Bio",
+    ]
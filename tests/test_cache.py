@@ -0,0 +1,56 @@
+"""Tests for lib.cache."""
+
+import argparse
+
+import polars as pl
+import pytest
+
+from lib import cache
+from lib.cache import cached_frame
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path / "cache")
+
+
+def run(tmp_path, config=None, no_cache=False) -> list[int]:
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return pl.read_csv(tmp_path / "input.csv")
+
+    frame = cached_frame(
+        argparse.Namespace(no_cache=no_cache),
+        "stage",
+        inputs=[tmp_path / "input.csv"],
+        config=config or {},
+        code=[__file__],
+        compute=compute,
+    )
+    assert frame.equals(pl.read_csv(tmp_path / "input.csv"))
+    return computed
+
+
+def test_unchanged_inputs_are_a_hit(tmp_path):
+    (tmp_path / "input.csv").write_text("a\n1\n")
+    assert run(tmp_path) == [1]
+    assert run(tmp_path) == []
+    assert run(tmp_path, no_cache=True) == [1]
+
+
+def test_changes_are_misses(tmp_path):
+    (tmp_path / "input.csv").write_text("a\n1\n")
+    run(tmp_path)
+    assert run(tmp_path, config={"salt": "other"}) == [1]
+    (tmp_path / "input.csv").write_text("a\n2\n")
+    assert run(tmp_path) == [1]
+
+
+def test_old_entries_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES_PER_STAGE", 2)
+    (tmp_path / "input.csv").write_text("a\n1\n")
+    for i in range(4):
+        run(tmp_path, config={"i": str(i)})
+    assert len(list((tmp_path / "cache" / "stage").glob("*.parquet"))) == 2
@@ -0,0 +1,66 @@
+"""Tests for lib.chunks."""
+
+import hashlib
+import json
+
+import polars as pl
+import pytest
+
+from lib.chunks import manifest_path, write_chunks
+from lib.widecsv import Spread, render_wide_csv
+
+FRAME = pl.DataFrame(
+    {
+        "email": [f"user{i}@x.ch" for i in range(7)],
+        "courses": [["c1"], ["c1", "c2", "c3"], [], ["c2"], None, ["c4"], ["c1"]],
+    }
+)
+SPREADS = {"courses": Spread("cohort", start=2)}
+
+
+def read_chunks(tmp_path, manifest):
+    return [(tmp_path / c["file"]).read_bytes() for c in manifest["chunks"]]
+
+
+def test_chunks_by_rows(tmp_path):
+    path = tmp_path / "students.csv"
+    manifest = write_chunks(FRAME, path, SPREADS, max_rows=3, max_bytes=None)
+    assert [c["rows"] for c in manifest["chunks"]] == [3, 3, 1]
+    assert json.loads(manifest_path(path).read_text()) == manifest
+
+    chunks = read_chunks(tmp_path, manifest)
+    header = b"email,cohort2,cohort3,cohort4\n"
+    assert all(chunk.startswith(header) for chunk in chunks)
+    assert [c["sha256"] for c in manifest["chunks"]] == [
+        hashlib.sha256(chunk).hexdigest() for chunk in chunks
+    ]
+
+    # Put back together, the chunks are the unchunked file
+    whole = header + b"".join(chunk[len(header) :] for chunk in chunks)
+    assert whole == render_wide_csv(FRAME, SPREADS)
+
+
+def test_chunks_by_bytes(tmp_path):
+    path = tmp_path / "students.csv"
+    manifest = write_chunks(FRAME, path, SPREADS, max_rows=None, max_bytes=80)
+    assert all(c["bytes"] <= 80 for c in manifest["chunks"])
+    assert sum(c["rows"] for c in manifest["chunks"]) == len(FRAME)
+
+
+def test_stale_chunks_are_removed(tmp_path):
+    path = tmp_path / "students.csv"
+    write_chunks(FRAME, path, SPREADS, max_rows=1, max_bytes=None)
+    (tmp_path / "students.part1000.csv").write_text("left over")
+    (tmp_path / "students.part_notes.csv").write_text("not a chunk")
+    write_chunks(FRAME, path, SPREADS, max_rows=4, max_bytes=None)
+    assert sorted(p.name for p in tmp_path.glob("students.part*.csv")) == [
+        "students.part001.csv",
+        "students.part002.csv",
+        "students.part_notes.csv",
+    ]
+
+
+def test_multi_line_values_are_refused(tmp_path):
+    frame = pl.DataFrame({"name": ["one\ntwo"]})
+    with pytest.raises(ValueError):
+        write_chunks(frame, tmp_path / "out.csv", {}, max_rows=1, max_bytes=None)
@@ -0,0 +1,154 @@
+"""Tests for lib.circuit, and the timeouts of lib.moodle_api."""
+
+import threading
+
+import pytest
+import requests
+
+from lib.circuit import CircuitBreaker, CircuitOpenError
+from lib.latency import MIN_READ_TIMEOUT, LatencyStats
+from lib.moodle_api import DEFAULT_TIMEOUT, MoodleClient
+
+URL = "https://moodle.example.com/webservice/rest/server.php"
+
+
+def fail(breaker: CircuitBreaker, error: Exception):
+    with pytest.raises(type(error)), breaker.call():
+        raise error
+
+
+def test_opens_after_failures_in_a_row_and_closes_on_a_probe():
+    breaker = CircuitBreaker(threshold=3, cooldown=0.05)
+    for _ in range(2):
+        fail(breaker, requests.ConnectionError())
+    with breaker.call():
+        pass
+    for _ in range(3):
+        fail(breaker, requests.Timeout())
+    assert breaker.is_open
+
+    # The workers wait for the probe rather than calling the server
+    probing, release = threading.Event(), threading.Event()
+    resumed = []
+
+    def probe():
+        with breaker.call():
+            probing.set()
+            release.wait(5)
+
+    def worker():
+        with breaker.call():
+            resumed.append(breaker.is_open)
+
+    threads = [threading.Thread(target=probe)]
+    threads[0].start()
+    assert probing.wait(5)
+    threads += [threading.Thread(target=worker) for _ in range(3)]
+    for thread in threads[1:]:
+        thread.start()
+    assert resumed == []
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert resumed == [False, False, False]
+    assert not breaker.is_open
+
+
+def test_errors_of_the_call_dont_open_it():
+    breaker = CircuitBreaker(threshold=1)
+    not_found = requests.Response()
+    not_found.status_code = 404
+    fail(breaker, requests.HTTPError(response=not_found))
+    fail(breaker, ValueError())
+    assert not breaker.is_open
+
+
+def test_fails_fast_after_a_long_outage_but_recovers():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05, give_up_after=0.01)
+    fail(breaker, requests.ConnectionError())
+
+    with pytest.raises(CircuitOpenError), breaker.call():
+        pass
+
+    # The probe runs once the cooldown is over, and fails
+    threading.Event().wait(0.06)
+    fail(breaker, requests.HTTPError("503 Server Error"))
+    with pytest.raises(CircuitOpenError), breaker.call():
+        pass
+
+    # Until the next probe succeeds
+    threading.Event().wait(0.15)
+    with breaker.call():
+        pass
+    assert not breaker.is_open
+
+
+def test_an_interrupted_probe_lets_the_next_one_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01, give_up_after=0.5)
+    fail(breaker, requests.ConnectionError())
+    threading.Event().wait(0.02)
+
+    with pytest.raises(KeyboardInterrupt), breaker.call():
+        raise KeyboardInterrupt
+    assert breaker.is_open
+
+    with breaker.call():
+        pass
+    assert not breaker.is_open
+
+
+class FakeSession:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.timeouts: list[tuple] = []
+
+    def post(self, url, parameters, timeout):
+        self.timeouts.append(timeout)
+        if self.failures:
+            self.failures -= 1
+            raise requests.ConnectionError("down")
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"[]"
+        response.request = requests.Request("POST", url, data=parameters).prepare()
+        return response
+
+
+def test_client_timeouts_and_breaker():
+    client = MoodleClient(URL, "token", read_timeouts={"core_cohort_search_cohorts": 7})
+    client.breaker = CircuitBreaker(threshold=2, cooldown=0.01)
+    client.session = FakeSession(failures=2)  # type: ignore[assignment]
+
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client("core_course_delete_courses", courseids=[1])
+    assert client.breaker.is_open
+    assert client("core_cohort_search_cohorts") == []
+    assert not client.breaker.is_open
+
+    assert client.session.timeouts == [DEFAULT_TIMEOUT] * 2 + [(DEFAULT_TIMEOUT[0], 7)]
+
+
+def test_read_timeouts_are_tuned_from_the_latencies():
+    stats = LatencyStats(
+        {
+            "core_cohort_search_cohorts": [(100, 0.5)] * 90 + [(100, 5.0)] * 10,
+            "core_user_get_users_by_field": [(100, 0.1)] * 100,
+            "core_enrol_get_enrolled_users": [(100, 100.0)] * 100,
+            "core_course_get_categories": [(100, 1.0)] * 5,
+        }
+    )
+    timeouts = stats.read_timeouts(
+        [
+            "core_cohort_search_cohorts",
+            "core_user_get_users_by_field",
+            "core_enrol_get_enrolled_users",
+            "core_course_get_categories",
+        ],
+        ceiling=300,
+    )
+    assert timeouts["core_user_get_users_by_field"] == MIN_READ_TIMEOUT
+    assert timeouts["core_cohort_search_cohorts"] == 20
+    assert timeouts["core_enrol_get_enrolled_users"] == 300
+    assert "core_course_get_categories" not in timeouts
@@ -0,0 +1,70 @@
+"""Tests for lib.diff."""
+
+import polars as pl
+
+from lib.diff import (
+    EXTRA,
+    KEY,
+    LOG_LIMIT,
+    MISSING,
+    STATUS,
+    UNCHANGED,
+    diff_keys,
+    report_diff,
+)
+
+
+def test_diff_keys():
+    diff = diff_keys({"b", "a", "c"}, pl.Series(["c", "d", "d", None]))
+    assert diff.extra.to_list() == ["a", "b"]
+    assert diff.missing.to_list() == ["d"]
+
+
+def test_diff_keys_empty_sides():
+    diff = diff_keys([], ["x"])
+    assert diff.to_dict() == {"extra": [], "missing": ["x"]}
+
+
+def test_diff_keys_unchanged():
+    diff = diff_keys(["a", "b"], ["b", "c", "a"])
+    assert diff.unchanged.to_list() == ["a", "b"]
+
+
+def test_diff_keys_case_insensitive_keeps_each_side_spelling():
+    diff = diff_keys(
+        ["Anna.Muster@eduvaud.ch", "old@eduvaud.ch"],
+        ["anna.muster@eduvaud.ch", "New@eduvaud.ch"],
+        case_insensitive=True,
+    )
+    assert diff.extra.to_list() == ["old@eduvaud.ch"]
+    assert diff.missing.to_list() == ["New@eduvaud.ch"]
+    assert diff.unchanged.to_list() == ["anna.muster@eduvaud.ch"]
+
+
+def test_diff_keys_case_sensitive_by_default():
+    diff = diff_keys(["A"], ["a"])
+    assert diff.to_dict() == {"extra": ["A"], "missing": ["a"]}
+
+
+def test_frame():
+    diff = diff_keys(["a", "b"], ["b", "c"])
+    assert diff.frame().rows() == [("a", EXTRA), ("c", MISSING)]
+    assert diff.frame(include_unchanged=True).rows()[-1] == ("b", UNCHANGED)
+
+
+def test_report_diff_writes_all_the_differences_to_the_output(tmp_path):
+    wanted = [f"k{i:03}" for i in range(LOG_LIMIT + 1)]
+
+    report_diff(diff_keys(["a"], wanted), "things", tmp_path / "out.csv")
+
+    written = pl.read_csv(tmp_path / "out.csv")
+    assert written.rows()[0] == ("a", EXTRA)
+    assert written[KEY].to_list()[1:] == wanted
+    assert set(written[STATUS][1:]) == {MISSING}
+
+
+def test_report_diff_without_output_only_logs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wanted = [f"k{i:03}" for i in range(LOG_LIMIT + 1)]
+    report_diff(diff_keys([], wanted), "things")
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,60 @@
+"""Tests for the per-cohort membership diff of diff_cohort_members.py."""
+
+import polars as pl
+from fake_moodle import FakeMoodle
+
+from diff_cohort_members import diff_memberships, fetch_memberships, wanted_memberships
+
+
+def test_wanted_memberships_unpivots_cohort_columns():
+    src = pl.DataFrame(
+        {
+            "email": ["a@school.ch", "b@school.ch"],
+            "username": ["a@school.ch", "b@school.ch"],
+            "cohort1": ["2627_eleves", "2627_eleves"],
+            "cohort2": ["2627_3M08", "2627_3M09"],
+            "cohort3": ["2627_3MOSPM2", None],
+        }
+    )
+    assert wanted_memberships(src).sort("cohort", "email").rows() == [
+        ("2627_3M08", "a@school.ch"),
+        ("2627_3M09", "b@school.ch"),
+        ("2627_3MOSPM2", "a@school.ch"),
+        ("2627_eleves", "a@school.ch"),
+        ("2627_eleves", "b@school.ch"),
+    ]
+
+
+def test_fetch_and_diff_memberships():
+    members = {10: [100, 101], 11: [101, 102], 12: [100]}
+    emails = {100: "a@school.ch", 101: "b@school.ch", 102: "c@school.ch"}
+    moodle = FakeMoodle(
+        {
+            "core_cohort_get_cohort_members": lambda cohortids: [
+                {"cohortid": c, "userids": members[c]} for c in cohortids
+            ],
+            "core_user_get_users_by_field": lambda values, **_: [
+                {"id": i, "email": emails[i]} for i in values
+            ],
+        }
+    )
+    cohorts = pl.DataFrame(
+        {"id": [10, 11, 12], "name": ["2627_eleves", "2627_3M08", "2627_3M09"]}
+    )
+
+    existing = fetch_memberships(moodle, cohorts)
+    # Users present in several cohorts are only looked up once
+    assert moodle.count("core_user_get_users_by_field") == 1
+    assert len(moodle.calls[-1][1]["values"]) == 3
+
+    wanted = pl.DataFrame(
+        {
+            "cohort": ["2627_eleves", "2627_eleves", "2627_3M08", "2627_3M09"],
+            "email": ["A@school.ch", "b@school.ch", "b@school.ch", "B@school.ch"],
+        }
+    )
+    assert diff_memberships(existing, wanted).rows() == [
+        ("2627_3M08", "c@school.ch", "in moodle but not in file"),
+        ("2627_3M09", "a@school.ch", "in moodle but not in file"),
+        ("2627_3M09", "B@school.ch", "in file but not in moodle"),
+    ]
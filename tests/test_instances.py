@@ -0,0 +1,51 @@
+"""Tests for lib.instances and compare_instances."""
+
+import pytest
+from test_snapshot import COURSES, make_moodle
+
+from compare_instances import compare, compared_keys
+from lib.instances import PRODUCTION, get_instance, load_instances
+from lib.journal import journal_path
+from lib.moodle_api import URL
+from lib.snapshot import COHORT_MEMBERS, Snapshot, take_snapshot
+from lib.snapshot import COURSES as COURSES_ENTITY
+
+
+def test_instances_come_from_the_toml_file(tmp_path):
+    path = tmp_path / "instances.toml"
+    path.write_text(
+        '[staging]\nurl = "https://staging.example.ch"\n'
+        'token_env = "STAGING_TOKEN"\nmax_workers = 2\n'
+    )
+
+    instances = load_instances(path)
+
+    assert instances[PRODUCTION].url == URL
+    assert instances["staging"].token_env == "STAGING_TOKEN"
+    assert instances["staging"].max_workers == 2
+
+
+def test_unknown_instance_exits(tmp_path):
+    with pytest.raises(SystemExit):
+        get_instance("staging", tmp_path / "missing.toml")
+
+
+def test_journals_are_kept_per_instance():
+    assert journal_path("delete", "12") != journal_path("delete", "12", "staging")
+    assert journal_path("delete", "12", PRODUCTION) == journal_path("delete", "12")
+
+
+def test_compare_instances(tmp_path):
+    take_snapshot(make_moodle(COURSES), tmp_path / "production")
+    other = {**COURSES, 3: ["Sandbox", "Rehearsal"]}
+    take_snapshot(make_moodle(other), tmp_path / "staging")
+
+    comparison = compare(
+        compared_keys(Snapshot(tmp_path / "production")),
+        compared_keys(Snapshot(tmp_path / "staging")),
+    )
+
+    assert comparison[COURSES_ENTITY]["only_in_reference"] == []
+    assert comparison[COURSES_ENTITY]["only_in_other"] == ["Rehearsal"]
+    assert comparison[COHORT_MEMBERS]["reference_count"] == 3
+    assert comparison[COHORT_MEMBERS]["only_in_other"] == []
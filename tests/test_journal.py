@@ -0,0 +1,142 @@
+"""Tests for lib.journal."""
+
+import pytest
+import structlog
+from fake_moodle import FakeMoodle
+
+import delete_courses_in_category
+from add_cohorts import record_existing
+from delete_cohorts_with_prefix import resume_deletion
+from lib.journal import Journal
+
+
+def test_resume_skips_completed_items(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    items: list[dict] = [
+        {"id": 1, "shortname": "a"},
+        {"id": 2, "shortname": "b"},
+        {"id": 3},
+    ]
+
+    journal = Journal.start(path, items)
+    journal.record_done(1)
+    journal.record_done(3)
+
+    resumed = Journal.resume(path)
+    assert resumed.pending() == [{"id": 2, "shortname": "b"}]
+
+    resumed.record_done(2)
+    assert Journal.resume(path).pending() == []
+
+
+def test_start_replaces_previous_journal(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    Journal.start(path, [{"id": "x"}]).record_done("x")
+
+    Journal.start(path, [{"id": "y"}])
+    assert Journal.resume(path).pending() == [{"id": "y"}]
+
+
+def test_resume_drops_a_half_written_last_record(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal.start(path, [{"id": 1}, {"id": 2}, {"id": 3}])
+    journal.record_done(1)
+    with path.open("a") as f:
+        f.write('{"type": "done", "at": 1')
+
+    resumed = Journal.resume(path)
+    assert resumed.pending() == [{"id": 2}, {"id": 3}]
+
+    resumed.record_done(2)
+    assert Journal.resume(path).pending() == [{"id": 3}]
+
+
+def test_resume_without_a_plan_exits(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"type": "plan", "at": 1, "items": [{"id"')
+    with pytest.raises(SystemExit, match="no plan"):
+        Journal.resume(path)
+
+
+def test_resume_skips_the_cohorts_created_anyway(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal.start(path, [{"id": "2627_1M01"}, {"id": "2627_1M02"}])
+
+    record_existing(journal, {"2627_1M01", "2627_other"})
+
+    assert Journal.resume(path).pending() == [{"id": "2627_1M02"}]
+
+
+def test_resume_skips_the_cohorts_deleted_anyway(tmp_path):
+    cohorts = {1: "2627_1M01", 2: "2627_1M02", 3: "2627_1M03"}
+    path = tmp_path / "journal.jsonl"
+    Journal.start(path, [{"id": i, "name": n} for i, n in cohorts.items()])
+    # The run died once Moodle deleted the first batch, before it was journaled
+    del cohorts[1]
+
+    def delete_cohorts(cohortids):
+        if any(i not in cohorts for i in cohortids):
+            return {"exception": "dml_missing_record_exception"}
+        for i in cohortids:
+            del cohorts[i]
+
+    moodle = FakeMoodle(
+        {
+            "core_cohort_search_cohorts": lambda **_: {
+                "cohorts": [{"id": i, "name": n} for i, n in cohorts.items()]
+            },
+            "core_cohort_delete_cohorts": delete_cohorts,
+        }
+    )
+    resume_deletion(moodle, "2627_", Journal.resume(path), batch_size=1)
+
+    assert cohorts == {}
+    assert moodle.count("core_cohort_delete_cohorts") == 2
+    assert Journal.resume(path).pending() == []
+
+
+def test_resume_skips_the_courses_deleted_anyway(tmp_path):
+    courses = {10: "2627_1M01_Maths", 11: "2627_1M01_Bio", 12: "2627_1M02_Maths"}
+    path = tmp_path / "journal.jsonl"
+    Journal.start(path, [{"id": i, "shortname": s} for i, s in courses.items()])
+    del courses[10]
+
+    def delete_courses(courseids):
+        # Moodle doesn't fail on the courses it doesn't find, it warns
+        warnings = [
+            {"item": "course", "itemid": i, "warningcode": "unknowncourseidnumber"}
+            for i in courseids
+            if courses.pop(i, None) is None
+        ]
+        return {"warnings": warnings}
+
+    moodle = FakeMoodle(
+        {
+            "core_course_get_categories": lambda criteria: [
+                {"id": 5, "name": "2627", "coursecount": len(courses)}
+            ],
+            "core_course_get_courses_by_field": lambda field, value: {
+                "courses": [{"id": i, "shortname": s} for i, s in courses.items()]
+            },
+            "core_course_delete_courses": delete_courses,
+        }
+    )
+    with structlog.testing.capture_logs() as logs:
+        delete_courses_in_category.resume_deletion(moodle, "5", Journal.resume(path))
+
+    assert courses == {}
+    deleted = [
+        kwargs["courseids"]
+        for fname, kwargs in moodle.calls
+        if fname == "core_course_delete_courses"
+    ]
+    assert deleted == [[11], [12]]
+    assert not [e for e in logs if e["event"] == "not deleted"]
+    assert Journal.resume(path).pending() == []
+
+    # And the warnings of a deletion are logged
+    with structlog.testing.capture_logs() as logs:
+        delete_courses_in_category.delete_journaled_courses(
+            moodle, Journal.start(path, [{"id": 99, "shortname": "gone"}])
+        )
+    assert [e["itemid"] for e in logs if e["event"] == "not deleted"] == [99]
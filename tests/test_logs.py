@@ -0,0 +1,65 @@
+"""Tests for lib.logs."""
+
+import argparse
+import json
+
+import pytest
+import structlog
+
+from lib.logs import Sampler, add_log_arguments, configure_logging, summarize_lists
+
+
+@pytest.fixture
+def parse():
+    def parse(*argv: str) -> argparse.Namespace:
+        parser = argparse.ArgumentParser()
+        add_log_arguments(parser)
+        return parser.parse_args(argv)
+
+    yield parse
+    structlog.reset_defaults()
+
+
+def test_sampler_keeps_one_in_n_per_item_events():
+    sampler = Sampler(3)
+    kept = []
+    for i in range(7):
+        for event in ("course", "done"):
+            try:
+                kept.append(sampler(None, "info", {"event": event, "i": i}))
+            except structlog.DropEvent:
+                pass
+    assert [e["i"] for e in kept if e["event"] == "course"] == [0, 3, 6]
+    assert len([e for e in kept if e["event"] == "done"]) == 7
+
+
+def test_summarize_lists():
+    processor = summarize_lists(2)
+    event = processor(None, "info", {"emails": ["a", "b", "c"], "few": ["x"]})
+    assert event == {"emails": ["a", "b"], "emails_count": 3, "few": ["x"]}
+
+
+def test_json_file_with_level_and_sampling(parse, tmp_path):
+    path = tmp_path / "run.jsonl"
+    configure_logging(
+        parse("--log-file", str(path), "--log-level", "info", "--log-sample", "2")
+    )
+    log = structlog.get_logger()
+    log.debug("hidden")
+    for i in range(4):
+        log.info("course", shortname=f"c{i}")
+    log.warning("done", courses=list(range(200)))
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [e["event"] for e in events] == ["course", "course", "done"]
+    assert [e["shortname"] for e in events[:2]] == ["c0", "c2"]
+    assert events[-1]["level"] == "warning"
+    assert events[-1]["courses_count"] == 200
+    assert "timestamp" in events[-1]
+
+
+def test_debug_events_are_logged_by_default(parse, tmp_path):
+    path = tmp_path / "run.jsonl"
+    configure_logging(parse("--log-file", str(path)))
+    structlog.get_logger().debug("collecting courses")
+    assert json.loads(path.read_text())["level"] == "debug"
@@ -0,0 +1,83 @@
+"""Tests for lib.moodle_index."""
+
+import polars as pl
+
+from lib.moodle_index import (
+    MoodleIndex,
+    category_paths,
+    references,
+    unresolved_references,
+)
+
+CATEGORIES = pl.DataFrame(
+    {
+        "id": [1, 2, 3],
+        "name": ["2026-2027", "Maths", "OS"],
+        "path": ["/1", "/1/2", "/1/2/3"],
+    }
+)
+COURSES = pl.DataFrame({"shortname": ["2627_3M08_maths", "2627_3M09_maths"]})
+COHORTS = pl.DataFrame(
+    {
+        "id": [1, 10],
+        "name": ["Enseignants", "2627_3M08"],
+        "idnumber": ["", "2627_3M08"],
+    }
+)
+INDEX = MoodleIndex.from_frames(CATEGORIES, COURSES, COHORTS)
+
+
+def test_category_paths():
+    assert category_paths(CATEGORIES).to_list() == [
+        "2026-2027",
+        "2026-2027 / Maths",
+        "2026-2027 / Maths / OS",
+    ]
+
+
+def test_references_depend_on_the_file():
+    assert references(["shortname", "fullname", "category_path"]) == {
+        "category_path": "category"
+    }
+    assert references(["metacohort", "shortname", "operation"]) == {
+        "metacohort": "cohort",
+        "shortname": "course",
+    }
+    assert references(["email", "cohort1", "course1", "type1"]) == {
+        "cohort1": "cohort",
+        "course1": "course",
+    }
+
+
+def test_unresolved_references():
+    enrolment_methods = pl.DataFrame(
+        {
+            "metacohort": ["2627_3M08", "2627_3M10", "2627_3M08"],
+            "shortname": ["2627_3M08_maths", "2627_3M10_maths", "2627_3M07_maths"],
+            "operation": ["add"] * 3,
+        }
+    )
+    assert unresolved_references(enrolment_methods, INDEX).rows() == [
+        (3, "metacohort", "cohort", "2627_3M10"),
+        (3, "shortname", "course", "2627_3M10_maths"),
+        (4, "shortname", "course", "2627_3M07_maths"),
+    ]
+
+
+def test_cohorts_resolve_by_id_and_empty_cells_are_skipped():
+    teachers = pl.DataFrame(
+        {
+            "email": ["a@school.ch", "b@school.ch"],
+            "cohort1": ["1", "1"],
+            "course1": ["2627_3M08_maths", "2627_3M09_maths"],
+            "course2": ["2627_3M09_maths", None],
+        }
+    )
+    assert unresolved_references(teachers, INDEX).is_empty()
+
+    courses = pl.DataFrame(
+        {"shortname": ["new"], "category_path": ["2026-2027 / Maths / OC"]}
+    )
+    assert unresolved_references(courses, INDEX)["value"].to_list() == [
+        "2026-2027 / Maths / OC"
+    ]
@@ -0,0 +1,49 @@
+"""Tests for lib.pipeline."""
+
+import pytest
+
+from lib.pipeline import KEPT, RAN, Pipeline, Stage
+
+
+def make_pipeline(runs: list[str]) -> Pipeline:
+    def stage(name, fn):
+        def run(*args):
+            runs.append(name)
+            return fn(*args)
+
+        return run
+
+    return Pipeline(
+        [
+            Stage("double", ("a",), stage("double", lambda a: a * 2)),
+            Stage("sum", ("double", "b"), stage("sum", lambda d, b: d + b)),
+            Stage("negate", ("b",), stage("negate", lambda b: -b)),
+        ]
+    )
+
+
+def test_only_what_depends_on_a_change_runs():
+    runs: list[str] = []
+    pipeline = make_pipeline(runs)
+    pipeline.set_source("a", "v1", lambda: 1)
+    pipeline.set_source("b", "v1", lambda: 10)
+    assert pipeline.refresh() == {"double": RAN, "sum": RAN, "negate": RAN}
+    assert pipeline.values["sum"] == 12
+
+    runs.clear()
+    assert not pipeline.set_source("a", "v1", lambda: 1 / 0)  # Not loaded again
+    assert pipeline.set_source("b", "v2", lambda: 20)
+    assert pipeline.refresh() == {"double": KEPT, "sum": RAN, "negate": RAN}
+    assert runs == ["sum", "negate"]
+    assert pipeline.values["sum"] == 22
+
+
+def test_failed_stage_runs_again():
+    runs: list[str] = []
+    pipeline = make_pipeline(runs)
+    pipeline.set_source("a", "v1", lambda: 1)
+    pipeline.set_source("b", "v1", lambda: None)
+    with pytest.raises(TypeError):
+        pipeline.refresh()
+    pipeline.set_source("b", "v2", lambda: 10)
+    assert pipeline.refresh() == {"double": KEPT, "sum": RAN, "negate": RAN}
@@ -0,0 +1,80 @@
+"""Tests for lib.plan and lib.latency, and the --plan mode of the scripts."""
+
+import threading
+
+import pytest
+from fake_moodle import FakeMoodle
+
+from add_cohorts import create_journaled_cohorts, creation_calls
+from delete_cohorts_with_prefix import delete_moodle_cohorts_with_prefix
+from lib.journal import Journal
+from lib.latency import LatencyStats, record_run
+from lib.plan import print_plan
+
+
+def test_estimate_is_the_median_for_a_single_size():
+    stats = LatencyStats({"f": [(100, 1.0), (100, 3.0), (100, 2.5)]})
+    assert stats.estimate("f", 5000) == 2.5
+    assert stats.estimate("unknown", 100) is None
+
+
+def test_estimate_grows_with_the_payload():
+    stats = LatencyStats({"f": [(1000, 1.0), (2000, 2.0), (3000, 3.0)]})
+    assert stats.estimate("f", 4000) == pytest.approx(4.0)
+
+
+def test_record_run_keeps_the_samples_across_runs(tmp_path):
+    path = tmp_path / "latency.json"
+    record_run({"f": [(10, 1.0)]}, path)
+    record_run({"f": [(10, 2.0)], "g": [(5, 0.5)]}, path)
+    assert LatencyStats.load(path).samples == {
+        "f": [(10, 1.0), (10, 2.0)],
+        "g": [(5, 0.5)],
+    }
+
+
+def test_runs_ending_together_keep_all_their_samples(tmp_path):
+    path = tmp_path / "latency.json"
+    runs = [
+        threading.Thread(target=record_run, args=({"f": [(i, 1.0)]}, path))
+        for i in range(20)
+    ]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join(5)
+    assert sorted(LatencyStats.load(path).samples["f"]) == [(i, 1.0) for i in range(20)]
+
+
+def test_plan_is_what_the_run_posts(tmp_path):
+    names = [f"2627_1M{i:02}" for i in range(7)]
+    moodle = FakeMoodle({"core_cohort_create_cohorts": lambda **_: []})
+    journal = Journal.start(tmp_path / "journal.jsonl", [{"id": n} for n in names])
+    create_journaled_cohorts(moodle, "42", journal, batch_size=3)
+
+    planned = creation_calls("42", names, batch_size=3)
+    assert [(c.fname, c.kwargs) for c in planned] == moodle.calls
+
+
+def test_print_plan(capsys):
+    calls = creation_calls("42", [f"cohort{i}" for i in range(300)], batch_size=250)
+    stats = LatencyStats({"core_cohort_create_cohorts": [(100, 2.0)]})
+    print_plan(calls, stats)
+    out = capsys.readouterr().out
+    assert "2 calls" in out
+    assert "Estimated duration: 0h00m04s" in out
+    # 250 cohorts of 4 parameters each, plus the 3 of every call
+    assert "1 calls go over max_input_vars" in out
+
+
+def test_plan_mode_deletes_nothing(capsys):
+    moodle = FakeMoodle(
+        {
+            "core_cohort_search_cohorts": lambda **_: {
+                "cohorts": [{"id": 1, "name": "2627_1M01"}]
+            }
+        }
+    )
+    delete_moodle_cohorts_with_prefix(moodle, "2627_", plan=True)
+    assert moodle.count("core_cohort_delete_cohorts") == 0
+    assert "core_cohort_delete_cohorts" in capsys.readouterr().out
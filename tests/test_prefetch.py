@@ -0,0 +1,31 @@
+"""Tests for lib.prefetch."""
+
+import threading
+
+import pytest
+from fake_moodle import FakeMoodle
+
+from lib.moodle_api import MoodleApiError
+from lib.prefetch import Prefetch
+from prepare_students import EXISTING_COHORTS, PREFETCH
+
+
+def test_lookups_run_in_the_background():
+    release = threading.Event()
+
+    def cohorts(**kwargs):
+        # Only answers once the main thread has moved on
+        assert release.wait(timeout=5)
+        return {"cohorts": [{"id": 1, "name": "2627_3M05"}]}
+
+    moodle = FakeMoodle({"core_cohort_search_cohorts": cohorts})
+    with Prefetch(moodle, PREFETCH) as prefetch:
+        release.set()
+        assert prefetch.get(EXISTING_COHORTS) == {"2627_3M05"}
+    assert moodle.count("core_cohort_search_cohorts") == 1
+
+
+def test_get_raises_what_the_lookup_raised():
+    with Prefetch(FakeMoodle({}), PREFETCH) as prefetch:
+        with pytest.raises(MoodleApiError):
+            prefetch.get(EXISTING_COHORTS)
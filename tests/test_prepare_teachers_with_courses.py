@@ -0,0 +1,33 @@
+"""Tests for prepare_teachers_with_courses.py."""
+
+import polars as pl
+
+from lib.columns import (
+    COURSE_SHORTNAME,
+    TEACHER_EMAIL,
+    TEACHER_FIRSTNAME,
+    TEACHER_LASTNAME,
+    TEACHER_TLA,
+)
+from lib.widecsv import render_wide_csv
+from prepare_teachers_with_courses import SPREADS, to_teachers_with_courses
+
+
+def test_every_type_column_is_filled():
+    src = pl.DataFrame(
+        {
+            TEACHER_TLA: ["ABC", "ABC", "DEF"],
+            TEACHER_LASTNAME: ["Alpha", "Alpha", "Delta"],
+            TEACHER_FIRSTNAME: ["Anna", "Anna", "Dora"],
+            TEACHER_EMAIL: ["a@x.ch", "a@x.ch", "d@x.ch"],
+            COURSE_SHORTNAME: ["2627_3M08_Maths", "2627_3M09_Maths", "2627_1M01_Bio"],
+        }
+    )
+    teachers = to_teachers_with_courses(src, lambda email: "secret")
+
+    rows = render_wide_csv(teachers, SPREADS).decode().splitlines()
+    assert rows == [
+        "lastname,firstname,email,course1,course2,type1,type2,cohort1,username,password",
+        "Alpha,Anna,a@x.ch,2627_3M08_Maths,2627_3M09_Maths,2,2,1,a@x.ch,secret",
+        "Delta,Dora,d@x.ch,2627_1M01_Bio,,2,2,1,d@x.ch,secret",
+    ]
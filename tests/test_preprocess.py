@@ -13,6 +13,7 @@ teacher carries their identity, the rest are NULL).
 import polars as pl
 
 from lib import schoolyear
+from lib.schoolyear import SchoolYear
 from preprocess_teachers_and_courses import (
     CLASS,
     COURSE,
@@ -125,3 +126,13 @@ def test_preprocess_uses_actuel_column_when_prochain_absent():
     )
     result = preprocess(src)
     assert result[COURSE_SHORTNAME].to_list() == [f"{YEAR_SHORT}_3M08_Mathématiques"]
+
+
+def test_preprocess_for_another_schoolyear():
+    # During the summer rollover we process exports of neighbouring years.
+    result = preprocess(make_input(), SchoolYear(2025))
+    maths = result.filter(pl.col(COURSE) == "Mathématiques").row(0, named=True)
+    assert maths[COURSE_SHORTNAME] == "2526_3M08_Mathématiques"
+    assert maths[COURSE_FULLNAME] == "Mathématiques 3M08 25-26"
+    assert maths[COURSE_CATEGORY_PATH] == "2025-2026 / Mathématiques"
+    assert maths[COURSE_COHORT] == "2526_3M08"
@@ -0,0 +1,55 @@
+"""Tests for lib.profiling."""
+
+import argparse
+import pstats
+import time
+
+import structlog
+
+from lib import profiling
+from lib.profiling import add_profile_arguments, profiled, step
+
+
+def parse(*argv: str) -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    add_profile_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def test_steps_are_timed_and_reported(capsys):
+    with structlog.testing.capture_logs() as logs, profiled(parse("--profile")):
+        with step("sleep"):
+            time.sleep(0.02)
+        with step("allocate"):
+            kept = [bytes(1000) for _ in range(1000)]
+
+    steps = [e for e in logs if e["event"] == "profile step"]
+    assert [s["step"] for s in steps] == ["sleep", "allocate"]
+    assert steps[0]["seconds"] >= 0.02
+    assert steps[1]["allocated_mb"] >= 1
+    assert len(kept) == 1000
+
+    out = capsys.readouterr().out
+    assert "sleep" in out
+    assert "allocate" in out
+    assert "total" in out
+
+
+def test_dump_can_be_loaded(tmp_path, capsys):
+    path = tmp_path / "run.prof"
+    with profiled(parse("--profile-dump", str(path))):
+        with step("sum"):
+            sum(range(1000))
+
+    stats = pstats.Stats(str(path))
+    assert stats.get_stats_profile().func_profiles
+    assert "sum" in capsys.readouterr().out
+
+
+def test_nothing_happens_when_off(capsys):
+    with profiled(parse()):
+        with step("quiet"):
+            pass
+
+    assert "quiet" not in [s["step"] for s in profiling._steps]
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,36 @@
+"""Tests for lib.progress."""
+
+from structlog.testing import capture_logs
+
+from lib.parallel import map_concurrently
+from lib.progress import Progress
+
+
+def test_metrics():
+    progress = Progress("delete courses", total=10)
+    progress.add(2, seconds=1.0)
+    progress.add(2, seconds=3.0)
+
+    metrics = progress.metrics(progress.started + 2)
+    assert metrics["done"] == 4
+    assert metrics["calls"] == 2
+    assert metrics["items_per_second"] == 2
+    assert metrics["calls_per_second"] == 1
+    assert metrics["latency_seconds"] == 2
+    # 6 items left, at 2 per second
+    assert metrics["eta_seconds"] == 3
+
+
+def test_concurrent_workers_report_to_the_same_progress():
+    with capture_logs() as logs:
+        results = map_concurrently(
+            lambda i: i * 2, range(200), max_workers=8, progress="double"
+        )
+    assert results == [i * 2 for i in range(200)]
+
+    # The last event says everything is done
+    events = [e for e in logs if e["event"] == "progress"]
+    assert events[-1]["task"] == "double"
+    assert events[-1]["done"] == events[-1]["total"] == 200
+    assert events[-1]["calls"] == 200
+    assert events[-1]["eta_seconds"] == 0
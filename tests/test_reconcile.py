@@ -0,0 +1,29 @@
+"""Tests for reconcile.py."""
+
+import polars as pl
+
+from reconcile import COHORTS, COURSES, STUDENTS, TEACHERS, reconcile
+
+
+def test_emails_are_compared_case_insensitively():
+    existing = {
+        COURSES: {"2627_3M08_Maths"},
+        COHORTS: {"2627_3M08"},
+        STUDENTS: {"Anna.Muster@eduvaud.ch", "gone@eduvaud.ch"},
+        TEACHERS: {"p.prof@eduvaud.ch"},
+    }
+    preprocessed = pl.DataFrame(
+        {"shortname": ["2627_3m08_Maths"], "cohort": ["2627_3M08"]}
+    )
+    students = pl.DataFrame({"email": ["anna.muster@eduvaud.ch"]})
+    teachers = pl.DataFrame({"email": ["P.Prof@eduvaud.ch", "new@eduvaud.ch"]})
+
+    diffs = reconcile(existing, preprocessed, students, teachers)
+
+    assert diffs[STUDENTS].to_dict() == {"extra": ["gone@eduvaud.ch"], "missing": []}
+    assert diffs[TEACHERS].to_dict() == {"extra": [], "missing": ["new@eduvaud.ch"]}
+    # Course shortnames still have to match exactly
+    assert diffs[COURSES].to_dict() == {
+        "extra": ["2627_3M08_Maths"],
+        "missing": ["2627_3m08_Maths"],
+    }
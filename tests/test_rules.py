@@ -0,0 +1,32 @@
+"""Tests for lib.rules."""
+
+import polars as pl
+
+from lib.rules import RULE, Rule, apply_rules
+
+RULES = [
+    Rule("no name", "name", "is_null"),
+    Rule("zz", "name", "starts_with", "ZZ"),
+    Rule("excluded classes", "class", "is_in", ("1A", "1B")),
+]
+
+
+def test_apply_rules():
+    src = pl.DataFrame(
+        {
+            "name": ["Bob", None, "ZZ_Name", "Alice", "ZZ_Other"],
+            "class": ["2C", "2C", "1A", "1A", "3D"],
+        }
+    )
+    kept, excluded = apply_rules(src, RULES)
+    assert kept.columns == ["name", "class"]
+    assert kept["name"].to_list() == ["Bob"]
+    # A row matching several rules is attributed to the first one
+    assert excluded[RULE].to_list() == ["no name", "zz", "excluded classes", "zz"]
+
+
+def test_null_column_matches():
+    src = pl.DataFrame({"name": ["Bob", "Alice"], "class": ["2C", None]})
+    kept, excluded = apply_rules(src, RULES)
+    assert kept["name"].to_list() == ["Bob"]
+    assert excluded[RULE].to_list() == ["excluded classes"]
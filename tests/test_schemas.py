@@ -0,0 +1,50 @@
+"""Tests for lib.schemas, with and without msgspec."""
+
+import json
+
+import pytest
+from fake_moodle import FakeMoodle
+
+from lib import schemas
+from lib.moodle_api import MoodleApiError
+from lib.schemas import CohortMembers, CohortSearch, User, decode
+
+USERS = [
+    {"id": 1, "username": "a", "email": "a@school.ch", "preferences": [{"x": 1}]},
+    {"id": 2, "username": "b"},
+]
+
+
+@pytest.fixture(params=["msgspec", "json"])
+def decoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(schemas, "msgspec", None)
+    elif schemas.msgspec is None:
+        pytest.skip("msgspec is not installed")
+
+
+@pytest.mark.usefixtures("decoder")
+def test_decode():
+    users = decode(list[User], json.dumps(USERS).encode())
+    assert users == [User(1, "a", email="a@school.ch"), User(2, "b")]
+
+    search = decode(
+        CohortSearch, b'{"cohorts": [{"id": 3, "name": "2627_eleves", "theme": ""}]}'
+    )
+    assert search.cohorts[0].name == "2627_eleves"
+
+
+@pytest.mark.usefixtures("decoder")
+def test_decode_refuses_mismatches():
+    with pytest.raises(ValueError):
+        decode(list[CohortMembers], b'[{"cohortid": "three", "userids": []}]')
+    with pytest.raises(ValueError):
+        decode(list[User], b'[{"username": "no id"}]')
+
+
+@pytest.mark.usefixtures("decoder")
+def test_call_as_raises_moodle_errors():
+    moodle = FakeMoodle({"core_user_get_users_by_field": lambda **_: USERS})
+    assert len(moodle.call_as(list[User], "core_user_get_users_by_field")) == 2
+    with pytest.raises(MoodleApiError):
+        moodle.call_as(list[User], "core_user_unknown_function")
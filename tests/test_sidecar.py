@@ -0,0 +1,152 @@
+"""Tests for lib.sidecar."""
+
+import contextlib
+import json
+import threading
+
+import pytest
+import requests
+
+from lib.moodle_api import DEFAULT_TIMEOUT, MoodleApiError, MoodleClient
+from lib.sidecar import Sidecar, SidecarClient, send, sidecar_running
+
+URL = "https://moodle.example.com/webservice/rest/server.php"
+
+
+class FakeUpstream(Sidecar):
+    """A sidecar whose Moodle answers with the function called."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.posted: list[str] = []
+
+    def post(self, url, parameters, timeout) -> bytes:
+        fname = parameters["wsfunction"]
+        self.posted.append(fname)
+        if fname == "core_broken_get_things":
+            raise requests.HTTPError("503 Server Error")
+        if fname == "core_missing_get_things":
+            return json.dumps({"exception": "dml_missing_record_exception"}).encode()
+        return json.dumps({"fname": fname, "count": len(self.posted)}).encode()
+
+
+@contextlib.contextmanager
+def serving(sidecar: Sidecar, socket_path):
+    server = sidecar.make_server(socket_path)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.start()
+    try:
+        yield
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    socket_path = tmp_path / "sidecar.sock"
+    sidecar = FakeUpstream()
+    with serving(sidecar, socket_path):
+        yield sidecar, socket_path
+
+
+def test_reads_are_cached_until_a_write(sidecar):
+    upstream, socket_path = sidecar
+    client = SidecarClient(URL, "token", socket_path)
+    assert sidecar_running(socket_path)
+
+    assert client("core_cohort_search_cohorts", query="").count == 1
+    assert client("core_cohort_search_cohorts", query="").count == 1
+    assert client("core_cohort_search_cohorts", query="x").count == 2
+
+    client("core_cohort_create_cohorts", cohorts=[])
+    assert client("core_cohort_search_cohorts", query="").count == 4
+    assert upstream.posted.count("core_cohort_search_cohorts") == 3
+    # Only the calls that reached Moodle tell how long they take
+    assert len(client.latencies["core_cohort_search_cohorts"]) == 3
+
+
+def test_flush(sidecar):
+    upstream, socket_path = sidecar
+    client = SidecarClient(URL, "token", socket_path)
+    client("core_course_get_categories")
+    send({"command": "flush"}, socket_path)
+    client("core_course_get_categories")
+    assert upstream.posted == ["core_course_get_categories"] * 2
+
+
+def test_errors_come_through(sidecar):
+    upstream, socket_path = sidecar
+    client = SidecarClient(URL, "token", socket_path)
+    with pytest.raises(requests.HTTPError, match="503"):
+        client("core_broken_get_things")
+    # Moodle exceptions aren't cached
+    for _ in range(2):
+        with pytest.raises(MoodleApiError):
+            client("core_missing_get_things")
+    assert upstream.posted.count("core_missing_get_things") == 2
+
+
+def test_falls_back_to_a_direct_connection(tmp_path, monkeypatch):
+    direct = []
+
+    def post(self, fname, kwargs) -> bytes:
+        direct.append(fname)
+        return b"1"
+
+    monkeypatch.setattr(MoodleClient, "_post", post)
+    socket_path = tmp_path / "nobody.sock"
+    assert not sidecar_running(socket_path)
+
+    client = SidecarClient(URL, "token", socket_path)
+    assert client("core_webservice_get_site_info") == 1
+    assert direct == ["core_webservice_get_site_info"]
+    assert client.direct
+
+
+def test_a_stalled_sidecar_times_out(sidecar):
+    upstream, socket_path = sidecar
+    release = threading.Event()
+    upstream.post = lambda *_: release.wait(5) and b"[]"  # type: ignore[method-assign]
+    client = SidecarClient(
+        URL, "token", socket_path, read_timeouts={"core_cohort_search_cohorts": 0.1}
+    )
+    client.timeout = (0.1, 300)
+    try:
+        with pytest.raises(requests.Timeout):
+            client("core_cohort_search_cohorts", query="")
+    finally:
+        release.set()
+
+
+class FakeSession:
+    """Stands for the requests session of the sidecar."""
+
+    def __init__(self):
+        self.timeouts: list = []
+
+    def post(self, url, parameters, timeout):
+        # Like requests, which only takes a number or a (connect, read) tuple
+        if not isinstance(timeout, tuple):
+            raise ValueError(f"Invalid timeout {timeout}")
+        self.timeouts.append(timeout)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"[]"
+        return response
+
+
+def test_the_timeout_reaches_the_session(tmp_path):
+    socket_path = tmp_path / "sidecar.sock"
+    sidecar = Sidecar()
+    sidecar.session = FakeSession()  # type: ignore[assignment]
+    client = SidecarClient(
+        URL, "token", socket_path, read_timeouts={"core_cohort_search_cohorts": 7}
+    )
+
+    with serving(sidecar, socket_path):
+        assert client("core_cohort_search_cohorts", query="") == []
+        assert client("core_cohort_create_cohorts", cohorts=[]) == []
+
+    assert sidecar.session.timeouts == [(DEFAULT_TIMEOUT[0], 7), DEFAULT_TIMEOUT]
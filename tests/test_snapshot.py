@@ -0,0 +1,116 @@
+"""Tests for lib.snapshot, against a fake Moodle."""
+
+import pytest
+from fake_moodle import FakeMoodle
+
+from lib.snapshot import Snapshot, take_snapshot
+
+
+def _category(id, path, coursecount):
+    return {
+        "id": id,
+        "name": f"category {id}",
+        "parent": int(path.split("/")[-2] or 0),
+        "path": path,
+        "depth": path.count("/"),
+        "coursecount": coursecount,
+        "timemodified": 1000,
+    }
+
+
+def make_moodle(courses_by_category: dict[int, list[str]]) -> FakeMoodle:
+    categories = [
+        _category(1, "/1", len(courses_by_category[1])),
+        _category(2, "/1/2", len(courses_by_category[2])),
+        _category(3, "/3", len(courses_by_category[3])),
+    ]
+    cohorts = [
+        {"id": 10, "name": "2627_3M08", "idnumber": "2627_3M08", "visible": True},
+        {"id": 11, "name": "2627_eleves", "idnumber": "", "visible": True},
+    ]
+    members = {10: [100, 101], 11: [100]}
+    emails = {100: "a@school.ch", 101: "b@school.ch"}
+
+    def search_cohorts(context, **_):
+        if context.get("instanceid") == 1:
+            return {"cohorts": cohorts[:1]}
+        if context.get("instanceid"):
+            return {"cohorts": []}
+        return {"cohorts": cohorts}
+
+    def get_courses(value, **_):
+        return {
+            "courses": [
+                {
+                    "id": hash(s) % 1000,
+                    "shortname": s,
+                    "fullname": s,
+                    "categoryid": value,
+                }
+                for s in courses_by_category[value]
+            ]
+        }
+
+    return FakeMoodle(
+        {
+            "core_course_get_categories": lambda: categories,
+            "core_course_get_courses_by_field": get_courses,
+            "core_cohort_search_cohorts": search_cohorts,
+            "core_cohort_get_cohort_members": lambda cohortids: [
+                {"cohortid": c, "userids": members[c]} for c in cohortids
+            ],
+            "core_user_get_users_by_field": lambda values, **_: [
+                {"id": i, "email": emails[i]} for i in values
+            ],
+        }
+    )
+
+
+COURSES = {1: [], 2: ["2627_3M08_Maths", "2627_3M09_Maths"], 3: ["Sandbox"]}
+
+
+def test_snapshot_answers_the_diff_questions(tmp_path):
+    take_snapshot(make_moodle(COURSES), tmp_path)
+    snapshot = Snapshot(tmp_path)
+
+    assert snapshot.course_shortnames(1) == {"2627_3M08_Maths", "2627_3M09_Maths"}
+    assert snapshot.course_shortnames(3) == {"Sandbox"}
+    assert snapshot.cohort_names() == {"2627_3M08", "2627_eleves"}
+    assert snapshot.cohort_names_in_category(1) == {"2627_3M08"}
+    assert snapshot.cohort_member_emails(10) == {"a@school.ch", "b@school.ch"}
+    assert snapshot.cohort_member_emails(11) == {"a@school.ch"}
+
+
+def test_refresh_only_fetches_what_changed(tmp_path):
+    take_snapshot(make_moodle(COURSES), tmp_path)
+
+    changed = dict(COURSES)
+    changed[2] = [*COURSES[2], "2627_3M10_Maths"]
+    moodle = make_moodle(changed)
+    manifest = take_snapshot(moodle, tmp_path)
+
+    course_calls = [
+        kwargs["value"]
+        for fname, kwargs in moodle.calls
+        if fname == "core_course_get_courses_by_field"
+    ]
+    assert course_calls == [2]
+    assert moodle.count("core_user_get_users_by_field") == 0
+    assert manifest["entities"]["courses"] == {"rows": 4, "refreshed": 3}
+    assert "2627_3M10_Maths" in Snapshot(tmp_path).course_shortnames(1)
+
+
+def test_full_refresh_ignores_previous_snapshot(tmp_path):
+    take_snapshot(make_moodle(COURSES), tmp_path)
+
+    moodle = make_moodle(COURSES)
+    take_snapshot(moodle, tmp_path, full=True)
+
+    assert moodle.count("core_course_get_courses_by_field") == 3
+    assert moodle.count("core_user_get_users_by_field") == 1
+
+
+def test_cohorts_only_known_for_top_level_categories(tmp_path):
+    take_snapshot(make_moodle(COURSES), tmp_path)
+    with pytest.raises(ValueError):
+        Snapshot(tmp_path).cohort_names_in_category(2)
@@ -0,0 +1,75 @@
+"""Tests for verify_teacher_enrolments.py."""
+
+import polars as pl
+from fake_moodle import FakeMoodle
+
+from lib.diff import diff_rows
+from verify_teacher_enrolments import (
+    COURSE,
+    EMAIL,
+    fetch_course_ids,
+    fetch_editing_teachers,
+    wanted_enrolments,
+)
+
+EDITING = {"roleid": 3, "shortname": "editingteacher"}
+STUDENT = {"roleid": 5, "shortname": "student"}
+
+
+def test_wanted_enrolments_unpivots_course_columns():
+    src = pl.DataFrame(
+        {
+            "email": ["A.Teacher@school.ch", "b@school.ch"],
+            "cohort1": [1, 1],
+            "course1": ["2627_3M08", "2627_3M08"],
+            "type1": [2, 2],
+            "course2": ["2627_3M09", None],
+            "type2": [2, None],
+        }
+    )
+    assert wanted_enrolments(src).sort(COURSE, EMAIL).rows() == [
+        ("2627_3M08", "a.teacher@school.ch"),
+        ("2627_3M08", "b@school.ch"),
+        ("2627_3M09", "a.teacher@school.ch"),
+    ]
+
+
+def test_fetch_and_diff_editing_teachers():
+    enrolled = {
+        10: [
+            {"id": 1, "email": "a@school.ch", "roles": [EDITING]},
+            {"id": 2, "email": "s@school.ch", "roles": [STUDENT]},
+        ],
+        11: [{"id": 3, "email": "C@school.ch", "roles": [EDITING, STUDENT]}],
+    }
+    moodle = FakeMoodle(
+        {
+            "core_course_get_courses_by_field": lambda: {
+                "courses": [
+                    {"id": i, "shortname": s, "fullname": s, "categoryid": 1}
+                    for i, s in ((10, "2627_3M08"), (11, "2627_3M09"))
+                ]
+            },
+            "core_enrol_get_enrolled_users": lambda courseid, options: enrolled[
+                courseid
+            ],
+        }
+    )
+
+    course_ids = fetch_course_ids(moodle)
+    assert course_ids == {"2627_3M08": 10, "2627_3M09": 11}
+
+    existing = fetch_editing_teachers(moodle, course_ids)
+    assert moodle.count("core_enrol_get_enrolled_users") == 2
+    assert existing.sort(COURSE).rows() == [
+        ("2627_3M08", "a@school.ch"),
+        ("2627_3M09", "c@school.ch"),
+    ]
+
+    wanted = pl.DataFrame(
+        {COURSE: ["2627_3M08", "2627_3M08"], EMAIL: ["a@school.ch", "b@school.ch"]}
+    )
+    assert diff_rows(existing, wanted, on=[COURSE, EMAIL]).rows() == [
+        ("2627_3M08", "b@school.ch", "in file but not in moodle"),
+        ("2627_3M09", "c@school.ch", "in moodle but not in file"),
+    ]
@@ -0,0 +1,62 @@
+"""Tests for watch.py."""
+
+import os
+import time
+
+import polars as pl
+
+import watch
+from lib.pipeline import Pipeline, Stage
+from watch import MOODLE, STUDENTS_EXPORT, TEACHERS_EXPORT, Export, MoodleState
+
+
+def write_export(path, emails: list[str]):
+    pl.DataFrame({"email": emails}).write_csv(path)
+    # Old enough to be settled
+    settled = time.time() - watch.SETTLE_SECONDS - 1
+    os.utime(path, (settled, settled))
+
+
+def test_only_a_changed_export_triggers_the_pipeline(tmp_path, monkeypatch):
+    # No xlsx writer here, the exports are csv files
+    monkeypatch.setattr(pl, "read_excel", pl.read_csv)
+    runs: list[str] = []
+
+    def stage(name):
+        def run(*inputs):
+            runs.append(name)
+            return name
+
+        return run
+
+    pipeline = Pipeline(
+        [
+            Stage("teachers", (TEACHERS_EXPORT,), stage("teachers")),
+            Stage("students", (STUDENTS_EXPORT, MOODLE), stage("students")),
+        ]
+    )
+    exports = {
+        TEACHERS_EXPORT: Export(tmp_path, "teachers*.xlsx"),
+        STUDENTS_EXPORT: Export(tmp_path, "students*.xlsx"),
+    }
+    moodle = MoodleState({}, {"2627_eleves"})
+
+    def cycle():
+        watch.watch(pipeline, exports, lambda: moodle, 0, 600, once=True)
+
+    write_export(tmp_path / "teachers.xlsx", ["p@x.ch"])
+    cycle()
+    # Nothing until both exports are there
+    assert runs == []
+
+    write_export(tmp_path / "students.xlsx", ["a@x.ch"])
+    cycle()
+    assert runs == ["teachers", "students"]
+
+    runs.clear()
+    cycle()
+    assert runs == []
+
+    write_export(tmp_path / "students.xlsx", ["a@x.ch", "b@x.ch"])
+    cycle()
+    assert runs == ["students"]
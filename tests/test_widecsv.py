@@ -0,0 +1,61 @@
+"""Tests for lib.widecsv."""
+
+import polars as pl
+
+from lib.widecsv import Spread, iter_wide_csv, render_wide_csv, write_wide_csv
+
+
+def test_write_wide_csv(tmp_path):
+    frame = pl.DataFrame(
+        {
+            "email": ["a@x.ch", "b,c@x.ch", "d@x.ch"],
+            "courses": [["c1", "c2"], [], None],
+            "types": [[2, 2], [], None],
+            "cohort1": [1, 1, 1],
+        }
+    )
+    path = tmp_path / "out.csv"
+    spreads = {"courses": Spread("course"), "types": Spread("type")}
+    write_wide_csv(frame, path, spreads, rows_per_slice=2)
+    assert path.read_text().splitlines() == [
+        "email,course1,course2,type1,type2,cohort1",
+        "a@x.ch,c1,c2,2,2,1",
+        '"b,c@x.ch",,,,,1',
+        "d@x.ch,,,,,1",
+    ]
+
+
+def test_same_output_as_the_wide_frame(tmp_path):
+    frame = pl.DataFrame(
+        {"email": ["a@x.ch", "b@x.ch"], "courses": [["c1"], ["c2", "c3", "c4"]]}
+    )
+    wide = frame.with_columns(
+        pl.col("courses").list.to_struct(fields=["cohort2", "cohort3", "cohort4"])
+    ).unnest("courses")
+    wide.write_csv(tmp_path / "wide.csv")
+
+    write_wide_csv(frame, tmp_path / "long.csv", {"courses": Spread("cohort", 2)})
+    assert (tmp_path / "long.csv").read_text() == (tmp_path / "wide.csv").read_text()
+
+
+def test_empty_frame_gets_a_header(tmp_path):
+    frame = pl.DataFrame(
+        {"email": [], "courses": []},
+        schema={"email": pl.String, "courses": pl.List(pl.String)},
+    )
+    write_wide_csv(frame, tmp_path / "out.csv", {"courses": Spread("cohort")})
+    assert (tmp_path / "out.csv").read_text() == "email\n"
+
+
+def test_slices_put_together_are_the_whole_csv():
+    frame = pl.DataFrame(
+        {
+            "email": [f"user{i}@x.ch" for i in range(5)],
+            "courses": [["c1"], [], ["c1", "c2", "c3"], None, ["c2"]],
+        }
+    )
+    spreads = {"courses": Spread("cohort", 2)}
+    slices = list(iter_wide_csv(frame, spreads, rows_per_slice=2))
+
+    assert [count for count, _ in slices] == [2, 2, 1]
+    assert b"".join(csv for _, csv in slices) == render_wide_csv(frame, spreads)
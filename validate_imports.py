@@ -0,0 +1,103 @@
+"""
+Takes import files obtained by running the prepare_* scripts (or their chunks)
+
+checks, before uploading them, that everything they refer to exists in moodle:
+- the category_path of the courses file,
+- the shortname and metacohort of the enrolment methods file,
+- the cohortN and courseN of the students and teachers files.
+
+Lists every unresolved reference, and exits with an error if there is any.
+
+Uses the Moodle API, or a snapshot taken by snapshot.py (--snapshot)
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+from lib.config import get_moodle_client
+from lib.diff import LOG_LIMIT
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_index import (
+    COLUMN,
+    KIND,
+    VALUE,
+    MoodleIndex,
+    references,
+    unresolved_references,
+)
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.snapshot import Snapshot
+
+log = structlog.get_logger()
+
+FILE = "file"
+
+
+def validate(paths: list[Path], index: MoodleIndex) -> pl.DataFrame:
+    """The unresolved references of all the files, with a file column."""
+    results = []
+    for path in paths:
+        # As text, so that an id and a name compare the same way
+        frame = pl.read_csv(path, infer_schema=False)
+        unresolved = unresolved_references(frame, index)
+        checked = references(frame.columns)
+        if not checked:
+            log.warning("nothing to check", file=str(path))
+        for (column, kind), group in unresolved.group_by(
+            COLUMN, KIND, maintain_order=True
+        ):
+            values = group[VALUE].unique(maintain_order=True)
+            log.warning(
+                f"unknown {kind}",
+                file=str(path),
+                column=column,
+                count=len(values),
+                values=values.head(LOG_LIMIT).to_list(),
+            )
+        log.info(
+            "checked",
+            file=str(path),
+            rows=len(frame),
+            columns=sorted(checked),
+            unresolved=len(unresolved),
+        )
+        results.append(unresolved.select(pl.lit(str(path)).alias(FILE), pl.all()))
+    return pl.concat(results)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("import_files", nargs="+", type=Path)
+    parser.add_argument("--snapshot", type=Path, help="Use this snapshot directory")
+    parser.add_argument("--output", help="Write every unresolved reference to this csv")
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        with step("index"):
+            if args.snapshot:
+                index = MoodleIndex.from_snapshot(Snapshot(args.snapshot))
+            else:
+                index = MoodleIndex.fetch(get_moodle_client(args.instance))
+        log.info("index", **index.counts())
+
+        with step("validate"):
+            unresolved = validate(args.import_files, index)
+
+        if args.output:
+            unresolved.write_csv(args.output)
+        if len(unresolved):
+            sys.exit(f"{len(unresolved)} unresolved references, don't upload yet")
+        log.info("all references resolved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Takes a csv obtained by running prepare_teachers_with_courses.py
+
+checks that every teacher is enrolled as an editing teacher in each of its
+courseN courses, and that these courses have no other editing teacher.
+
+The course shortnames are resolved to ids from a single call listing all the
+courses, then the enrolled users of every course are fetched concurrently.
+Courses of the file that don't exist in moodle are reported, not checked.
+
+Uses the Moodle API
+"""
+
+import argparse
+import time
+
+import polars as pl
+import polars.selectors as cs
+import structlog
+
+from lib.config import get_moodle_client
+from lib.diff import STATUS, diff_rows
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_api import MoodleClient
+from lib.parallel import DEFAULT_MAX_WORKERS, map_concurrently
+from lib.profiling import add_profile_arguments, profiled, step
+from lib.schemas import EnrolledUser
+from lib.snapshot import fetch_courses
+
+log = structlog.get_logger()
+
+COURSE = "course"
+EMAIL = "email"
+
+# Type 2 in the teachers file
+EDITING_TEACHER = "editingteacher"
+
+# Only ask for what we look at, the full user records are much larger
+ENROLLED_USER_FIELDS = "id,email,roles"
+
+
+def wanted_enrolments(src: pl.DataFrame) -> pl.DataFrame:
+    """One (course, email) row per courseN cell of the file."""
+    return (
+        src.unpivot(index=EMAIL, on=cs.matches(r"^course\d+$"), value_name=COURSE)
+        .drop_nulls(COURSE)
+        .select(COURSE, pl.col(EMAIL).str.to_lowercase())
+        .unique()
+    )
+
+
+def fetch_course_ids(moodle: MoodleClient) -> dict[str, int]:
+    """The id of every course, by shortname."""
+    courses = fetch_courses(moodle)
+    log.info("got all courses", course_count=len(courses))
+    return dict(zip(courses["shortname"], courses["id"], strict=True))
+
+
+def fetch_enrolled_users(
+    moodle: MoodleClient,
+    course_ids: dict[str, int],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[str, list[EnrolledUser]]:
+    """The enrolled users of each of the courses, by shortname."""
+
+    def fetch(course_id: int) -> list[EnrolledUser]:
+        return moodle.call_as(
+            list[EnrolledUser],
+            "core_enrol_get_enrolled_users",
+            courseid=course_id,
+            options=[{"name": "userfields", "value": ENROLLED_USER_FIELDS}],
+        )
+
+    shortnames = list(course_ids)
+    responses = map_concurrently(
+        fetch,
+        [course_ids[s] for s in shortnames],
+        max_workers,
+        progress="fetch enrolled users",
+    )
+    return dict(zip(shortnames, responses, strict=True))
+
+
+def fetch_editing_teachers(
+    moodle: MoodleClient,
+    course_ids: dict[str, int],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> pl.DataFrame:
+    """One (course, email) row per editing teacher of each of the courses."""
+    enrolled = fetch_enrolled_users(moodle, course_ids, max_workers)
+    return pl.DataFrame(
+        [
+            {COURSE: shortname, EMAIL: user.email.lower()}
+            for shortname, users in enrolled.items()
+            for user in users
+            if user.email and any(r.shortname == EDITING_TEACHER for r in user.roles)
+        ],
+        schema={COURSE: pl.String, EMAIL: pl.String},
+    )
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("teachers_csv")
+    parser.add_argument("--output", help="Write every difference to this csv")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        wanted = wanted_enrolments(pl.read_csv(args.teachers_csv))
+        log.info(
+            "wanted enrolments",
+            count=len(wanted),
+            course_count=wanted[COURSE].n_unique(),
+        )
+
+        moodle = get_moodle_client(args.instance)
+        with step("course index"):
+            all_course_ids = fetch_course_ids(moodle)
+        shortnames = wanted[COURSE].unique().sort().to_list()
+        unknown = [s for s in shortnames if s not in all_course_ids]
+        if unknown:
+            log.warning("courses not in moodle", count=len(unknown), courses=unknown)
+        course_ids = {s: all_course_ids[s] for s in shortnames if s in all_course_ids}
+
+        with step("enrolled users"):
+            start = time.perf_counter()
+            existing = fetch_editing_teachers(moodle, course_ids, args.max_workers)
+            log.info(
+                "got editing teachers",
+                course_count=len(course_ids),
+                seconds=round(time.perf_counter() - start, 1),
+            )
+
+        checked = wanted.filter(pl.col(COURSE).is_in(list(course_ids)))
+        diff = diff_rows(existing, checked, on=[COURSE, EMAIL])
+        for (course, status), group in diff.group_by(
+            COURSE, STATUS, maintain_order=True
+        ):
+            log.info(status, course=course, emails=group[EMAIL].to_list())
+        log.info("done", difference_count=len(diff))
+
+        if args.output:
+            diff.write_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Takes:
+- a directory where the essaim exports land
+- an output directory
+- a top-level category id and a yearly cohort id, as for reconcile.py
+
+Keeps every Moodle import file, and the reconcile report, up to date with the
+latest exports, until interrupted. Useful during the August rollover, when new
+exports come in several times a day.
+
+Every few seconds, looks for the latest export of teachers and courses
+(teachers*.xlsx by default) and of students (students*.xlsx by default), and
+fingerprints them. Only the outputs depending on an export that changed are
+computed again:
+
+    teachers export  -> preprocessed.csv -> courses.csv
+                                         -> enrolment_methods.csv
+                                         -> teachers.csv
+    students export  -> students.csv
+    all of the above -> reconcile_report.json
+
+The parsed exports, the intermediate frames and the Moodle lookups are kept in
+memory between refreshes. The Moodle lookups are fetched again every
+--moodle-ttl seconds, and only trigger a recompute if Moodle changed.
+
+Uses the Moodle API
+"""
+
+import argparse
+import hashlib
+import json
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+import polars as pl
+import structlog
+
+import prepare_students
+import prepare_teachers_with_courses
+from lib.config import get_moodle_client, get_salt
+from lib.instances import add_instance_arguments
+from lib.logs import add_log_arguments, configure_logging
+from lib.moodle_api import MoodleClient
+from lib.passwords import password_generator
+from lib.pipeline import Pipeline, Stage, fingerprint_file
+from lib.profiling import add_profile_arguments, profiled
+from lib.schoolyear import SchoolYear, add_schoolyear_argument
+from lib.widecsv import write_wide_csv
+from prepare_courses import to_courses
+from prepare_enrolment_methods import to_enrollment_methods
+from preprocess_teachers_and_courses import preprocess
+from reconcile import fetch_existing, print_summary, reconcile
+
+log = structlog.get_logger()
+
+TEACHERS_EXPORT = "teachers export"
+STUDENTS_EXPORT = "students export"
+MOODLE = "moodle"
+
+# An export modified more recently than this may still be being written
+SETTLE_SECONDS = 2
+
+
+@dataclass(frozen=True)
+class MoodleState:
+    existing: dict[str, set[str]]  # As returned by reconcile.fetch_existing
+    cohorts: set[str]  # All the cohorts, for prepare_students
+
+    def version(self) -> str:
+        digest = hashlib.sha256()
+        for name in sorted(self.existing):
+            digest.update("\0".join([name, *sorted(self.existing[name])]).encode())
+        digest.update("\0".join(sorted(self.cohorts)).encode())
+        return digest.hexdigest()
+
+
+class Export:
+    """The latest export matching a pattern in a directory."""
+
+    def __init__(self, directory: Path, pattern: str):
+        self.directory = directory
+        self.pattern = pattern
+        # Only hash the file again when it was modified
+        self._stat: tuple[Path, int, int] | None = None
+        self._version = ""
+        # The version we failed to read, not worth trying again
+        self.broken = ""
+
+    def latest(self) -> Path | None:
+        settled = [
+            p
+            for p in self.directory.glob(self.pattern)
+            if time.time() - p.stat().st_mtime > SETTLE_SECONDS
+        ]
+        return max(settled, key=lambda p: p.stat().st_mtime, default=None)
+
+    def version(self, path: Path) -> str:
+        stat = path.stat()
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key != self._stat:
+            self._version = fingerprint_file(path)
+            self._stat = key
+        return self._version
+
+
+def build_pipeline(
+    output_dir: Path, year: SchoolYear, email_to_password: Callable[[str], str]
+) -> Pipeline:
+    def write_csv(frame: pl.DataFrame, name: str) -> pl.DataFrame:
+        frame.write_csv(output_dir / name)
+        return frame
+
+    def teachers(preprocessed: pl.DataFrame) -> pl.DataFrame:
+        res = prepare_teachers_with_courses.to_teachers_with_courses(
+            preprocessed, email_to_password
+        )
+        write_wide_csv(
+            res, output_dir / "teachers.csv", prepare_teachers_with_courses.SPREADS
+        )
+        return res
+
+    def students(export: pl.DataFrame, moodle: MoodleState) -> pl.DataFrame:
+        res = prepare_students.transform(
+            export, email_to_password, moodle.cohorts, year
+        )
+        write_wide_csv(res, output_dir / "students.csv", prepare_students.SPREADS)
+        return res
+
+    def report(
+        moodle: MoodleState,
+        preprocessed: pl.DataFrame,
+        students: pl.DataFrame,
+        teachers: pl.DataFrame,
+    ) -> dict:
+        diffs = reconcile(moodle.existing, preprocessed, students, teachers)
+        report = {
+            "generated_at": datetime.now(UTC).isoformat(timespec="seconds"),
+            "diffs": {name: diff.to_dict() for name, diff in diffs.items()},
+        }
+        (output_dir / "reconcile_report.json").write_text(
+            json.dumps(report, indent=2, ensure_ascii=False)
+        )
+        print_summary(diffs)
+        return report
+
+    return Pipeline(
+        [
+            Stage(
+                "preprocessed",
+                (TEACHERS_EXPORT,),
+                lambda export: write_csv(preprocess(export, year), "preprocessed.csv"),
+            ),
+            Stage(
+                "courses",
+                ("preprocessed",),
+                lambda p: write_csv(to_courses(p), "courses.csv"),
+            ),
+            Stage(
+                "enrolment methods",
+                ("preprocessed",),
+                lambda p: write_csv(to_enrollment_methods(p), "enrolment_methods.csv"),
+            ),
+            Stage("teachers", ("preprocessed",), teachers),
+            Stage("students", (STUDENTS_EXPORT, MOODLE), students),
+            Stage(
+                "reconcile",
+                (MOODLE, "preprocessed", "students", "teachers"),
+                report,
+            ),
+        ]
+    )
+
+
+def fetch_moodle_state(
+    moodle: MoodleClient, course_category_id: str, yearly_cohort_id: str
+) -> MoodleState:
+    existing, durations = fetch_existing(
+        moodle, course_category_id, yearly_cohort_id, teachers_cohort_id="1"
+    )
+    log.info("fetched from moodle", **durations)
+    return MoodleState(existing, prepare_students.fetch_existing_moodle_cohorts(moodle))
+
+
+def update_sources(
+    pipeline: Pipeline,
+    exports: dict[str, Export],
+    moodle: MoodleState,
+) -> bool:
+    """Load whatever changed into the pipeline, tell whether anything did."""
+    changed = False
+    for name, export in exports.items():
+        path = export.latest()
+        if path is None:
+            continue
+        version = export.version(path)
+        if version == export.broken:
+            continue
+        try:
+            if pipeline.set_source(name, version, lambda: pl.read_excel(path)):
+                log.info("new export", source=name, path=str(path))
+                changed = True
+        except Exception:
+            log.exception("can't read export", source=name, path=str(path))
+            export.broken = version
+    if pipeline.set_source(MOODLE, moodle.version(), lambda: moodle):
+        changed = True
+    return changed
+
+
+def watch(
+    pipeline: Pipeline,
+    exports: dict[str, Export],
+    fetch_moodle: Callable[[], MoodleState],
+    interval: float,
+    moodle_ttl: float,
+    once: bool = False,
+):
+    moodle_state = None
+    fetched_at = 0.0
+    while True:
+        try:
+            if moodle_state is None or time.monotonic() - fetched_at > moodle_ttl:
+                moodle_state = fetch_moodle()
+                fetched_at = time.monotonic()
+
+            changed = update_sources(pipeline, exports, moodle_state)
+            # Nothing to do until we have seen both exports
+            if changed and all(name in pipeline.values for name in exports):
+                start = time.perf_counter()
+                report = pipeline.refresh()
+                log.info(
+                    "refreshed",
+                    seconds=round(time.perf_counter() - start, 3),
+                    **report,
+                )
+        except Exception:
+            # A network error, an export that doesn't look like what we
+            # expect... We'll try again when something changes.
+            log.exception("refresh failed")
+        if once:
+            return
+        time.sleep(interval)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_dir", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("course_category_id")
+    parser.add_argument("yearly_cohort_id")
+    parser.add_argument("--teachers-glob", default="teachers*.xlsx")
+    parser.add_argument("--students-glob", default="students*.xlsx")
+    parser.add_argument(
+        "--interval", type=float, default=5, help="Seconds between two checks"
+    )
+    parser.add_argument(
+        "--moodle-ttl",
+        type=float,
+        default=600,
+        help="Seconds before the Moodle lookups are fetched again",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Refresh once and exit, don't watch"
+    )
+    add_schoolyear_argument(parser)
+    add_instance_arguments(parser)
+    add_log_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_logging(args)
+
+    with profiled(args):
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        moodle = get_moodle_client(args.instance)
+        pipeline = build_pipeline(
+            args.output_dir, args.schoolyear, password_generator(get_salt())
+        )
+        exports = {
+            TEACHERS_EXPORT: Export(args.input_dir, args.teachers_glob),
+            STUDENTS_EXPORT: Export(args.input_dir, args.students_glob),
+        }
+        log.info("watching", input_dir=str(args.input_dir))
+        watch(
+            pipeline,
+            exports,
+            lambda: fetch_moodle_state(
+                moodle, args.course_category_id, args.yearly_cohort_id
+            ),
+            args.interval,
+            args.moodle_ttl,
+            args.once,
+        )
+
+
+if __name__ == "__main__":
+    main()